@@ -27,7 +27,7 @@ debug("App iniciada")
 # ──────────────────────────────────────────────────────────────────────────────
 # 👇 NUEVO: Landing con accesos directos y chequeos para FSFB
 # ──────────────────────────────────────────────────────────────────────────────
-import importlib
+import importlib.util
 import os
 from pathlib import Path
 
@@ -67,30 +67,20 @@ def _ok_bad(flag: bool) -> str:
 def _exists(path: str) -> bool:
     return Path(path).exists()
 
-chk_cols = st.columns(2)
-
-with chk_cols[0]:
-    # Módulos nuevos
+def _has_module(name: str) -> bool:
     try:
-        importlib.import_module("components.survival_plot")
-        sp_ok = True
-    except Exception as e:
-        sp_ok = False
-        debug(f"components.survival_plot error: {e}")
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError) as e:
+        debug(f"{name} error: {e}")
+        return False
 
-    try:
-        importlib.import_module("components.ui_blocks")
-        ui_ok = True
-    except Exception as e:
-        ui_ok = False
-        debug(f"components.ui_blocks error: {e}")
+chk_cols = st.columns(2)
 
-    try:
-        importlib.import_module("services.risk_engine")
-        re_ok = True
-    except Exception as e:
-        re_ok = False
-        debug(f"services.risk_engine error: {e}")
+with chk_cols[0]:
+    # Módulos nuevos: find_spec ubica el archivo sin importarlo (no carga plotly/scipy en el landing)
+    sp_ok = _has_module("components.survival_plot")
+    ui_ok = _has_module("components.ui_blocks")
+    re_ok = _has_module("services.risk_engine")
 
     st.write(f"- `components/survival_plot.py`: {_ok_bad(sp_ok)}")
     st.write(f"- `components/ui_blocks.py`: {_ok_bad(ui_ok)}")
@@ -104,13 +94,11 @@ with chk_cols[1]:
     st.write(f"- `pages/06_FSFB_Gestion_Humana.py`: {_ok_bad(fsfb_hr)}")
 
 # Dependencia para curvas FSFB (plotly)
-try:
-    import plotly  # noqa
+if _has_module("plotly"):
     st.write("- `plotly`: ✅ OK")
-except Exception as e:
+else:
     st.write("- `plotly`: ❌ FALTA")
     st.warning("Agrega `plotly>=5.24` en requirements.txt (ojo: es **plotly**, no *ploty*).")
-    debug(f"plotly import error: {e}")
 
 # ──────────────────────────────────────────────────────────────────────────────
 # 🧭 Accesos directos a las 4 páginas originales (comodidad)
@@ -0,0 +1,244 @@
+# benchmarks/load_test.py
+"""
+Prueba de carga del piloto: N sesiones concurrentes en un mismo proceso (= un worker de Streamlit),
+cada una con su AppTest en un hilo, ejecutando guiones de interacción realistas con tiempo de
+"pensar" entre clics:
+
+  alta_segura   subir CSV -> filtrar por servicio -> buscar y abrir paciente
+  cohortes      subir CSV -> barrido de sliders del constructor de cohortes (Clínicas Cardio-Renales)
+  checkeo_lote  subir lote FSFB -> cambiar horizontes (Checkeo Ejecutivo)
+
+AppTest no es reentrante (cada run reemplaza Runtime._instance, global del proceso), así que los reruns
+se serializan con un lock: la latencia medida = espera en cola + rerun, que es lo que percibe un
+clínico cuando el worker (limitado por el GIL) está ocupado con otras sesiones.
+
+Reporta por interacción p50/p90/p99/máx (s), CPU del proceso (% de un núcleo) y RSS base, pico y
+crecimiento por sesión. Cada combinación (filas, sesiones) corre en un proceso nuevo para que
+cachés y memoria no se mezclen entre corridas. Los datasets sintéticos (1k a 1M filas) se generan
+una vez y quedan en el directorio temporal.
+
+Uso: python benchmarks/load_test.py --rows 1000 100000 --sessions 1 4 8 \
+        [--scenarios alta_segura cohortes checkeo_lote] [--iterations 3] [--think 1.0] [--json resultados.json]
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CACHE_DIR = os.path.join(tempfile.gettempdir(), "corpus_loadtest")
+SCENARIOS = ("alta_segura", "cohortes", "checkeo_lote")
+PAGES = {
+    "alta_segura": "pages/1_Alta_Segura.py",
+    "cohortes": "pages/3_Clinicas_CardioRenales.py",
+    "checkeo_lote": "pages/05_FSFB_Checkeo_Ejecutivo.py",
+}
+_RUN_LOCK = threading.Lock()   # un rerun de AppTest a la vez por proceso
+
+# ---------- datasets sintéticos ----------
+def dataset_csv(kind: str, rows: int) -> bytes:
+    """
+    CSV sintético de `rows` filas: "egresos" (Alta Segura / Cohortes) o "fsfb" (Checkeo Ejecutivo).
+    """
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = os.path.join(CACHE_DIR, f"{kind}_{rows}.csv")
+    if not os.path.exists(path):
+        if kind == "fsfb":
+            from services.risk_engine import make_dummy_population
+            df = make_dummy_population(rows)
+        else:
+            from services.data_loader import generate_dummy
+            df = generate_dummy(rows)
+        df.to_csv(path + ".tmp", index=False)
+        os.replace(path + ".tmp", path)
+    with open(path, "rb") as f:
+        return f.read()
+
+# ---------- métricas de proceso ----------
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+class _RssSampler(threading.Thread):
+    def __init__(self, every: float = 0.2):
+        super().__init__(daemon=True)
+        self.every, self.peak = every, rss_mb()
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.wait(self.every):
+            self.peak = max(self.peak, rss_mb())
+
+    def stop(self) -> float:
+        self._done.set()
+        self.join()
+        return max(self.peak, rss_mb())
+
+def percentiles(xs: list[float]) -> dict:
+    import numpy as np
+    a = np.asarray(xs, dtype=float)
+    if not len(a):
+        return {"n": 0}
+    p50, p90, p99 = np.percentile(a, [50, 90, 99])
+    return {"n": len(a), "p50": p50, "p90": p90, "p99": p99, "max": float(a.max())}
+
+# ---------- guiones de interacción ----------
+def _by_label(elements, label: str):
+    for e in elements:
+        if e.label == label:
+            return e
+    raise LookupError(f"No se encontró el widget {label!r}")
+
+def _alta_segura(at, step, rng, data, iterations):
+    from services.data_loader import SERVICIOS
+    step("abrir", at.run)
+    step("subir_csv", lambda: at.file_uploader[0].set_value(("egresos.csv", data["egresos"], "text/csv")).run())
+    for _ in range(iterations):
+        svc = rng.choice(SERVICIOS, size=int(rng.integers(1, 3)), replace=False).tolist()
+        step("filtrar_servicio", lambda: _by_label(at.multiselect, "Servicio").set_value(svc).run())
+        prefix = "".join(rng.choice(list("0123456789abcdef"), size=2))
+        step("buscar_paciente", lambda: _by_label(at.text_input, "Buscar paciente (ID o episodio)").set_value(prefix).run())
+        for sb in [s for s in at.selectbox if s.label == "Paciente"][:1]:
+            if sb.options:
+                step("abrir_paciente", lambda: sb.select_index(int(rng.integers(len(sb.options)))).run())
+
+def _cohortes(at, step, rng, data, iterations):
+    step("abrir", at.run)
+    step("subir_csv", lambda: at.file_uploader[0].set_value(("egresos.csv", data["egresos"], "text/csv")).run())
+    for _ in range(iterations):
+        for label, lo, hi, inc in (("HbA1c mínima", 4.5, 13.5, 0.1), ("Creatinina mínima", 0.4, 6.0, 0.1)):
+            v = round(lo + inc * int(rng.integers(0, int((hi - lo) / inc) // 2)), 1)
+            step("slider_cohorte", lambda: _by_label(at.slider, label).set_value(v).run())
+
+def _checkeo_lote(at, step, rng, data, iterations):
+    step("abrir", at.run)
+    step("subir_lote", lambda: _by_label(at.file_uploader, "Sube tu CSV").set_value(("lote.csv", data["fsfb"], "text/csv")).run())
+    for _ in range(iterations):
+        hz = sorted(rng.choice([6, 12, 24, 36, 60], size=int(rng.integers(1, 6)), replace=False).tolist())
+        step("cambiar_horizontes", lambda: _by_label(at.multiselect, "Horizontes (meses)").set_value(hz).run())
+
+GUIONES = {"alta_segura": _alta_segura, "cohortes": _cohortes, "checkeo_lote": _checkeo_lote}
+
+# ---------- una corrida (proceso hijo) ----------
+def run_config(rows: int, sessions: int, scenarios: list[str], iterations: int, timeout: float,
+               think: float = 1.0) -> dict:
+    os.environ.setdefault("CORPUS_AUTH_DISABLED", "1")
+    sys.path.insert(0, ROOT)
+    os.chdir(ROOT)
+    import numpy as np
+    from streamlit.testing.v1 import AppTest
+
+    data = {"egresos": dataset_csv("egresos", rows), "fsfb": dataset_csv("fsfb", rows)}
+    AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=timeout).run()   # imports calientes
+    lat: dict[str, list[float]] = {}
+    errors: list[str] = []
+    lock = threading.Lock()
+    start = threading.Barrier(sessions)
+
+    def session(i: int):
+        scenario = scenarios[i % len(scenarios)]
+        rng = np.random.default_rng(1000 + i)
+        at = AppTest.from_file(os.path.join(ROOT, PAGES[scenario]), default_timeout=timeout)
+
+        def step(name: str, fn):
+            if think > 0:
+                time.sleep(rng.exponential(think))
+            t0 = time.perf_counter()
+            try:
+                with _RUN_LOCK:
+                    fn()
+            except Exception as e:  # la corrida sigue; el error se reporta
+                with lock:
+                    errors.append(f"{scenario}/{name}: {type(e).__name__}: {e}")
+                return
+            dt = time.perf_counter() - t0
+            with lock:
+                lat.setdefault(f"{scenario}/{name}", []).append(dt)
+                errors.extend(f"{scenario}/{name}: {x.message}" for x in at.exception)
+
+        start.wait()
+        GUIONES[scenario](at, step, rng, data, iterations)
+
+    rss_base = rss_mb()   # incluye imports y datasets: lo que crece después es atribuible a las sesiones
+    sampler = _RssSampler()
+    sampler.start()
+    cpu0, t0 = os.times(), time.perf_counter()
+    threads = [threading.Thread(target=session, args=(i,)) for i in range(sessions)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - t0
+    cpu1 = os.times()
+    rss_peak = sampler.stop()
+    rss_end = rss_mb()
+    cpu = (cpu1.user - cpu0.user) + (cpu1.system - cpu0.system)
+    return {
+        "rows": rows, "sessions": sessions, "wall_s": wall, "cpu_pct": 100 * cpu / wall if wall else 0.0,
+        "rss_base_mb": rss_base, "rss_peak_mb": rss_peak, "rss_end_mb": rss_end,
+        "rss_per_session_mb": (rss_end - rss_base) / sessions,
+        "steps": {k: percentiles(v) for k, v in sorted(lat.items())},
+        "errors": errors[:20], "n_errors": len(errors),
+    }
+
+def _spawn(rows: int, sessions: int, args) -> dict:
+    cmd = [sys.executable, os.path.abspath(__file__), "--worker", "--rows", str(rows), "--sessions", str(sessions),
+           "--iterations", str(args.iterations), "--timeout", str(args.timeout), "--think", str(args.think),
+           "--scenarios", *args.scenarios]
+    res = subprocess.run(cmd, cwd=ROOT, capture_output=True, text=True, env={**os.environ, "PYTHONPATH": ROOT})
+    try:
+        return json.loads(res.stdout.strip().splitlines()[-1])
+    except (IndexError, json.JSONDecodeError):
+        return {"rows": rows, "sessions": sessions, "n_errors": -1, "errors": [res.stderr[-600:]], "steps": {}}
+
+def _print(r: dict):
+    print(f"\n== {r['rows']:,} filas · {r['sessions']} sesiones ==")
+    if r.get("n_errors", 0) < 0:
+        print("  falló la corrida:\n" + "\n".join(r["errors"]))
+        return
+    print(f"  pared {r['wall_s']:.1f}s · CPU {r['cpu_pct']:.0f}% · RSS base {r['rss_base_mb']:.0f} MB, "
+          f"pico {r['rss_peak_mb']:.0f} MB, +{r['rss_per_session_mb']:.1f} MB/sesión")
+    print(f"  {'interacción':36s} {'n':>4s} {'p50':>7s} {'p90':>7s} {'p99':>7s} {'máx':>7s}")
+    for name, p in r["steps"].items():
+        print(f"  {name:36s} {p['n']:4d} {p['p50']:7.2f} {p['p90']:7.2f} {p['p99']:7.2f} {p['max']:7.2f}")
+    if r["n_errors"]:
+        print(f"  errores: {r['n_errors']} (p.ej. {r['errors'][0]})")
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Prueba de carga con sesiones concurrentes (AppTest)")
+    ap.add_argument("--rows", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    ap.add_argument("--sessions", type=int, nargs="+", default=[1, 4, 8])
+    ap.add_argument("--scenarios", nargs="+", default=list(SCENARIOS), choices=SCENARIOS)
+    ap.add_argument("--iterations", type=int, default=3, help="repeticiones de cada interacción por sesión")
+    ap.add_argument("--think", type=float, default=1.0, help="tiempo medio entre clics por sesión (s, exponencial)")
+    ap.add_argument("--timeout", type=float, default=600.0, help="timeout por rerun (s)")
+    ap.add_argument("--json", default=None, help="guarda los resultados en este archivo")
+    ap.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = ap.parse_args(argv)
+
+    if args.worker:
+        r = run_config(args.rows[0], args.sessions[0], args.scenarios, args.iterations, args.timeout, args.think)
+        print(json.dumps(r, default=float))
+        return
+
+    results = []
+    for rows in args.rows:
+        for sessions in args.sessions:
+            r = _spawn(rows, sessions, args)
+            _print(r)
+            results.append(r)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2, default=float)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# benchmarks/startup.py
+"""
+Arranque en frío del piloto:
+  1) tiempo de import por módulo (python -X importtime) de lo que carga cada página;
+  2) tiempo a primer render por página (AppTest en un intérprete nuevo, sin módulos en caché).
+
+Uso: python benchmarks/startup.py [--top 15] [--pages pages/1_Alta_Segura.py ...]
+"""
+from __future__ import annotations
+import argparse
+import glob
+import json
+import os
+import re
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+_RENDER = """
+import os, sys, time, json
+os.environ.setdefault("CORPUS_AUTH_DISABLED", "1")
+sys.path.insert(0, {root!r})
+from streamlit.testing.v1 import AppTest
+t0 = time.perf_counter()
+at = AppTest.from_file({page!r}, default_timeout=120)
+at.run()
+dt = time.perf_counter() - t0
+heavy = [m for m in ("plotly", "altair", "pydantic", "scipy", "duckdb", "pyarrow") if m in sys.modules]
+print(json.dumps({{"seconds": dt, "errors": len(at.exception), "heavy": heavy}}))
+"""
+
+def import_times(modules: list[str], top: int = 15) -> list[tuple[str, float, float]]:
+    """
+    (módulo, self ms, acumulado ms) de los paquetes de primer nivel que cuelgan de `modules`,
+    ordenados por tiempo acumulado.
+    """
+    code = "import " + ", ".join(modules)
+    res = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=ROOT,
+                         capture_output=True, text=True, env={**os.environ, "PYTHONPATH": ROOT})
+    rows = []
+    for line in res.stderr.splitlines():
+        m = _LINE.match(line)
+        if m and len(m.group(3)) <= 1:      # nivel superior del árbol de imports
+            rows.append((m.group(4), int(m.group(1)) / 1000, int(m.group(2)) / 1000))
+    return sorted(rows, key=lambda r: -r[2])[:top]
+
+def first_render(page: str) -> dict:
+    code = _RENDER.format(root=ROOT, page=os.path.join(ROOT, page))
+    res = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True)
+    try:
+        return json.loads(res.stdout.strip().splitlines()[-1])
+    except (IndexError, json.JSONDecodeError):
+        return {"seconds": float("nan"), "errors": -1, "heavy": [], "stderr": res.stderr[-400:]}
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Benchmark de arranque en frío (imports y primer render)")
+    ap.add_argument("--top", type=int, default=15)
+    ap.add_argument("--pages", nargs="*", default=None)
+    args = ap.parse_args(argv)
+    pages = args.pages or ["app.py"] + sorted(os.path.relpath(p, ROOT) for p in glob.glob(os.path.join(ROOT, "pages", "*.py")))
+
+    print("== Import por módulo (acumulado, ms) ==")
+    for name, self_ms, cum_ms in import_times(["streamlit", "services.settings", "services.data_loader",
+                                               "components.charts", "components.survival_plot"], args.top):
+        print(f"{cum_ms:9.1f}  {self_ms:8.1f}  {name}")
+
+    print("\n== Primer render por página (proceso nuevo) ==")
+    for page in pages:
+        r = first_render(page)
+        err = "" if r["errors"] == 0 else f"  errores={r['errors']}"
+        print(f"{r['seconds']:7.2f}s  {page:45s} pesados={','.join(r['heavy']) or '-'}{err}")
+
+if __name__ == "__main__":
+    main()
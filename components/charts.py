@@ -1,9 +1,11 @@
 # components/charts.py
 from __future__ import annotations
 import pandas as pd
-import altair as alt
+
+# altair se importa dentro de cada gráfico: solo se carga cuando un componente se renderiza
 
 def survival_curve_chart(points: list[dict], height: int = 150):
+    import altair as alt
     data = pd.DataFrame(points)
     return alt.Chart(data).mark_line(point=True).encode(
         x=alt.X("day:Q", title="Días"),
@@ -12,6 +14,7 @@ def survival_curve_chart(points: list[dict], height: int = 150):
     ).properties(height=height)
 
 def top_features_bar(features: list[str], importances: list[float] | None = None, height: int = 140):
+    import altair as alt
     if importances is None:
         importances = list(range(len(features),0,-1))
     df = pd.DataFrame({"factor": features, "importancia": importances})
@@ -22,6 +25,7 @@ def top_features_bar(features: list[str], importances: list[float] | None = None
     ).properties(height=height)
 
 def donut_gauge(value: float, title: str = "Riesgo"):
+    import altair as alt
     # value en 0–1
     df = pd.DataFrame({
         "label":["Valor","Resto"],
@@ -34,26 +38,16 @@ def donut_gauge(value: float, title: str = "Riesgo"):
     text = alt.Chart(pd.DataFrame({"v":[f"{value*100:.0f}%"]})).mark_text(size=22).encode(text="v:N")
     return (c + text).properties(title=title)
 
-def deciles_km_chart(deciles_dict: dict[int, list[dict]], height: int = 260):
-    # deciles_dict: {1:[{day,S},...], ...., 10:[...]}
-    rows=[]
-    for d, pts in deciles_dict.items():
-        for p in pts:
-            rows.append({"decile": d, "day": p["day"], "S": p["S"]})
-    df = pd.DataFrame(rows)
-    return alt.Chart(df).mark_line().encode(
-        x=alt.X("day:Q", title="Días"),
-        y=alt.Y("S:Q", title="Supervivencia"),
-        color=alt.Color("decile:N", legend=alt.Legend(title="Decil")),
-        tooltip=["decile","day","S"]
-    ).properties(height=height)
-
-def occupancy_heatmap(df: pd.DataFrame, height: int = 260):
-    # requiere columnas: servicio, day_estancia, risk_factor
-    agg = df.groupby(["servicio","day_estancia"], as_index=False)["risk_factor"].mean()
-    return alt.Chart(agg).mark_rect().encode(
-        x=alt.X("day_estancia:Q", title="Día de estancia"),
+def occupancy_heatmap(cells: pd.DataFrame, height: int = 260):
+    import altair as alt
+    # recibe celdas ya agregadas en servidor (services.chart_data.heatmap_cells):
+    # servicio, day_estancia, risk_factor (media), n; si llega el df crudo, se agrega aquí
+    if "n" not in cells.columns:
+        from services.chart_data import heatmap_cells
+        cells = heatmap_cells(cells)
+    return alt.Chart(cells).mark_rect().encode(
+        x=alt.X("day_estancia:O", title="Día de estancia"),
         y=alt.Y("servicio:N", title="Servicio"),
         color=alt.Color("risk_factor:Q", title="Riesgo medio", scale=alt.Scale(scheme="teals")),
-        tooltip=["servicio","day_estancia","risk_factor"]
+        tooltip=["servicio","day_estancia",alt.Tooltip("risk_factor:Q", format=".0%"),alt.Tooltip("n:Q", title="Pacientes")]
     ).properties(height=height)
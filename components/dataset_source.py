@@ -0,0 +1,50 @@
+# components/dataset_source.py
+from __future__ import annotations
+from datetime import date, timedelta
+import pandas as pd
+import streamlit as st
+from services.dataset_store import DatasetStore, cached_scan, store_available
+
+def historic_filter(key: str, default_days: int = 90) -> tuple | None:
+    """
+    Selector de fuente de datos. Si existe el histórico particionado (data/egresos), permite elegir
+    una porción (servicios + ventana de fechas de ingreso) en vez de subir un CSV.
+    Devuelve (servicios, desde, hasta) para historic_scan, o None = la página usa CSV subido o dummy.
+    """
+    if not store_available():
+        return None
+    fuente = st.radio("Fuente de datos", ["CSV / demo", "Histórico particionado"], horizontal=True,
+                      key=f"{key}_fuente")
+    if fuente == "CSV / demo":
+        return None
+    parts = DatasetStore().partitions()
+    c1, c2 = st.columns([2, 1])
+    svc = c1.multiselect("Servicios (histórico)", sorted(parts["servicio"].unique().tolist()), key=f"{key}_svc",
+                         placeholder="Todos")
+    today = date.today()
+    rango = c2.date_input("Ingreso entre", (today - timedelta(days=default_days), today), key=f"{key}_rango")
+    # mientras se elige el rango, date_input devuelve una sola fecha
+    since, until = (tuple(rango) + (None, None))[:2] if isinstance(rango, (tuple, list)) else (rango, None)
+    return svc, since, until
+
+def historic_scan(selection: tuple, where=(), stop_if_empty: bool = True) -> pd.DataFrame:
+    """
+    Lee la porción elegida en historic_filter: las particiones fuera del filtro no se abren y
+    `where` (filtros por fila del motor) se resuelve en la misma consulta.
+    """
+    svc, since, until = selection
+    store = DatasetStore()
+    df = cached_scan(svc, since, until, where=where)
+    kept, parts = store.prune(svc, since, until), store.partitions()
+    st.caption(f"{len(df):,} egresos · {len(kept)} de {len(parts)} particiones (mes × servicio) leídas")
+    if df.empty and stop_if_empty:
+        st.info("No hay egresos en el histórico para ese filtro.")
+        st.stop()
+    return df
+
+def historic_source(key: str, default_days: int = 90) -> pd.DataFrame | None:
+    """
+    historic_filter + historic_scan: la porción del histórico, o None si la página usa CSV o dummy.
+    """
+    selection = historic_filter(key, default_days)
+    return None if selection is None else historic_scan(selection)
@@ -0,0 +1,18 @@
+# components/downloads.py
+from __future__ import annotations
+import pandas as pd
+import streamlit as st
+from services.exports import FORMATS, export_bytes
+
+def download_menu(df: pd.DataFrame, basename: str, label: str = "⬇️ Exportar", key: str | None = None,
+                  widget_key: str | None = None, use_container_width: bool = False):
+    """
+    Selector de formato + botón de descarga perezoso: el archivo se genera (y cachea en disco)
+    solo al hacer clic, no en cada rerun. `key` = hash de dataset + filtros si el llamador ya lo tiene.
+    """
+    wk = widget_key or basename
+    c1, c2 = st.columns([1, 3])
+    fmt = c1.selectbox("Formato", list(FORMATS), key=f"fmt_{wk}", label_visibility="collapsed")
+    ext, mime = FORMATS[fmt]
+    c2.download_button(label, data=lambda: export_bytes(df, fmt, key), file_name=f"{basename}{ext}",
+                       mime=mime, key=f"dl_{wk}", use_container_width=use_container_width)
@@ -0,0 +1,26 @@
+# components/drift_panel.py
+from __future__ import annotations
+import pandas as pd
+import streamlit as st
+from services.drift import upload_drift_report
+from services.settings import get_debug
+
+def drift_panel(uploaded, kind: str = "egresos") -> pd.DataFrame | None:
+    """
+    Panel de operación en la barra lateral para archivos subidos: aviso si alguna variable
+    está en alerta/crítico y, en modo debug, la tabla completa de PSI/KS por variable.
+    """
+    if uploaded is None:
+        return None         # el dataset dummy es la referencia misma
+    report = upload_drift_report(uploaded, kind)
+    flagged = report[report["estado"] != "ok"]
+    if len(flagged):
+        names = ", ".join(f"{r.variable} ({r.estado})" for r in flagged.itertuples())
+        st.sidebar.warning(f"📈 Drift de entrada: {names}")
+    if get_debug():
+        with st.sidebar.expander("📈 Drift de entrada (PSI/KS)", expanded=bool(len(flagged))):
+            st.dataframe(report.style.format({"psi": "{:.3f}", "ks": "{:.3f}", "desvio_media_sd": "{:+.2f}",
+                                              "delta_faltantes": "{:+.1%}"}, na_rep="–"),
+                         use_container_width=True, hide_index=True)
+            st.caption("PSI ≥ 0.10 alerta, ≥ 0.25 crítico (contra el perfil de referencia del modelo).")
+    return report
@@ -0,0 +1,55 @@
+# components/patient_panel.py
+from __future__ import annotations
+import numpy as np
+import pandas as pd
+import streamlit as st
+from components.charts import survival_curve_chart, top_features_bar, donut_gauge
+from components.cards import risk_chip
+from services.patient_store import PatientStore
+
+# Panel de detalle de paciente: los gráficos se guardan como spec Vega-Lite (dict) en el LRU del
+# store, así cambiar de paciente no reconstruye ni re-serializa los charts de Altair.
+
+def patient_picker(store: PatientStore, label: str = "Paciente", allowed: np.ndarray | None = None,
+                   limit: int = 20, key: str = "paciente") -> int | None:
+    """
+    Typeahead: caja de búsqueda por prefijo de patient_id/episode_id + selectbox con los `limit`
+    de mayor riesgo que coinciden. Devuelve la posición (iloc) en store.df o None.
+    """
+    prefix = st.text_input(f"Buscar {label.lower()} (ID o episodio)", key=f"{key}_q",
+                           placeholder="Prefijo del ID; vacío = mayor riesgo")
+    options = store.search(prefix, limit=limit, allowed=allowed).tolist()
+    if not options:
+        st.info("Sin coincidencias.")
+        return None
+    rank = store.rank
+    return st.selectbox(label, options, key=f"{key}_sel",
+                        format_func=lambda i: f"{store.label(i)} · {rank[i]:.0%}")
+
+def detail_payload(row: pd.Series, surv_height: int = 180) -> dict:
+    risk = float(row["risk_factor"])
+    return {
+        "gauge": donut_gauge(risk, "Riesgo").to_dict(),
+        "survival": survival_curve_chart(row["surv_curve"], height=surv_height).to_dict(),
+        "features": top_features_bar(row["top_features"], height=140).to_dict(),
+        "chip": risk_chip(risk),
+        "window": f"{int(row['t_start_days'])}-{int(row['t_end_days'])} días",
+    }
+
+def survival_payload(row: pd.Series, height: int = 200) -> dict:
+    return {"survival": survival_curve_chart(row["surv_curve"], height=height).to_dict()}
+
+def render_patient_detail(store: PatientStore, i: int):
+    p = store.detail(i, detail_payload, view="detalle")
+    c1, c2 = st.columns([1,1])
+    with c1:
+        st.vega_lite_chart(p["gauge"], use_container_width=True)
+        st.markdown(f"Nivel: {p['chip']}", unsafe_allow_html=True)
+        st.markdown(f"**Ventana:** {p['window']}")
+    with c2:
+        st.vega_lite_chart(p["survival"], use_container_width=True)
+        st.vega_lite_chart(p["features"], use_container_width=True)
+
+def render_patient_survival(store: PatientStore, i: int, height: int = 200):
+    p = store.detail(i, lambda r: survival_payload(r, height), view=("curva", height))
+    st.vega_lite_chart(p["survival"], use_container_width=True)
@@ -0,0 +1,102 @@
+# components/survival_cohorts.py
+from __future__ import annotations
+import numpy as np
+import pandas as pd
+import streamlit as st
+from services.chart_data import curve_matrix, quantile_bands
+from services.settings import CorpusTheme
+
+MAX_CURVES = 1000     # curvas individuales dibujadas por figura (muestra estratificada si hay más)
+PALETTE = [CorpusTheme.primary, CorpusTheme.danger, CorpusTheme.success, CorpusTheme.warn, "#9B5DE5",
+           "#00BBF9", "#F15BB5", "#8AC926", "#FFCA3A", "#6A4C93"]
+
+def _rgba(hex_color: str, alpha: float) -> str:
+    h = hex_color.lstrip("#")
+    return f"rgba({int(h[0:2], 16)},{int(h[2:4], 16)},{int(h[4:6], 16)},{alpha})"
+
+def _sample(n: int, groups: np.ndarray, k: int, seed: int = 7) -> np.ndarray:
+    # hasta k filas, proporcional por grupo (cada grupo conserva al menos una curva)
+    if n <= k:
+        return np.arange(n)
+    rng = np.random.default_rng(seed)
+    out = []
+    for label in pd.unique(groups):
+        idx = np.flatnonzero(groups == label)
+        take = max(1, int(round(k * len(idx) / n)))
+        out.append(rng.choice(idx, size=min(take, len(idx)), replace=False))
+    return np.sort(np.concatenate(out))
+
+def cohort_survival_spec(days, S: np.ndarray, groups=None, bands: bool = True, curves: bool = False,
+                         max_curves: int = MAX_CURVES,
+                         x_title: str = "Días", height: int = 320, prefix: str = "") -> dict:
+    """
+    Figura Plotly (como dict) para comparar cohortes: por grupo, banda p10–p90 + mediana calculadas
+    en servidor y, opcionalmente, las curvas individuales en UNA traza Scattergl por grupo
+    (curvas separadas por huecos): 1.000 curvas son una sola llamada de dibujo WebGL.
+    Las curvas se dibujan con todos sus puntos: surv_curve trae pocos días por paciente.
+    """
+    import plotly.graph_objects as go
+    S = np.asarray(S, dtype=float)
+    g = np.full(len(S), "Todos", dtype=object) if groups is None else np.asarray(groups, dtype=object)
+    x = np.asarray(days)
+    fig = go.Figure()
+    labels = list(pd.unique(g))
+    try:
+        labels.sort()
+    except TypeError:
+        pass        # grupos no comparables: orden de aparición
+    if curves and len(S):
+        pick = _sample(len(S), g, max_curves)
+        for j, label in enumerate(labels):
+            rows = pick[g[pick] == label]
+            if not len(rows):
+                continue
+            # x repetido por curva + NaN al final de cada una para cortar la línea
+            xs = np.tile(np.append(x, np.nan), len(rows))
+            ys = np.hstack([S[rows], np.full((len(rows), 1), np.nan)]).ravel()
+            fig.add_trace(go.Scattergl(x=xs, y=ys, mode="lines", name=f"{prefix}{label} (curvas)", legendgroup=str(label),
+                                       line=dict(width=1, color=_rgba(PALETTE[j % len(PALETTE)], 0.18)),
+                                       hoverinfo="skip", showlegend=False))
+    band = quantile_bands(x, S, g)
+    for j, label in enumerate(labels):
+        b = band[band["grupo"] == label]
+        color = PALETTE[j % len(PALETTE)]
+        if bands:
+            fig.add_trace(go.Scatter(x=b["day"], y=b["p90"], mode="lines", line=dict(width=0), legendgroup=str(label),
+                                     showlegend=False, hoverinfo="skip"))
+            fig.add_trace(go.Scatter(x=b["day"], y=b["p10"], mode="lines", line=dict(width=0), fill="tonexty",
+                                     fillcolor=_rgba(color, 0.20), legendgroup=str(label), showlegend=False,
+                                     hoverinfo="skip"))
+        fig.add_trace(go.Scatter(
+            x=b["day"], y=b["p50"], mode="lines", name=f"{prefix}{label} (n={int(b['n'].iloc[0]):,})", legendgroup=str(label),
+            line=dict(width=2.5, color=color), customdata=b[["p10", "p90"]].to_numpy(),
+            hovertemplate="día %{x}: S mediana %{y:.2f} (p10–p90 %{customdata[0]:.2f}–%{customdata[1]:.2f})<extra></extra>"))
+    fig.update_layout(template="plotly_dark", height=height, margin=dict(l=10, r=10, t=30, b=10),
+                      xaxis_title=x_title, yaxis_title="Supervivencia", yaxis_range=[0, 1.02],
+                      legend=dict(orientation="h"), uirevision="cohortes")
+    return fig.to_dict()
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def _spec_cached(key: str, _curves, _groups, bands: bool, curves: bool, max_curves: int, height: int,
+                 prefix: str) -> dict:
+    days, S = curve_matrix(_curves)
+    return cohort_survival_spec(days, S, _groups, bands=bands, curves=curves, max_curves=max_curves, height=height,
+                                prefix=prefix)
+
+def render_cohort_survival(df: pd.DataFrame, group_col: str | None = None, bands: bool = True, curves: bool = False,
+                           max_curves: int = MAX_CURVES, height: int = 320, curve_col: str = "surv_curve",
+                           prefix: str = ""):
+    """
+    Curvas de supervivencia de una cohorte (surv_curve por fila) agrupadas por `group_col`.
+    El spec se cachea por huella de la cohorte (ids + grupo + riesgo): cambiar solo de página o
+    rerun no reconstruye la matriz de curvas ni la figura.
+    """
+    from services.data import dataset_key
+    if df.empty:
+        st.info("Sin pacientes para graficar.")
+        return
+    key_cols = [c for c in ("episode_id", "patient_id", "risk_factor", group_col) if c and c in df.columns]
+    key = dataset_key(df, key_cols, extra=(group_col, bands, curves, max_curves, height, prefix))
+    groups = df[group_col].to_numpy() if group_col else None
+    st.plotly_chart(_spec_cached(key, df[curve_col].tolist(), groups, bands, curves, max_curves, height, prefix),
+                    use_container_width=True)
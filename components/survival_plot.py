@@ -1,11 +1,15 @@
 # components/survival_plot.py
 from __future__ import annotations
+from typing import TYPE_CHECKING
 import pandas as pd
-import plotly.graph_objects as go
 import streamlit as st
 from services.settings import CorpusTheme
 
-def render_survival_curve(df: pd.DataFrame, horizon: int = 24):
+if TYPE_CHECKING:
+    import plotly.graph_objects as go
+
+def survival_figure(df: pd.DataFrame, horizon: int = 24) -> go.Figure:
+    import plotly.graph_objects as go
     sub = df[df["month"]<=max(60, horizon)]
     fig = go.Figure()
     fig.add_trace(go.Scatter(
@@ -23,4 +27,8 @@ def render_survival_curve(df: pd.DataFrame, horizon: int = 24):
         yaxis_title="Probabilidad",
         legend=dict(orientation="h")
     )
-    st.plotly_chart(fig, use_container_width=True)
+    return fig
+
+def render_survival_curve(df: pd.DataFrame, horizon: int = 24, fig: go.Figure | None = None):
+    # fig: figura ya construida (p.ej. desde un memo) para no reconstruirla
+    st.plotly_chart(fig if fig is not None else survival_figure(df, horizon), use_container_width=True)
@@ -1,16 +1,23 @@
 # pages/05_FSFB_Checkeo_Ejecutivo.py
 from __future__ import annotations
-import io
+import os
 import numpy as np
 import pandas as pd
 import streamlit as st
 
 from services.settings import inject_css, debug_toggle, debug, CorpusTheme, get_debug
+from services.model_registry import get_model, model_version, FSFB
+from services.memo import LRUMemo
+from services.memory_governor import deep_size, register_resource
+from services.batch_reports import reports_zip_path
 from services.risk_engine import (
     FEATURE_CONFIG, compute_risk_and_survival, explain_contributions,
-    risk_tier, DUMMY_ORDERED_COLS, make_dummy_population, recommended_actions
+    risk_tier, DUMMY_ORDERED_COLS, make_dummy_population, recommended_actions,
+    compute_risk_multi_horizon, profile_key
 )
-from components.survival_plot import render_survival_curve
+from components.downloads import download_menu
+from components.drift_panel import drift_panel
+from components.survival_plot import render_survival_curve, survival_figure
 from components.ui_blocks import kpi_card, pill, section_header
 
 st.set_page_config(
@@ -28,6 +35,19 @@ login_required("Corpus AI · Pilotos Hospitalarios")
 
 section_header("🩺 FSFB • Checkeo Ejecutivo", subtitle="Evaluación cardio-renal preventiva con explicabilidad y recomendación personalizada")
 
+@st.cache_resource(show_spinner=False)
+def _evaluation_memo() -> LRUMemo:
+    # compartido por las sesiones del proceso: un perfil ya evaluado por otra enfermera también acierta
+    return LRUMemo(maxsize=512)
+
+register_resource("checkeo._evaluation_memo", lambda: deep_size(_evaluation_memo()), lambda: _evaluation_memo().clear())
+
+def _evaluate(row: dict, horizon: int) -> dict:
+    model = get_model(FSFB)
+    risk, survival_df, meta = compute_risk_and_survival(row, horizon_months=horizon, model=model)
+    return {"risk": risk, "survival": survival_df, "meta": meta,
+            "contrib": explain_contributions(row, model), "fig": survival_figure(survival_df, horizon)}
+
 tab_individual, tab_lote, tab_ayuda = st.tabs(["Evaluación individual", "Carga por lotes (CSV)", "Ayuda / Descargables"])
 
 with tab_individual:
@@ -75,8 +95,12 @@ with tab_individual:
         }
         debug(f"INPUT: {row}")
 
-        risk, survival_df, meta = compute_risk_and_survival(row, horizon_months=horizon)
-        contrib = explain_contributions(row)
+        # llave: perfil normalizado + horizonte + versión del modelo (un artefacto nuevo invalida solo)
+        memo = _evaluation_memo()
+        res = memo.get_or_compute((profile_key(row), horizon, model_version(FSFB)), lambda: _evaluate(row, horizon))
+        risk, survival_df, meta, contrib = res["risk"], res["survival"], res["meta"], res["contrib"]
+        ms = memo.stats()
+        debug(f"Memo evaluación: {ms['hits']} hits / {ms['misses']} misses ({ms['hit_rate']:.0%}), {ms['size']}/{ms['maxsize']} perfiles")
 
         tier = risk_tier(risk)
         cA, cB, cC = st.columns([1.2,1,1])
@@ -89,7 +113,7 @@ with tab_individual:
 
         with st.container(border=True):
             st.markdown("**Supervivencia estimada** (modelo paramétrico estilo Weibull ajustado a perfil)")
-            render_survival_curve(survival_df, horizon)
+            render_survival_curve(survival_df, horizon, fig=res["fig"])
 
         st.markdown("### Principales impulsores del riesgo (explicabilidad)")
         c1, c2 = st.columns([1.1, 1])
@@ -113,36 +137,50 @@ with tab_lote:
 
     # Plantilla
     template_df = pd.DataFrame([{}], columns=DUMMY_ORDERED_COLS).fillna("")
-    buf = io.BytesIO()
-    template_df.to_csv(buf, index=False)
-    st.download_button("📄 Descargar plantilla CSV", data=buf.getvalue(), file_name="fsfb_checkeo_ejecutivo_template.csv", use_container_width=True)
+    st.download_button("📄 Descargar plantilla CSV", data=lambda: template_df.to_csv(index=False), file_name="fsfb_checkeo_ejecutivo_template.csv", mime="text/csv", use_container_width=True)
 
     # Uploader
     file = st.file_uploader("Sube tu CSV", type=["csv"])
     if file:
         df = pd.read_csv(file)
+        drift_panel(file, "fsfb")
         missing = [c for c in DUMMY_ORDERED_COLS if c not in df.columns]
         if missing:
             st.error(f"Faltan columnas obligatorias: {missing}")
             st.stop()
 
         st.success(f"Archivo recibido: {df.shape[0]} filas.")
-        out_rows = []
-        for _, r in df.iterrows():
-            risk, s_df, meta = compute_risk_and_survival(r.to_dict(), horizon_months=24)
-            out_rows.append({
-                **r.to_dict(),
-                "risk_pct_24m": np.round(risk,1),
-                "risk_tier_24m": risk_tier(risk),
-                "peak_start_m": meta["peak_window"][0],
-                "peak_end_m": meta["peak_window"][1]
-            })
-        out = pd.DataFrame(out_rows)
+        horizons = st.multiselect("Horizontes (meses)", [6,12,24,36,60], default=[6,12,24,36,60])
+        if not horizons:
+            horizons = [24]
+        # Una sola pasada vectorizada sobre (k, lam) para todos los horizontes
+        out = pd.concat([df, compute_risk_multi_horizon(df, horizons, model=get_model(FSFB))], axis=1)
         st.dataframe(out, use_container_width=True)
 
-        down = io.BytesIO()
-        out.to_csv(down, index=False)
-        st.download_button("⬇️ Descargar resultados", data=down.getvalue(), file_name="fsfb_checkeo_resultados.csv", use_container_width=True)
+        download_menu(out, "fsfb_checkeo_resultados", label="⬇️ Descargar resultados", use_container_width=True)
+
+        # Reporte individual por fila (mismo contenido que la evaluación individual), en un zip
+        st.markdown("#### Reportes individuales")
+        r1, r2 = st.columns([1, 2])
+        rep_h = r1.select_slider("Horizonte del reporte (meses)", options=[6,12,24,36,60], value=24)
+        rep_key = f"reportes_{file.file_id}_{rep_h}"
+        if r2.button(f"🗂️ Generar {len(df)} reportes (HTML en zip)", use_container_width=True):
+            bar = st.progress(0.0, text="Generando reportes…")
+            step = max(1, len(df) // 100)
+
+            def _progress(done: int, total: int):
+                if done == total or done % step == 0:
+                    bar.progress(done / total, text=f"{done}/{total} reportes")
+
+            st.session_state[rep_key] = reports_zip_path(df, rep_h, progress=_progress)
+            bar.empty()
+        rep_path = st.session_state.get(rep_key)
+        if rep_path and os.path.exists(rep_path):
+            def _zip_bytes(path=rep_path) -> bytes:
+                with open(path, "rb") as f:
+                    return f.read()
+            st.download_button("⬇️ Descargar reportes (zip)", data=_zip_bytes, file_name=f"fsfb_reportes_{rep_h}m.zip",
+                               mime="application/zip", use_container_width=True)
 
 with tab_ayuda:
     st.markdown("""
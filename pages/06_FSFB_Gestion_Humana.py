@@ -1,15 +1,20 @@
 # pages/06_FSFB_Gestion_Humana.py
 from __future__ import annotations
 import io
-import numpy as np
 import pandas as pd
 import streamlit as st
-import plotly.express as px
 
 from services.settings import inject_css, debug_toggle, debug, CorpusTheme
 from services.risk_engine import (
-    make_dummy_population, compute_risk_and_survival, risk_tier, explain_contributions
+    make_dummy_population, compute_risk_and_survival, risk_tier, explain_contributions,
+    compute_risk_multi_horizon, program_rosters
 )
+from services.chart_data import cached_histogram
+from services.data import dataset_key
+from services.query_engine import filter_mask
+from services.memory_governor import remember
+from services.model_registry import get_model, FSFB
+from components.downloads import download_menu
 from components.survival_plot import render_survival_curve
 from components.ui_blocks import kpi_card, section_header
 
@@ -26,11 +31,12 @@ login_required("Corpus AI · Pilotos Hospitalarios")
 
 section_header("👥 FSFB • Gestión Humana (Empleados)", subtitle="Prevención y bienestar con enfoque poblacional y privacidad por diseño")
 
-# Cohorte dummy (o reemplazar por integración)
-if "hr_employees" not in st.session_state:
-    st.session_state.hr_employees = make_dummy_population(400, include_dept=True)
-
-df = st.session_state.hr_employees.copy()
+# Cohorte dummy (o reemplazar por integración); recalculable: el gobernador de memoria puede desalojarla
+base = remember("hr_employees", lambda: make_dummy_population(400, include_dept=True))
+# Riesgo a 24m sobre toda la población (por fila: filtrar antes o después da lo mismo)
+if "risk_pct_24m" not in base.columns:
+    base = base.join(compute_risk_multi_horizon(base, [24], model=get_model(FSFB))[["risk_pct_24m","risk_tier_24m"]])
+df = base
 
 # Filtros
 with st.expander("🔎 Filtros de cohorte"):
@@ -42,21 +48,15 @@ with st.expander("🔎 Filtros de cohorte"):
     age_max = c4.slider("Edad máxima", 20, 85, 65)
     apply = st.button("Aplicar filtros", use_container_width=True)
 
+# Filtros: máscara booleana sobre la cohorte en memoria
+where = []
 if apply:
     if dept != "Todos":
-        df = df[df["department"]==dept]
+        where.append(("department", "==", dept))
     if sex != "Todos":
-        df = df[df["sex"]==sex]
-    df = df[(df["age"]>=age_min) & (df["age"]<=age_max)]
-
-# Agregados: riesgo a 24m si no existe
-if "risk_pct_24m" not in df.columns:
-    risks = []
-    for _, r in df.iterrows():
-        risk, s_df, meta = compute_risk_and_survival(r.to_dict(), 24)
-        risks.append(risk)
-    df["risk_pct_24m"] = np.round(risks, 1)
-    df["risk_tier_24m"] = df["risk_pct_24m"].apply(risk_tier)
+        where.append(("sex", "==", sex))
+    where.append(("age", "between", (age_min, age_max)))
+    df = base[filter_mask(base, where)]
 
 # Privacidad (k-anonymity simple)
 K_MIN = 10
@@ -64,21 +64,46 @@ if df.shape[0] < K_MIN:
     st.warning("⚠️ Para proteger la privacidad, los agregados se muestran solo con 10+ empleados. Ajusta los filtros.")
 else:
     # KPIs poblacionales
+    tiers = df.groupby("risk_tier_24m", as_index=False).agg(n=("risk_pct_24m", "count"), suma=("risk_pct_24m", "sum"))
+    n_emp = int(tiers["n"].sum())
+    share = dict(zip(tiers["risk_tier_24m"], tiers["n"] / n_emp))
     c1, c2, c3, c4 = st.columns(4)
-    c1.metric("Empleados analizados", df.shape[0])
-    c2.metric("Riesgo medio (24m)", f"{df['risk_pct_24m'].mean():.1f}%")
-    c3.metric("Alto riesgo", f"{(df['risk_tier_24m']=='alto').mean()*100:.1f}%")
-    c4.metric("Medio riesgo", f"{(df['risk_tier_24m']=='medio').mean()*100:.1f}%")
+    c1.metric("Empleados analizados", n_emp)
+    c2.metric("Riesgo medio (24m)", f"{tiers['suma'].sum() / n_emp:.1f}%")
+    c3.metric("Alto riesgo", f"{share.get('alto', 0)*100:.1f}%")
+    c4.metric("Medio riesgo", f"{share.get('medio', 0)*100:.1f}%")
 
     st.markdown("### Distribución de riesgo (24 meses)")
-    fig = px.histogram(df, x="risk_pct_24m", nbins=20, title="Histograma de riesgo (24m)")
+    # Bins fijos calculados en servidor (cache por dataset + filtros); Plotly recibe solo conteos
+    import plotly.graph_objects as go
+    bins = cached_histogram(dataset_key(df, ["employee_id","risk_pct_24m"]), df["risk_pct_24m"].to_numpy())
+    fig = go.Figure(go.Bar(
+        x=bins["bin_mid"], y=bins["count"], width=bins["bin_end"]-bins["bin_start"],
+        customdata=bins[["bin_start","bin_end"]],
+        hovertemplate="%{customdata[0]:.0f}–%{customdata[1]:.0f}%: %{y}<extra></extra>"
+    ))
+    fig.update_layout(title="Histograma de riesgo (24m)", bargap=0.05)
     fig.update_layout(template="plotly_dark", xaxis_title="Riesgo (%)", yaxis_title="Frecuencia")
     st.plotly_chart(fig, use_container_width=True)
 
     # Tabla priorizada
     st.markdown("### Lista priorizada (top 50 por riesgo)")
-    top = df.sort_values("risk_pct_24m", ascending=False).head(50).reset_index(drop=True)
-    st.dataframe(top[["employee_id","department","age","sex","risk_pct_24m","risk_tier_24m"]], use_container_width=True)
+    top = df.nlargest(50, "risk_pct_24m")[["employee_id","department","age","sex","risk_pct_24m","risk_tier_24m"]] \
+        .reset_index(drop=True)
+    st.dataframe(top, use_container_width=True)
+
+    # Programas: misma tabla de reglas que la recomendación individual, evaluada sobre toda la cohorte
+    st.markdown("### Programas de intervención (elegibles)")
+    rosters, counts = program_rosters(df, id_col="employee_id")
+    p1, p2 = st.columns([1, 1.2])
+    with p1:
+        st.dataframe(counts.to_frame(), use_container_width=True)
+    with p2:
+        prog = st.selectbox("Programa", counts.index.tolist())
+        roster = df[df["employee_id"].isin(rosters[prog])].sort_values("risk_pct_24m", ascending=False)
+        st.dataframe(roster[["employee_id","department","risk_pct_24m","risk_tier_24m"]], use_container_width=True, height=240)
+        download_menu(roster[["employee_id","department","risk_tier_24m"]], f"inscripcion_{prog.lower().replace(' ', '_')}",
+                      label="⬇️ Descargar lista de inscripción", widget_key="inscripcion", use_container_width=True)
 
 st.markdown("---")
 st.subheader("Búsqueda y revisión individual (con consentimiento)")
@@ -99,9 +124,9 @@ if st.button("Consultar empleado", use_container_width=True):
         st.stop()
 
     row = df[df["employee_id"]==emp_id].iloc[0].to_dict()
-    risk, s_df, meta = compute_risk_and_survival(row, horizon)
+    risk, s_df, meta = compute_risk_and_survival(row, horizon, get_model(FSFB))
     tier = risk_tier(risk)
-    contrib = explain_contributions(row)
+    contrib = explain_contributions(row, get_model(FSFB))
 
     k1, k2, k3 = st.columns(3)
     k1.metric("Risk factor", f"{risk:.1f}%")
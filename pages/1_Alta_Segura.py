@@ -2,28 +2,41 @@
 from __future__ import annotations
 import streamlit as st
 import pandas as pd
-from components.charts import survival_curve_chart, top_features_bar, donut_gauge
-from components.cards import kpi, risk_chip, section
+from datetime import date, timedelta
+from components.cards import kpi, section
+from components.patient_panel import patient_picker, render_patient_detail
 from components.tables import style_risk_table
-from services.data_loader import load_csv, days_between
-from services.risk_api import score_batch
+from components.drift_panel import drift_panel
+from services.data_loader import load_csv
+from services.model_registry import cached_score_batch
+from services.patient_store import cached_patient_store
+from services.action_store import ActionStore
 from services.settings import inject_css, debug, debug_toggle
 
 st.set_page_config(page_title="Alta Segura 30D", page_icon="✅", layout="wide")
 inject_css(); debug_toggle()
-from services.auth import login_required
+from services.auth import login_required, SESS_AUTH_USER
 login_required("Corpus AI · Pilotos Hospitalarios")
 
+PAGE_SIZE = 20
+
+@st.cache_resource(show_spinner=False)
+def _action_store() -> ActionStore:
+    # una sola bitácora por proceso; las sesiones leen lo que escriben las demás
+    return ActionStore()
+
 
 st.header("✅ Alta Segura 30D")
 uploaded = st.file_uploader("Sube CSV de egresos (opcional). Si omites, se usa dataset dummy.", type=["csv"])
 df = load_csv(uploaded)
+drift_panel(uploaded, "egresos")
 
 # Derivados
-df["day_estancia"] = df.apply(lambda r: days_between(r["fecha_ingreso"], r["fecha_egreso_prevista"]), axis=1)
+df["day_estancia"] = (pd.to_datetime(df["fecha_egreso_prevista"]) - pd.to_datetime(df["fecha_ingreso"])).dt.days
 
 # Scoring
-scored = score_batch(df)
+scored = cached_score_batch(df)
+patients = cached_patient_store(df, scored)
 st.success("Datos listos y riesgos calculados.")
 
 # KPIs
@@ -47,30 +60,55 @@ st.dataframe(style_risk_table(dfv), use_container_width=True, height=380)
 
 # Detalle de paciente
 section("Detalle de paciente", "Explana la predicción y registra acciones")
-pid = st.selectbox("Paciente", dfv["patient_id"].unique())
-row = dfv[dfv["patient_id"]==pid].iloc[0]
-
-c1, c2 = st.columns([1,1])
-with c1:
-    st.altair_chart(donut_gauge(float(row["risk_factor"]), "Riesgo"), use_container_width=True)
-    st.markdown(f"Nivel: {risk_chip(float(row['risk_factor']))}", unsafe_allow_html=True)
-    st.markdown(f"**Ventana:** {int(row['t_start_days'])}-{int(row['t_end_days'])} días")
-with c2:
-    st.altair_chart(survival_curve_chart(row["surv_curve"], height=180), use_container_width=True)
-    st.altair_chart(top_features_bar(row["top_features"], height=140), use_container_width=True)
-
-st.subheader("Plan de alta")
-accion = st.selectbox("Acción realizada", ["--","Educación reforzada","Telemonitoreo 30d","Visita domiciliaria","Trabajo social","Ajuste medicación"])
-nota = st.text_input("Notas (opcional)")
-if "acciones" not in st.session_state: st.session_state.acciones = []
-if st.button("💾 Guardar acción"):
-    st.session_state.acciones.append({"patient_id": pid, "accion": accion, "nota": nota})
-    st.success("Acción registrada.")
-
-if st.session_state.get("acciones"):
-    acts = pd.DataFrame(st.session_state.acciones)
-    st.write("Historial de acciones")
-    st.dataframe(acts, use_container_width=True)
-    st.download_button("⬇️ Exportar acciones a CSV", acts.to_csv(index=False).encode("utf-8"), "acciones_alta_segura.csv", "text/csv")
+allowed = patients.df["servicio"].isin(svc).to_numpy() if svc else None
+sel = patient_picker(patients, allowed=allowed, key="alta_paciente")
+store = _action_store()
+
+if sel is not None:
+    pid = patients.label(sel)
+    render_patient_detail(patients, sel)
+    debug(f"Detalle paciente (LRU): {patients.stats()}")
+
+    st.subheader("Plan de alta")
+    accion = st.selectbox("Acción realizada", ["--","Educación reforzada","Telemonitoreo 30d","Visita domiciliaria","Trabajo social","Ajuste medicación"])
+    nota = st.text_input("Notas (opcional)")
+    if st.button("💾 Guardar acción"):
+        if accion == "--":
+            st.warning("Selecciona una acción.")
+        else:
+            store.append([{"patient_id": pid, "accion": accion, "nota": nota,
+                           "usuario": st.session_state.get(SESS_AUTH_USER, "")}])
+            st.success("Acción registrada.")
+
+    # Historial del paciente (visible para todo el equipo), paginado por id: cada página es una
+    # consulta de PAGE_SIZE filas con before_id = último id de la anterior
+    n_hist = store.count(pid)
+    if n_hist:
+        st.write(f"Historial de acciones del paciente ({n_hist})")
+        pages = st.session_state.setdefault("acciones_pag", {})
+        if pages.get("pid") != pid:
+            pages.clear(); pages.update(pid=pid, cursors=[None])     # before_id de cada página visitada
+        cursors = pages["cursors"]
+        hist = store.patient_history(pid, limit=PAGE_SIZE, before_id=cursors[-1])
+        st.dataframe(hist.drop(columns=["id"]), use_container_width=True, hide_index=True)
+        first = (len(cursors) - 1) * PAGE_SIZE
+        st.caption(f"Acciones {first + 1}–{first + len(hist)} de {n_hist}")
+        p1, p2 = st.columns(2)
+        if len(cursors) > 1 and p1.button("◀ Más recientes"):
+            cursors.pop()
+            st.rerun()
+        if len(hist) == PAGE_SIZE and first + len(hist) < n_hist and p2.button("Ver más ▶"):
+            cursors.append(int(hist["id"].iloc[-1]))
+            st.rerun()
+
+with st.expander("Acciones recientes de la sala"):
+    d1, d2 = st.columns(2)
+    desde = d1.date_input("Desde", value=date.today() - timedelta(days=7))
+    hasta = d2.date_input("Hasta", value=date.today())
+    st.dataframe(store.recent(50, fecha_desde=desde.isoformat(), fecha_hasta=hasta.isoformat()).drop(columns=["id"]),
+                 use_container_width=True, hide_index=True)
+    # se genera solo al hacer clic (la bitácora cambia, así que no se cachea)
+    st.download_button("⬇️ Exportar acciones a CSV", lambda: store.export_csv(desde.isoformat(), hasta.isoformat()),
+                       "acciones_alta_segura.csv", "text/csv")
 
 debug("Página Alta Segura renderizada")
@@ -5,8 +5,15 @@ import pandas as pd
 from components.cards import kpi, section
 from components.charts import occupancy_heatmap
 from components.tables import style_risk_table
-from services.data_loader import load_csv, days_between
-from services.risk_api import score_batch
+from components.drift_panel import drift_panel
+from components.dataset_source import historic_source
+from services.chart_data import cached_heatmap
+from services.data import dataset_key
+from services.data_loader import load_csv
+from services.model_registry import cached_score_batch, get_model, model_version, ALTA_SEGURA
+from services.census_stream import CensusEngine, append_events, live_engines, simulate_events
+from services.memory_governor import deep_size, register_resource
+from services.query_engine import filter_mask
 from services.settings import inject_css, debug_toggle, debug
 
 st.set_page_config(page_title="Censo Inteligente", page_icon="🛏️", layout="wide")
@@ -17,28 +24,63 @@ login_required("Corpus AI · Pilotos Hospitalarios")
 
 
 st.header("🛏️ Censo Inteligente")
-uploaded = st.file_uploader("Sube CSV de censo (opcional). Si omites, se usa dataset dummy.", type=["csv"])
-df = load_csv(uploaded)
+hist = historic_source("censo", default_days=30)   # p.ej. censo solo de Cardiología
+if hist is None:
+    uploaded = st.file_uploader("Sube CSV de censo (opcional). Si omites, se usa dataset dummy.", type=["csv"])
+    df = load_csv(uploaded)
+    drift_panel(uploaded, "egresos")
+else:
+    df = hist
 
-df["day_estancia"] = df.apply(lambda r: max(0, days_between(r["fecha_ingreso"], r["fecha_egreso_prevista"])), axis=1)
-scored = score_batch(df)
+modo = st.radio("Fuente del censo", ["Snapshot CSV", "Flujo ADT (incremental)"], horizontal=True)
+
+if modo == "Snapshot CSV":
+    df["day_estancia"] = (pd.to_datetime(df["fecha_egreso_prevista"]) - pd.to_datetime(df["fecha_ingreso"])).dt.days.clip(lower=0)
+    scored = df if hist is not None else cached_score_batch(df)
+    heat_cols = ["servicio","day_estancia","risk_factor"]
+    # Agregado en servidor y cacheado por dataset: Vega recibe solo celdas servicio × día
+    cells = cached_heatmap(dataset_key(scored, heat_cols), scored[heat_cols])
+    n_pac, risk_mean, n_red = len(scored), scored["risk_factor"].mean(), int((scored["risk_factor"]>=0.40).sum())
+else:
+    # Motor compartido por todas las sesiones del worker (tablero de camas único)
+    @st.cache_resource(show_spinner=False)
+    def _census_engine(key: str, _snapshot: pd.DataFrame) -> CensusEngine:
+        return CensusEngine(_snapshot, model=get_model(ALTA_SEGURA))
+
+    # recalculable: un motor nuevo re-puntúa el snapshot y re-aplica su archivo ADT completo
+    register_resource("censo._census_engine", lambda: deep_size(live_engines()), _census_engine.clear)
+
+    # la versión del modelo va en la llave: un artefacto nuevo re-puntúa el censo una vez
+    engine = _census_engine(dataset_key(df, extra=model_version(ALTA_SEGURA)), df)
+    b1, b2, b3 = st.columns([1,1,2])
+    if b1.button("🔄 Sincronizar ADT", use_container_width=True):
+        pass  # el poll se hace en cada rerun; el botón solo fuerza el rerun
+    if b2.button("🧪 Simular 20 eventos", use_container_width=True):
+        append_events(simulate_events(engine, 20), engine.events_path)
+    engine.poll()
+    b3.caption(f"Eventos aplicados: {engine.stats['events']} · Re-puntuados: {engine.stats['rescored']} · "
+               f"Descartados: {engine.stats['skipped']} · Offset: {engine.offset} B")
+    scored = engine.frame()
+    cells = engine.heatmap_cells()
+    k = engine.kpis()
+    n_pac, risk_mean, n_red = k["n"], k["risk_mean"], k["red"]
 
 c1, c2, c3 = st.columns(3)
-kpi("Pacientes", f"{len(scored)}", cols=c1)
-kpi("Riesgo medio", f"{scored['risk_factor'].mean():.0%}", cols=c2)
-kpi("Rojos por cama", f"{(scored['risk_factor']>=0.40).sum()}", "Conteo actual", cols=c3)
+kpi("Pacientes", f"{n_pac}", cols=c1)
+kpi("Riesgo medio", f"{risk_mean:.0%}", cols=c2)
+kpi("Rojos por cama", f"{n_red}", "Conteo actual", cols=c3)
 
 st.divider()
 section("Mapa de calor por servicio", "Riesgo medio vs día de estancia")
-st.altair_chart(occupancy_heatmap(scored), use_container_width=True)
+st.altair_chart(occupancy_heatmap(cells), use_container_width=True)
 
 st.divider()
 section("Censo cama a cama", "Filtra por servicio o municipio")
 svc = st.multiselect("Servicio", sorted(scored["servicio"].unique().tolist()))
 muni = st.multiselect("Municipio", sorted(scored["municipio"].unique().tolist()))
-dfv = scored.copy()
-if svc: dfv = dfv[dfv["servicio"].isin(svc)]
-if muni: dfv = dfv[dfv["municipio"].isin(muni)]
+# el censo ya está en memoria: máscara booleana, sin registrar una copia en el motor
+where = ([("servicio", "in", svc)] if svc else []) + ([("municipio", "in", muni)] if muni else [])
+dfv = scored[filter_mask(scored, where)] if where else scored
 dfv = dfv.sort_values(["servicio","risk_factor"], ascending=[True,False])
 
 st.dataframe(style_risk_table(dfv), use_container_width=True, height=420)
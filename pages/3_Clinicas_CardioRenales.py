@@ -1,13 +1,19 @@
 # pages/3_Clinicas_CardioRenales.py
 from __future__ import annotations
 import streamlit as st
-import pandas as pd
 import numpy as np
-from datetime import date, timedelta
+from datetime import date
+from components.downloads import download_menu
 from components.cards import kpi, section
-from components.charts import deciles_km_chart, survival_curve_chart
+from components.charts import survival_curve_chart
+from components.dataset_source import historic_filter, historic_scan
+from components.drift_panel import drift_panel
+from components.survival_cohorts import MAX_CURVES, render_cohort_survival
 from services.data_loader import load_csv
-from services.risk_api import score_batch
+from services.model_registry import cached_score_batch
+from services.quantiles import assign_deciles
+from services.query_engine import filter_mask
+from services.scheduler import clinic_calendar, schedule_followups, schedule_load, HORIZON_DAYS
 from services.settings import inject_css, debug_toggle, debug
 
 st.set_page_config(page_title="Clínicas Cardio-Renales", page_icon="🫀", layout="wide")
@@ -18,59 +24,74 @@ login_required("Corpus AI · Pilotos Hospitalarios")
 
 
 st.header("🫀 Clínicas Cardio-Renales (Seguimiento Intensivo)")
-uploaded = st.file_uploader("Sube CSV (opcional). Si omites, se usa dataset dummy.", type=["csv"])
-df = load_csv(uploaded)
-scored = score_batch(df)
+hist = historic_filter("cohortes", default_days=180)
+if hist is None:
+    uploaded = st.file_uploader("Sube CSV (opcional). Si omites, se usa dataset dummy.", type=["csv"])
+    df = load_csv(uploaded)
+    drift_panel(uploaded, "egresos")
+    scored = cached_score_batch(df)
 
 # Constructor de cohortes
 st.subheader("Constructor de cohortes")
 c1, c2, c3, c4 = st.columns(4)
-svc = c1.multiselect("Servicio", sorted(scored["servicio"].unique().tolist()))
+if hist is None:
+    svc = c1.multiselect("Servicio", sorted(scored["servicio"].unique().tolist()))
+else:
+    c1.caption("Servicios y fechas: los del histórico (arriba)")
 hba = c2.slider("HbA1c mínima", 4.5, 13.5, 7.0, 0.1)
 cre = c3.slider("Creatinina mínima", 0.4, 6.0, 1.2, 0.1)
 poly = c4.slider("Polifarmacia mínima", 0, 18, 5, 1)
 
-cohort = scored[
-    (scored["hba1c"] >= hba) &
-    (scored["creatinina"] >= cre) &
-    (scored["polifarmacia_n"] >= poly)
-]
-if svc: cohort = cohort[cohort["servicio"].isin(svc)]
+where = [("hba1c", ">=", hba), ("creatinina", ">=", cre), ("polifarmacia_n", ">=", poly)]
+if hist is None:
+    # CSV/dummy ya puntuado en memoria: máscara booleana (sin copiarlo a otra tabla)
+    if svc: where.append(("servicio", "in", svc))
+    cohort = scored[filter_mask(scored, where)]
+else:
+    # histórico: umbrales, servicios y fechas en una sola consulta del motor; solo vuelve la cohorte
+    cohort = historic_scan(hist, where, stop_if_empty=False)
 
 k1,k2,k3 = st.columns(3)
 kpi("Tamaño cohorte", f"{len(cohort)}", cols=k1)
 kpi("Riesgo medio (cohorte)", f"{cohort['risk_factor'].mean():.0%}" if len(cohort)>0 else "–", cols=k2)
 kpi("Mediana ventana (cohorte)", f"{int(cohort['t_start_days'].median())}-{int(cohort['t_end_days'].median())} días" if len(cohort)>0 else "–", cols=k3)
 
-# KM por deciles (promedio S(t) por decil de riesgo)
-st.subheader("Curvas KM por deciles de riesgo")
+# Supervivencia estimada por decil de riesgo: mediana y banda p10–p90 de S(t), agregadas en servidor
+st.subheader("Supervivencia por decil de riesgo (mediana y banda p10–p90)")
 if len(cohort) >= 10:
     cohort = cohort.copy()
-    cohort["decile"] = pd.qcut(cohort["risk_factor"], 10, labels=False) + 1
-    deciles = {}
-    for d in range(1,11):
-        sub = cohort[cohort["decile"]==d]
-        # Promedia S(t) por día
-        # (convertir lista de dicts a matriz)
-        ts = sorted({p["day"] for row in sub["surv_curve"] for p in row})
-        vals = []
-        for t in ts:
-            vals.append(np.mean([ [p["S"] for p in row if p["day"]==t][0] for row in sub["surv_curve"] ]))
-        deciles[d] = [{"day":int(t), "S":float(v)} for t,v in zip(ts, vals)]
-    st.altair_chart(deciles_km_chart(deciles), use_container_width=True)
+    # cohorte ya en memoria: cortes exactos (np.quantile); assign_deciles tolera cortes repetidos
+    cohort["decile"] = assign_deciles(cohort["risk_factor"], np.quantile(cohort["risk_factor"], np.arange(1, 10) / 10))
+    v1, v2 = st.columns(2)
+    bands = v1.toggle("Banda p10–p90 por decil", value=False)
+    curves = v2.toggle(f"Curvas individuales (hasta {MAX_CURVES:,}, WebGL)", value=False)
+    render_cohort_survival(cohort, "decile", bands=bands, curves=curves, prefix="Decil ")
 else:
-    st.info("Crea una cohorte con al menos 10 pacientes para ver KM por deciles.")
+    st.info("Crea una cohorte con al menos 10 pacientes para ver la supervivencia por deciles.")
 
-# Agenda sugerida (dentro de la ventana de mayor probabilidad)
+# Agenda sugerida (dentro de la ventana de mayor probabilidad, con cupos de clínica)
 st.subheader("Agenda sugerida (primer control)")
 today = date.today()
-def suggest_followup(t_start):
-    return today + timedelta(days=int(max(7, min(14, t_start))))
+a1, a2, a3 = st.columns(3)
+day_cap = a1.number_input("Cupos totales por día", 1, 2000, 60, 5)
+svc_cap = a2.number_input("Cupos por servicio y día", 1, 500, 12, 1)
+workdays = a3.toggle("Solo días hábiles", value=True)
 
 if len(cohort) > 0:
-    cohort["control_sugerido"] = cohort["t_start_days"].apply(suggest_followup)
-    show = cohort.sort_values("risk_factor", ascending=False)[["patient_id","servicio","risk_factor","t_start_days","t_end_days","control_sugerido"]]
+    cal = clinic_calendar(today, HORIZON_DAYS, day_cap, workdays_only=workdays)
+    agenda = schedule_followups(cohort, today, cal, int(svc_cap))
+    ok = agenda["estado"] == "agendado"
+    m1, m2, m3 = st.columns(3)
+    kpi("Agendados", f"{int(ok.sum())}", cols=m1)
+    kpi("Sin cupo en ventana", f"{int((~ok).sum())}", cols=m2)
+    kpi("Riesgo medio sin cupo", f"{agenda.loc[~ok, 'risk_factor'].mean():.0%}" if (~ok).any() else "–", cols=m3)
+    show = agenda.sort_values(["estado", "risk_factor"], ascending=[True, False])[
+        ["patient_id","servicio","risk_factor","t_start_days","t_end_days","control_fecha","control_hora","estado","motivo"]]
     show["riesgo"] = (show["risk_factor"]*100).round(0).astype(int).astype(str) + "%"
     st.dataframe(show.drop(columns=["risk_factor"]), use_container_width=True, height=380)
-    st.download_button("⬇️ Exportar agenda CSV", show.to_csv(index=False).encode("utf-8"), "agenda_sugerida.csv", "text/csv")
+    load = schedule_load(agenda)
+    if len(load):
+        st.bar_chart(load, x="semana", y="citas", color="servicio", height=220)
+    download_menu(show, "agenda_sugerida", label="⬇️ Exportar agenda")
+    debug(f"Agenda: {int(ok.sum())} agendados, {int((~ok).sum())} sin cupo")
 debug("Página Clínicas Cardio-Renales renderizada")
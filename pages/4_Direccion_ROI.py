@@ -3,11 +3,20 @@ from __future__ import annotations
 import streamlit as st
 import pandas as pd
 import numpy as np
+from components.downloads import download_menu
 from components.cards import kpi, section
-from components.charts import survival_curve_chart
+from components.patient_panel import patient_picker, render_patient_survival
+from components.drift_panel import drift_panel
+from components.dataset_source import historic_source
+from components.survival_cohorts import MAX_CURVES, render_cohort_survival
 from services.data_loader import load_csv
-from services.risk_api import score_batch
-from services.whatif import expected_avoided_events, roi
+from services.risk_api import event_rate
+from services.model_registry import cached_score_batch
+from services.patient_store import cached_patient_store
+from services.quantiles import cached_score_sketches, coverage_order, top_threshold
+from services.whatif import (
+    expected_avoided_events, roi, optimize_targeting, per_patient_values, scenario_grid, monte_carlo_roi
+)
 from services.settings import inject_css, debug_toggle, debug
 
 st.set_page_config(page_title="Dirección & Contratos (ROI)", page_icon="📊", layout="wide")
@@ -15,12 +24,20 @@ inject_css(); debug_toggle()
 
 from services.auth import login_required
 login_required("Corpus AI · Pilotos Hospitalarios")
+import altair as alt   # después del login: la pantalla de acceso no paga la importación
 
 
 st.header("📊 Dirección & Contratos (ROI/Calidad)")
-uploaded = st.file_uploader("Sube CSV (opcional). Si omites, se usa dataset dummy.", type=["csv"])
-df = load_csv(uploaded)
-scored = score_batch(df)
+hist = historic_source("roi", default_days=90)   # p.ej. últimos 90 días: solo esas particiones
+if hist is None:
+    uploaded = st.file_uploader("Sube CSV (opcional). Si omites, se usa dataset dummy.", type=["csv"])
+    df = load_csv(uploaded)
+    drift_panel(uploaded, "egresos")
+    scored = cached_score_batch(df)
+else:
+    df = scored = hist   # ya puntuado al ingresar al histórico
+patients = cached_patient_store(df, scored)   # antes de añadir columnas al df de la página
+risk_sketch = cached_score_sketches(df, scored)["risk_factor"]
 
 st.subheader("Supuestos del escenario")
 c1, c2, c3, c4 = st.columns(4)
@@ -29,18 +46,16 @@ efficacy = c2.slider("Eficacia intervención", 0, 100, 25, 5) / 100
 cost_event = c3.number_input("Costo por evento (USD)", min_value=100.0, value=2500.0, step=100.0)
 cost_program = c4.number_input("Costo por paciente tratado (USD)", min_value=5.0, value=45.0, step=5.0)
 
-# Baseline: tasa de evento a 30 días ~ 1 - S(30)
-def event_rate_30(row):
-    s30 = [p["S"] for p in row if p["day"]==30]
-    return 1.0 - (s30[0] if s30 else 0.85)
+# Baseline: tasa de evento a 30 días ~ 1 - S(30) (vectorizado desde el hazard)
+scored["event_rate_30d"] = event_rate(scored, 30)
 
-scored["event_rate_30d"] = scored["surv_curve"].apply(event_rate_30)
-
-# Tratados = top por riesgo * cobertura
-scored = scored.sort_values("risk_factor", ascending=False)
+# Tratados = top por riesgo * cobertura: umbral del t-digest en vez de ordenar la cohorte completa
 n_total = len(scored)
 n_target = int(np.ceil(n_total * coverage))
-baseline_rate = scored.head(n_target)["event_rate_30d"].mean() if n_target>0 else 0.0
+threshold = top_threshold(risk_sketch, coverage)
+# tasa media del Top: filtro por umbral sobre el frame en memoria (sin ORDER BY)
+in_top = scored["risk_factor"].to_numpy() >= threshold
+baseline_rate = float(scored["event_rate_30d"].to_numpy()[in_top].mean()) if n_target>0 and in_top.any() else 0.0
 
 avoided = expected_avoided_events(n_total, baseline_rate, coverage, efficacy)
 benefits, costs, ratio = roi(avoided, cost_event, cost_program, n_target)
@@ -51,16 +66,90 @@ kpi("Tratados (cobertura)", f"{n_target}", f"{coverage:.0%} del total", cols=k2)
 kpi("Eventos evitados (30d)", f"{avoided:.1f}", f"Tasa base ~{baseline_rate:.0%}", cols=k3)
 kpi("ROI", f"{ratio:.2f}x", f"Beneficio vs. costo", cols=k4)
 
+st.divider()
+section("Optimización con presupuesto", "Eficacia y costo por servicio; selección greedy por eventos evitados por USD")
+servicios = sorted(scored["servicio"].unique().tolist())
+o1, o2 = st.columns([1, 2])
+budget = o1.number_input("Presupuesto (USD)", min_value=0.0, value=float(cost_program * n_target), step=500.0)
+params = o2.data_editor(
+    pd.DataFrame({"servicio": servicios, "eficacia": efficacy, "costo_paciente": cost_program}),
+    hide_index=True, use_container_width=True, disabled=["servicio"], key="roi_params_servicio"
+)
+eff_i = per_patient_values(scored["servicio"], dict(zip(params["servicio"], params["eficacia"])), efficacy)
+cost_i = per_patient_values(scored["servicio"], dict(zip(params["servicio"], params["costo_paciente"])), cost_program)
+selected, frontier = optimize_targeting(scored["event_rate_30d"].to_numpy(), cost_i, eff_i, budget, cost_event)
+
+opt = frontier[frontier["seleccion"]].iloc[0]
+m1, m2, m3 = st.columns(3)
+kpi("Tratados (óptimo)", f"{int(opt['n_tratados'])}", f"{opt['cobertura']:.0%} · USD {opt['costo']:,.0f}", cols=m1)
+kpi("Eventos evitados (óptimo)", f"{opt['eventos_evitados']:.1f}", f"vs. {avoided:.1f} con Top riesgo", cols=m2)
+kpi("ROI (óptimo)", f"{opt['roi']:.2f}x" if pd.notna(opt["roi"]) else "–", "Beneficio vs. costo", cols=m3)
+
+# Frontera completa (cobertura → eventos evitados → ROI) en un solo barrido
+base = alt.Chart(frontier).mark_line().encode(
+    x=alt.X("costo:Q", title="Costo acumulado (USD)"),
+    y=alt.Y("eventos_evitados:Q", title="Eventos evitados (30d)"),
+    tooltip=[alt.Tooltip("cobertura:Q", format=".0%"), "n_tratados", alt.Tooltip("eventos_evitados:Q", format=".1f"), alt.Tooltip("roi:Q", format=".2f")]
+)
+point = alt.Chart(frontier[frontier["seleccion"]]).mark_point(size=90, filled=True).encode(x="costo:Q", y="eventos_evitados:Q")
+st.altair_chart((base + point).properties(height=240), use_container_width=True)
+scored["seleccion_optima"] = selected
+
+st.divider()
+section("Escenarios e incertidumbre", "Grid cobertura × eficacia × costo por evento y bandas Monte Carlo (IC 90%)")
+u1, u2, u3 = st.columns(3)
+eff_sd = u1.slider("Incertidumbre eficacia (DE)", 0.0, 0.20, 0.05, 0.01)
+cost_sd = u2.number_input("Incertidumbre costo por evento (DE, USD)", min_value=0.0, value=float(cost_event*0.2), step=100.0)
+n_draws = u3.select_slider("Simulaciones", options=[500, 1000, 2000, 5000, 10000], value=2000)
+
+grid_cov = np.round(np.arange(0.05, 1.0001, 0.05), 2)
+# orden Top riesgo por tramos de cobertura (umbrales del digest + radix sort de los tramos)
+priority = coverage_order(scored["risk_factor"], risk_sketch, grid_cov)
+rates_sorted = scored["event_rate_30d"].to_numpy()[priority]
+# eje de costo: ±50% del costo por evento elegido arriba
+grid_cost = np.round(cost_event * np.array([0.5, 0.75, 1.0, 1.25, 1.5]), 0)
+grid = scenario_grid(rates_sorted, grid_cov, np.round(np.arange(0.05, 0.6001, 0.05), 2), grid_cost, cost_program)
+cost_pick = st.select_slider("Costo por evento en el grid (USD)", options=grid_cost.tolist(), value=grid_cost[2],
+                             format_func=lambda c: f"{c:,.0f} ({c / cost_event - 1:+.0%})")
+heat = alt.Chart(grid[grid["costo_evento"] == cost_pick]).mark_rect().encode(
+    x=alt.X("cobertura:O", title="Cobertura", axis=alt.Axis(format=".0%")),
+    y=alt.Y("eficacia:O", title="Eficacia", sort="descending", axis=alt.Axis(format=".0%")),
+    color=alt.Color("roi:Q", title="ROI", scale=alt.Scale(scheme="redyellowgreen", domainMid=0)),
+    tooltip=[alt.Tooltip("cobertura:Q", format=".0%"), alt.Tooltip("eficacia:Q", format=".0%"),
+             alt.Tooltip("costo_evento:Q", format=",.0f"), "n_tratados", alt.Tooltip("roi:Q", format=".2f")]
+).properties(height=260)
+
+mc, _ = monte_carlo_roi(rates_sorted, grid_cov, cost_program, efficacy, eff_sd, cost_event, cost_sd, n_draws=n_draws)
+band = alt.Chart(mc).mark_area(opacity=0.3).encode(
+    x=alt.X("cobertura:Q", title="Cobertura", axis=alt.Axis(format=".0%")),
+    y=alt.Y("roi_p05:Q", title="ROI (p5–p95)"), y2="roi_p95:Q"
+)
+med = alt.Chart(mc).mark_line().encode(
+    x="cobertura:Q", y="roi_p50:Q",
+    tooltip=[alt.Tooltip("cobertura:Q", format=".0%"), alt.Tooltip("roi_p05:Q", format=".2f"), alt.Tooltip("roi_p50:Q", format=".2f"),
+             alt.Tooltip("roi_p95:Q", format=".2f"), alt.Tooltip("prob_roi_positivo:Q", format=".0%")]
+)
+g1, g2 = st.columns(2)
+g1.altair_chart(heat, use_container_width=True)
+g2.altair_chart((band + med).properties(height=260), use_container_width=True)
+cur = mc.iloc[int(np.argmin(np.abs(mc["cobertura"] - coverage)))]
+st.caption(f"Cobertura {cur['cobertura']:.0%}: eventos evitados {cur['evitados_p05']:.0f}–{cur['evitados_p95']:.0f} · "
+           f"ROI {cur['roi_p05']:.2f}x–{cur['roi_p95']:.2f}x (IC 90%) · P(ROI>0) = {cur['prob_roi_positivo']:.0%}")
+
 st.divider()
 section("Distribución de riesgo (Top 50)", "Explora curvas de algunos pacientes en alta prioridad")
-subset = scored.head(min(50, len(scored)))
-sel = st.selectbox("Paciente", subset["patient_id"])
-row = subset[subset["patient_id"]==sel].iloc[0]
-st.altair_chart(survival_curve_chart(row["surv_curve"], height=200), use_container_width=True)
+sel = patient_picker(patients, limit=50, key="roi_paciente")
+if sel is not None:
+    render_patient_survival(patients, sel, height=200)
+
+section("Supervivencia por programa", "Top cobertura vs. resto: mediana y banda p10–p90 de S(t)")
+show_curves = st.toggle(f"Curvas individuales (hasta {MAX_CURVES:,}, WebGL)", value=False, key="roi_curvas")
+programa = np.where(scored["risk_factor"].to_numpy() >= threshold, f"Top {coverage:.0%}", "Resto")
+render_cohort_survival(scored.assign(programa=programa), "programa", curves=show_curves, height=280)
 
 # Evidencia exportable
 st.subheader("Exportar evidencia para contrato")
-exp = scored[["patient_id","servicio","risk_factor","event_rate_30d","t_start_days","t_end_days"]].copy()
+exp = scored[["patient_id","servicio","risk_factor","event_rate_30d","seleccion_optima","t_start_days","t_end_days"]].copy()
 exp["riesgo_%"] = (exp["risk_factor"]*100).round(0)
-st.download_button("⬇️ Exportar evidencia CSV", exp.to_csv(index=False).encode("utf-8"), "evidencia_contrato.csv", "text/csv")
+download_menu(exp, "evidencia_contrato", label="⬇️ Exportar evidencia")
 debug("Página Dirección & ROI renderizada")
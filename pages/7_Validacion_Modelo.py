@@ -0,0 +1,111 @@
+# pages/7_Validacion_Modelo.py
+from __future__ import annotations
+import numpy as np
+import pandas as pd
+import streamlit as st
+from components.cards import kpi, section
+from services.data_loader import generate_dummy
+from services.risk_api import score_batch
+from services.risk_engine import (
+    DUMMY_ORDERED_COLS, make_dummy_population, linear_predictor_batch, weibull_params_batch, weibull_params_artifact
+)
+from services.evaluation import (
+    evaluation_report, predicted_event_prob_api, predicted_event_prob_weibull, DAYS_PER_MONTH
+)
+from services.model_registry import get_model, model_version, ALTA_SEGURA, FSFB
+from services.settings import inject_css, debug_toggle, debug
+
+st.set_page_config(page_title="Validación del Modelo", page_icon="📐", layout="wide")
+inject_css(); debug_toggle()
+
+from services.auth import login_required
+login_required("Corpus AI · Pilotos Hospitalarios")
+import altair as alt   # después del login: la pantalla de acceso no paga la importación
+
+
+st.header("📐 Validación del modelo (C-index, AUC(t), Brier, calibración)")
+st.caption("Sube pacientes con desenlace observado: `tiempo_evento_dias` (evento o censura) y `evento` (1/0). "
+           "Sin archivo se simula una cohorte demo a partir del propio modelo.")
+
+modelo = st.radio("Modelo", ["Alta Segura 30D (score_batch)", "FSFB Weibull (risk_engine)"], horizontal=True)
+uploaded = st.file_uploader("CSV con desenlaces (opcional)", type=["csv"])
+n_demo = st.select_slider("Tamaño cohorte demo", options=[1_000, 10_000, 50_000], value=10_000, disabled=uploaded is not None)
+
+@st.cache_data(show_spinner=False)
+def _demo_outcomes(kind: str, n: int, seed: int = 11) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    if kind.startswith("Alta"):
+        df = generate_dummy(n, seed=seed)
+        h = score_batch(df)["hazard_per_day"].to_numpy() * np.exp(rng.normal(0, 0.3, n))
+        t = rng.exponential(1 / h)
+    else:
+        df = make_dummy_population(n, seed=seed)
+        k, lam = weibull_params_batch(linear_predictor_batch(df) + rng.normal(0, 0.3, n))
+        t = (-np.log(rng.random(n))) ** (1 / k) / lam * DAYS_PER_MONTH
+    cens = rng.uniform(30, 900, n)
+    df["tiempo_evento_dias"] = np.minimum(t, cens).round(1)
+    df["evento"] = (t <= cens).astype(int)
+    return df
+
+if uploaded is not None:
+    df = pd.read_csv(uploaded)
+    missing = [c for c in ("tiempo_evento_dias", "evento") if c not in df.columns]
+    if missing:
+        st.error(f"Faltan columnas de desenlace: {missing}")
+        st.stop()
+else:
+    df = _demo_outcomes(modelo, n_demo)
+
+name = ALTA_SEGURA if modelo.startswith("Alta") else FSFB
+model = get_model(name)
+st.caption(f"Versión del modelo: `{model_version(name)}`")
+
+if modelo.startswith("Alta"):
+    scored = score_batch(df, model=model)
+    risk = scored["risk_factor"].to_numpy()
+    preds = {"30d": (30, predicted_event_prob_api(scored, 30)), "24m": (730, predicted_event_prob_api(scored, 730))}
+else:
+    missing = [c for c in DUMMY_ORDERED_COLS if c not in df.columns]
+    if missing:
+        st.error(f"Faltan columnas del modelo FSFB: {missing}")
+        st.stop()
+    if model is not None:
+        k, lam = weibull_params_artifact(model, df)
+        risk = np.log(lam)
+    else:
+        risk = linear_predictor_batch(df)
+        k, lam = weibull_params_batch(risk)
+    preds = {"30d": (30, predicted_event_prob_weibull(k, lam, 30)), "24m": (730, predicted_event_prob_weibull(k, lam, 730))}
+
+rep = evaluation_report(df["tiempo_evento_dias"].to_numpy(), df["evento"].to_numpy(), risk, preds)
+
+def _fmt(v: float, spec: str) -> str:
+    # sin casos o sin controles al horizonte la métrica no está definida
+    return "–" if np.isnan(v) else format(v, spec)
+
+H = rep["horizontes"]
+c1, c2, c3, c4 = st.columns(4)
+kpi("Pacientes", f"{rep['n']:,}", f"{rep['eventos']:,} eventos", cols=c1)
+kpi("C-index (Harrell)", _fmt(rep["c_index"], ".3f"), "0.5 = azar", cols=c2)
+kpi("AUC(t) 30d / 24m", f"{_fmt(H['30d']['auc'], '.2f')} / {_fmt(H['24m']['auc'], '.2f')}", "Acumulado/dinámico", cols=c3)
+kpi("Brier 30d / 24m", f"{_fmt(H['30d']['brier'], '.3f')} / {_fmt(H['24m']['brier'], '.3f')}", "IPCW; menor es mejor", cols=c4)
+
+st.divider()
+section("Calibración por deciles", "Riesgo predicho vs. observado (1 − KM) en cada decil de predicción")
+tabs = st.tabs(list(rep["horizontes"].keys()))
+for tab, (name, h) in zip(tabs, rep["horizontes"].items()):
+    with tab:
+        cal = h["calibracion"]
+        lim = float(max(cal["predicho"].max(), cal["observado"].max(), 0.01))
+        diag = alt.Chart(pd.DataFrame({"x": [0, lim], "y": [0, lim]})).mark_line(strokeDash=[4, 4], color="#BFD7FF").encode(x="x:Q", y="y:Q")
+        pts = alt.Chart(cal).mark_line(point=True).encode(
+            x=alt.X("predicho:Q", title="Predicho", axis=alt.Axis(format=".0%")),
+            y=alt.Y("observado:Q", title="Observado", axis=alt.Axis(format=".0%")),
+            tooltip=["decil", "n", "eventos", alt.Tooltip("predicho:Q", format=".1%"), alt.Tooltip("observado:Q", format=".1%")]
+        )
+        g1, g2 = st.columns([1.2, 1])
+        g1.altair_chart((diag + pts).properties(height=280), use_container_width=True)
+        g2.dataframe(cal, use_container_width=True, hide_index=True)
+
+st.caption("CLI para cohortes grandes: `python -m services.evaluation validacion.csv`")
+debug("Página Validación renderizada")
@@ -0,0 +1,128 @@
+# services/action_store.py
+from __future__ import annotations
+import atexit
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+import pandas as pd
+from .data_loader import DATA_DIR
+
+ACTIONS_DB = os.path.join(DATA_DIR, "acciones.db")
+COLUMNS = ["id", "ts", "fecha", "patient_id", "accion", "nota", "usuario"]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS acciones (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts TEXT NOT NULL,
+    fecha TEXT NOT NULL,
+    patient_id TEXT NOT NULL,
+    accion TEXT NOT NULL,
+    nota TEXT,
+    usuario TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_acciones_patient ON acciones (patient_id, id);
+CREATE INDEX IF NOT EXISTS ix_acciones_fecha ON acciones (fecha, id);
+"""
+
+class ActionStore:
+    """
+    Bitácora de acciones de alta compartida (SQLite en modo WAL).
+
+    - Escrituras en lote: append() acumula en un buffer que se vuelca en una sola transacción
+      al llegar a `batch_size`, pasado `max_delay` segundos, antes de cada lectura o al salir.
+    - Lecturas paginadas por llave (id) sobre índices (patient_id, id) y (fecha, id):
+      el costo de leer la historia de un paciente no depende del tamaño de la bitácora.
+    - WAL permite lectores concurrentes (otras sesiones/procesos) mientras se escribe.
+    """
+
+    def __init__(self, path: str = ACTIONS_DB, batch_size: int = 64, max_delay: float = 2.0):
+        self.path = path
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._buffer: list[tuple] = []
+        self._oldest = 0.0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn().executescript(_SCHEMA)
+        atexit.register(self.flush)
+
+    def _conn(self) -> sqlite3.Connection:
+        # una conexión por hilo (cada sesión de Streamlit corre en su propio hilo)
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # ---- escritura ----
+    def append(self, actions: list[dict]):
+        now = datetime.now()
+        rows = [(a.get("ts") or now.isoformat(timespec="seconds"),
+                 a.get("fecha") or now.date().isoformat(),
+                 str(a["patient_id"]), a["accion"], a.get("nota") or "", a.get("usuario") or "")
+                for a in actions]
+        with self._lock:
+            if not self._buffer:
+                self._oldest = time.monotonic()
+            self._buffer.extend(rows)
+            due = len(self._buffer) >= self.batch_size or time.monotonic() - self._oldest >= self.max_delay
+        if due:
+            self.flush()
+
+    def flush(self) -> int:
+        with self._lock:
+            rows, self._buffer = self._buffer, []
+            if not rows:
+                return 0
+            conn = self._conn()
+            with conn:
+                conn.executemany(
+                    "INSERT INTO acciones (ts, fecha, patient_id, accion, nota, usuario) VALUES (?, ?, ?, ?, ?, ?)", rows)
+        return len(rows)
+
+    # ---- lectura (paginada por llave) ----
+    def _query(self, sql: str, params: tuple) -> pd.DataFrame:
+        self.flush()
+        cur = self._conn().execute(sql, params)
+        return pd.DataFrame(cur.fetchall(), columns=COLUMNS)
+
+    def patient_history(self, patient_id: str, limit: int = 20, before_id: int | None = None) -> pd.DataFrame:
+        # más recientes primero; la siguiente página usa before_id = último id recibido
+        return self._query(
+            f"SELECT {', '.join(COLUMNS)} FROM acciones WHERE patient_id = ? AND id < ? ORDER BY id DESC LIMIT ?",
+            (str(patient_id), before_id if before_id is not None else 2 ** 62, int(limit)))
+
+    def recent(self, limit: int = 50, before_id: int | None = None,
+               fecha_desde: str | None = None, fecha_hasta: str | None = None) -> pd.DataFrame:
+        if fecha_desde is None and fecha_hasta is None:
+            return self._query(
+                f"SELECT {', '.join(COLUMNS)} FROM acciones WHERE id < ? ORDER BY id DESC LIMIT ?",
+                (before_id if before_id is not None else 2 ** 62, int(limit)))
+        return self._query(
+            f"SELECT {', '.join(COLUMNS)} FROM acciones "
+            "WHERE fecha BETWEEN ? AND ? AND id < ? ORDER BY id DESC LIMIT ?",
+            (fecha_desde or "0000-00-00", fecha_hasta or "9999-99-99",
+             before_id if before_id is not None else 2 ** 62, int(limit)))
+
+    def count(self, patient_id: str | None = None) -> int:
+        self.flush()
+        if patient_id is None:
+            return int(self._conn().execute("SELECT COUNT(*) FROM acciones").fetchone()[0])
+        return int(self._conn().execute("SELECT COUNT(*) FROM acciones WHERE patient_id = ?", (str(patient_id),)).fetchone()[0])
+
+    def export_csv(self, fecha_desde: str, fecha_hasta: str, chunk: int = 50_000) -> bytes:
+        # exporta por rango de fechas leyendo en bloques (no carga la bitácora completa de golpe)
+        self.flush()
+        cur = self._conn().execute(
+            f"SELECT {', '.join(COLUMNS)} FROM acciones WHERE fecha BETWEEN ? AND ? ORDER BY fecha, id",
+            (fecha_desde, fecha_hasta))
+        parts, header = [], True
+        while rows := cur.fetchmany(chunk):
+            parts.append(pd.DataFrame(rows, columns=COLUMNS).to_csv(index=False, header=header))
+            header = False
+        return "".join(parts).encode("utf-8") if parts else (",".join(COLUMNS) + "\n").encode("utf-8")
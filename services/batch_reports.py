@@ -0,0 +1,259 @@
+# services/batch_reports.py
+from __future__ import annotations
+import html
+import os
+import re
+import zipfile
+from datetime import date
+from typing import Callable
+import numpy as np
+import pandas as pd
+from .exports import _lock_for, _prune, export_dir, private_tmp
+from .memo import LRUMemo
+from .memory_governor import deep_size, register_resource
+from .model_registry import FSFB, get_model, model_version
+from .risk_engine import (
+    ACTION_RULES, FEATURE_CONFIG, compute_risk_multi_horizon, evaluate_action_rules, explain_contributions_batch,
+    profile_key, recommended_actions, survival_weibull, weibull_params_frame,
+)
+from .settings import CorpusTheme
+
+# Reportes individuales (HTML autocontenido) para todas las filas de un lote del Checkeo Ejecutivo
+ID_COL = "employee_id"
+CHUNK_PROFILES = 512         # curvas SVG por tarea del pool
+POOL_MIN_PROFILES = 20_000   # por debajo, arrancar procesos (spawn) cuesta más que dibujar en serie
+TIER_COLORS = {"bajo": CorpusTheme.success, "medio": CorpusTheme.warn, "alto": CorpusTheme.danger}
+
+# payloads por (perfil, horizonte, versión): perfiles repetidos (en el lote o entre lotes) no se reevalúan
+_PAYLOADS = LRUMemo(maxsize=4096)
+register_resource("services.batch_reports._PAYLOADS", lambda: deep_size(_PAYLOADS), _PAYLOADS.clear)
+
+# ======= Piezas del reporte =======
+def survival_svg(surv: pd.DataFrame, horizon: int, peak: tuple[int, int], width: int = 560, height: int = 240) -> str:
+    """
+    Curva de supervivencia y riesgo acumulado como SVG en línea (sin dependencias de exportación
+    de imágenes): mismo rango que survival_figure, con la ventana crítica sombreada.
+    """
+    sub = surv[surv["month"] <= max(60, horizon)]
+    x_max = float(sub["month"].max()) or 1.0
+    l, r, t, b = 44, 12, 12, 30
+    pw, ph = width - l - r, height - t - b
+    sx = lambda m: l + pw * m / x_max
+    sy = lambda p: t + ph * (1 - p)
+
+    def line(col: str) -> str:
+        return " ".join(f"{sx(m):.1f},{sy(p):.1f}" for m, p in zip(sub["month"], sub[col]))
+
+    grid = "".join(
+        f'<line x1="{l}" x2="{l + pw}" y1="{sy(p):.1f}" y2="{sy(p):.1f}" stroke="#e3e8f0"/>'
+        f'<text x="{l - 6}" y="{sy(p) + 4:.1f}" text-anchor="end">{p:.0%}</text>' for p in (0, 0.25, 0.5, 0.75, 1))
+    ticks = "".join(f'<text x="{sx(m):.1f}" y="{height - 10}" text-anchor="middle">{m}</text>'
+                    for m in range(0, int(x_max) + 1, 12))
+    a, z = peak
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {width} {height}" width="{width}" height="{height}" '
+        f'font-family="sans-serif" font-size="11" fill="#44546a">'
+        f'<rect x="{sx(a):.1f}" y="{t}" width="{max(sx(z) - sx(a), 1):.1f}" height="{ph}" fill="{CorpusTheme.warn}" opacity="0.18"/>'
+        f'{grid}{ticks}'
+        f'<line x1="{sx(horizon):.1f}" x2="{sx(horizon):.1f}" y1="{t}" y2="{t + ph}" stroke="#8a99ad" stroke-dasharray="3 3"/>'
+        f'<polyline points="{line("survival")}" fill="none" stroke="{CorpusTheme.primary}" stroke-width="3"/>'
+        f'<polyline points="{line("cumulative_risk")}" fill="none" stroke="{CorpusTheme.danger}" stroke-width="2" stroke-dasharray="5 4"/>'
+        f'</svg>'
+    )
+
+def profile_payloads(rows: list[dict], horizon: int, model=None) -> list[dict]:
+    """
+    Lo que depende solo del perfil, para todos los perfiles de una vez (mismos números que la
+    evaluación individual): riesgo, nivel y ventana crítica con compute_risk_multi_horizon e
+    impulsores con explain_contributions_batch. La curva SVG se agrega después (_svg_chunk).
+    """
+    frame = pd.DataFrame(rows)
+    mh = compute_risk_multi_horizon(frame, (horizon,), peak_horizon=horizon, model=model)
+    k, lam = weibull_params_frame(frame, model)
+    contrib = explain_contributions_batch(frame, model)
+    names, texts = list(contrib.columns), [cfg.get("text", "") for cfg in FEATURE_CONFIG.values()]
+    deltas = contrib.to_numpy(dtype=float)
+    # orden estable por |aporte| descendente, como el sort de explain_contributions
+    top = np.argsort(-np.abs(deltas), axis=1, kind="stable")[:, :6]
+    risk, tiers = mh[f"risk_pct_{horizon}m"].to_numpy(), mh[f"risk_tier_{horizon}m"].to_numpy()
+    start, end = mh["peak_start_m"].to_numpy(), mh["peak_end_m"].to_numpy()
+    return [{"risk": float(risk[i]), "tier": str(tiers[i]),
+             "meta": {"k": float(k[i]), "lam": float(lam[i]), "peak_window": (int(start[i]), int(end[i]))},
+             "contrib": [(names[j], float(deltas[i, j]), texts[j]) for j in top[i]]}
+            for i in range(len(rows))]
+
+def _svg_chunk(items: list[tuple[tuple, float, float, tuple[int, int]]], horizon: int) -> list[tuple[tuple, str]]:
+    # tarea del pool (proceso aparte): solo el dibujo de la curva, (k, lam) y la ventana ya vienen calculados
+    return [(key, survival_svg(survival_weibull(max(horizon, 60), k, lam), horizon, peak))
+            for key, k, lam, peak in items]
+
+_CSS = f"""
+body{{font-family:-apple-system,Segoe UI,Roboto,sans-serif;color:#1d2b3a;max-width:820px;margin:24px auto;padding:0 16px}}
+h1{{font-size:1.35rem;margin:0}} h2{{font-size:1.05rem;margin:22px 0 8px;color:#0B1E3F}}
+.sub{{color:#6b7a8c;font-size:.85rem;margin-top:4px}}
+.kpis{{display:flex;gap:12px;margin:18px 0}}
+.kpi{{flex:1;border:1px solid {CorpusTheme.neutral};border-radius:10px;padding:10px 14px}}
+.kpi b{{display:block;font-size:1.4rem}} .kpi span{{color:#6b7a8c;font-size:.8rem}}
+.chip{{padding:1px 8px;border-radius:10px;font-size:.8rem;background:#e8f2ff}}
+li{{margin:4px 0}} .legend{{font-size:.8rem;color:#6b7a8c}}
+.aviso{{font-size:.8rem;color:#6b7a8c;border-top:1px solid #e3e8f0;margin-top:24px;padding-top:8px}}
+"""
+
+def report_html(ident: str, row: dict, payload: dict, horizon: int, actions: list[str], version: str = "") -> str:
+    p, e = payload, html.escape
+    a, z = p["meta"]["peak_window"]
+    drivers = "".join(f'<li><b>{e(name)}</b> <span class="chip">{pct:+.1f} pp</span> — {e(text)}</li>'
+                      for name, pct, text in p["contrib"])
+    recs = "".join(f"<li>{e(r)}</li>" for r in actions)
+    perfil = " · ".join(f"{e(str(k))}: {e(str(v))}" for k, v in row.items() if k != ID_COL)
+    return f"""<!DOCTYPE html>
+<html lang="es"><head><meta charset="utf-8"><title>Checkeo Ejecutivo · {e(ident)}</title><style>{_CSS}</style></head>
+<body>
+<h1>🩺 FSFB • Checkeo Ejecutivo</h1>
+<div class="sub">Reporte individual · {e(ident)} · {date.today().isoformat()} · modelo {e(version or model_version(FSFB))}</div>
+<div class="kpis">
+  <div class="kpi"><span>Risk factor</span><b>{p["risk"]:.1f}%</b><span>Horizonte: {horizon} meses</span></div>
+  <div class="kpi"><span>Rango temporal más crítico</span><b>{a}–{z} m</b><span>Ventana de mayor hazard</span></div>
+  <div class="kpi" style="border-color:{TIER_COLORS[p["tier"]]}"><span>Nivel de riesgo</span><b style="color:{TIER_COLORS[p["tier"]]}">{p["tier"].upper()}</b></div>
+</div>
+<h2>Supervivencia estimada</h2>
+{p["svg"]}
+<div class="legend"><span style="color:{CorpusTheme.primary}">━</span> Supervivencia · <span style="color:{CorpusTheme.danger}">╍</span> Riesgo acumulado · franja: ventana crítica · línea punteada: horizonte</div>
+<h2>Principales impulsores del riesgo</h2>
+<ul>{drivers}</ul>
+<h2>Recomendación Clínica Personalizada</h2>
+<ul>{recs}</ul>
+<h2>Perfil evaluado</h2>
+<div class="sub">{perfil}</div>
+<div class="aviso"><b>Aviso</b>: Este resultado es un apoyo a la decisión clínica, no reemplaza el juicio médico. Requiere validación y consentimiento del paciente para uso asistencial.</div>
+</body></html>
+"""
+
+def _clean_row(row: dict) -> dict:
+    # como en el modo por lotes: las plantillas traen categorías "1","2"... como texto o número
+    out = dict(row)
+    for k, cfg in FEATURE_CONFIG.items():
+        if cfg["type"] in ("cat", "cat_ord") and k in out and pd.notna(out[k]):
+            out[k] = str(out[k]).strip()
+    return out
+
+def _file_names(idents: list[str]) -> list[str]:
+    seen: dict[str, int] = {}
+    out = []
+    for ident in idents:
+        base = re.sub(r"[^\w.-]+", "_", ident).strip("_") or "reporte"
+        seen[base] = seen.get(base, 0) + 1
+        out.append(f"{base}.html" if seen[base] == 1 else f"{base}_{seen[base]}.html")
+    return out
+
+# ======= Lote completo =======
+def write_reports(df: pd.DataFrame, dest, horizon: int = 24, workers: int | None = None,
+                  progress: Callable[[int, int], None] | None = None) -> pd.DataFrame:
+    """
+    Escribe un zip (`dest`: ruta o archivo binario) con un reporte HTML por fila más indice.csv.
+    Cada perfil distinto se evalúa una sola vez (memo por perfil/horizonte/modelo): riesgo, ventana
+    crítica e impulsores de los perfiles nuevos salen vectorizados en este proceso, y solo el dibujo
+    de las curvas SVG se reparte en un pool de `workers` procesos cuando hay al menos
+    POOL_MIN_PROFILES perfiles nuevos. Cada reporte se escribe al zip apenas tiene su curva.
+    Devuelve el índice (id, archivo, riesgo, nivel) en el orden del df.
+    """
+    rows = [_clean_row(r) for r in df.to_dict("records")]
+    idents = [str(r[ID_COL]) if ID_COL in r and pd.notna(r[ID_COL]) else f"fila_{i + 1}" for i, r in enumerate(rows)]
+    names = _file_names(idents)
+    flags = evaluate_action_rules(df).sparse.to_dense().to_numpy(dtype=bool)
+    rule_ids = [r["id"] for r in ACTION_RULES]
+    version = model_version(FSFB)
+
+    groups: dict[tuple, list[int]] = {}
+    for i, r in enumerate(rows):
+        groups.setdefault(profile_key(r), []).append(i)
+    risk = np.full(len(rows), np.nan)
+    tiers = np.empty(len(rows), dtype=object)
+    done = 0
+
+    with zipfile.ZipFile(dest, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=6) as zf:
+        def emit(key: tuple, payload: dict):
+            nonlocal done
+            _PAYLOADS.put((key, horizon, version), payload)
+            for i in groups[key]:
+                acts = recommended_actions(rows[i], payload["tier"], payload["meta"], dict(zip(rule_ids, flags[i])))
+                zf.writestr(names[i], report_html(idents[i], rows[i], payload, horizon, acts, version))
+                risk[i], tiers[i] = payload["risk"], payload["tier"]
+            done += len(groups[key])
+            if progress:
+                progress(done, len(rows))
+
+        pending = []
+        for key, idx in groups.items():
+            cached = _PAYLOADS.get((key, horizon, version))
+            if cached is not None:
+                emit(key, cached)
+            else:
+                pending.append((key, rows[idx[0]]))
+        new = dict(zip([key for key, _ in pending],
+                       profile_payloads([row for _, row in pending], horizon, get_model(FSFB)) if pending else []))
+        items = [(key, p["meta"]["k"], p["meta"]["lam"], p["meta"]["peak_window"]) for key, p in new.items()]
+        chunks = [items[i:i + CHUNK_PROFILES] for i in range(0, len(items), CHUNK_PROFILES)]
+        workers = min(workers or os.cpu_count() or 1, len(chunks)) if len(items) >= POOL_MIN_PROFILES else 1
+
+        def finish(done_chunk: list[tuple[tuple, str]]):
+            for key, svg in done_chunk:
+                payload = new.pop(key)
+                payload["svg"] = svg
+                emit(key, payload)
+
+        if workers <= 1:
+            for c in chunks:
+                finish(_svg_chunk(c, horizon))
+        else:
+            import multiprocessing as mp
+            from concurrent.futures import ProcessPoolExecutor, as_completed
+            # spawn: el servidor de Streamlit tiene hilos vivos y fork podría heredar locks tomados
+            with ProcessPoolExecutor(workers, mp_context=mp.get_context("spawn")) as pool:
+                futures = [pool.submit(_svg_chunk, c, horizon) for c in chunks]
+                for f in as_completed(futures):
+                    finish(f.result())
+
+        index = pd.DataFrame({"id": idents, "archivo": names, f"risk_pct_{horizon}m": np.round(risk, 1),
+                              "nivel": tiers})
+        zf.writestr("indice.csv", index.to_csv(index=False))
+    return index
+
+def reports_zip_path(df: pd.DataFrame, horizon: int = 24, workers: int | None = None,
+                     progress: Callable[[int, int], None] | None = None) -> str:
+    """
+    Zip de reportes del lote cacheado en disco por (dataset, horizonte, versión del modelo),
+    junto a los exportes: pedirlo otra vez (u otra sesión con el mismo archivo) no regenera nada.
+    """
+    from .data import dataset_key
+    key = dataset_key(df, extra=(horizon, model_version(FSFB)))
+    path = os.path.join(export_dir(), f"{key}-reportes.zip")
+    with _lock_for(path):
+        if os.path.exists(path):
+            os.utime(path)
+            return path
+        tmp = private_tmp(path)
+        with open(tmp, "wb") as f:
+            write_reports(df, f, horizon, workers, progress)
+        os.replace(tmp, path)
+    _prune(path)
+    return path
+
+def payload_stats() -> dict:
+    return _PAYLOADS.stats()
+
+def _main(argv=None):
+    import argparse, time
+    ap = argparse.ArgumentParser(description="Reportes HTML individuales para un lote del Checkeo Ejecutivo")
+    ap.add_argument("csv")
+    ap.add_argument("out", help="zip de salida")
+    ap.add_argument("--horizon", type=int, default=24)
+    ap.add_argument("--workers", type=int, default=None)
+    args = ap.parse_args(argv)
+    t0 = time.perf_counter()
+    index = write_reports(pd.read_csv(args.csv), args.out, args.horizon, args.workers)
+    print(f"{len(index)} reportes en {time.perf_counter() - t0:.1f}s -> {args.out}")
+    print(index["nivel"].value_counts().to_string())
+
+if __name__ == "__main__":
+    _main()
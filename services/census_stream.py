@@ -0,0 +1,240 @@
+# services/census_stream.py
+from __future__ import annotations
+import json
+import os
+import threading
+import weakref
+from collections import defaultdict
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from .data_loader import DATA_DIR
+from .risk_api import score_batch, score_norm
+from .chart_data import MAX_DAY_ESTANCIA
+from .settings import debug
+
+# Flujo ADT local (append-only, JSON por línea) como sustituto de la cola HL7/ADT; un archivo por
+# snapshot de censo: los eventos de un censo no se aplican sobre otro
+ADT_DIR = os.path.join(DATA_DIR, "adt")
+
+# Tipos HL7 ADT soportados
+ADMIT, TRANSFER, DISCHARGE, UPDATE = "A01", "A02", "A03", "A08"
+RED_THRESHOLD = 0.40
+
+# Campos que alimentan el score; si un evento no los toca, no se re-puntúa
+SCORING_FIELDS = {"creatinina", "hba1c", "sistolica", "polifarmacia_n", "hosp_6m"}
+ADMIT_FIELDS = SCORING_FIELDS | {"servicio"}
+
+_ENGINES: weakref.WeakSet = weakref.WeakSet()
+
+def live_engines() -> list:
+    # motores vivos del proceso (el gobernador de memoria los mide)
+    return list(_ENGINES)
+
+def snapshot_events_path(snapshot: pd.DataFrame) -> str:
+    from .data import dataset_key
+    return os.path.join(ADT_DIR, f"adt-{dataset_key(snapshot)[:16]}.jsonl")
+
+def _invalid_fields(data: dict, required=()) -> list[str]:
+    # campos de score ausentes (si son obligatorios) o no numéricos: score_batch fallaría con ellos
+    bad = [c for c in required if data.get(c) is None or data.get(c) == ""]
+    for c in SCORING_FIELDS & data.keys():
+        try:
+            if not np.isfinite(float(data[c])):
+                bad.append(c)
+        except (TypeError, ValueError):
+            bad.append(c)
+    return sorted(set(bad))
+
+def append_events(events: list[dict], path: str):
+    # Escritura append-only (una línea por evento)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        for ev in events:
+            ev = {"ts": datetime.now().isoformat(timespec="seconds"), **ev}
+            f.write(json.dumps(ev, ensure_ascii=False) + "\n")
+
+def _day_estancia(df: pd.DataFrame) -> np.ndarray:
+    # NaN = fechas faltantes: el paciente cuenta en su servicio pero no en el heatmap
+    fechas = df.reindex(columns=["fecha_ingreso", "fecha_egreso_prevista"])
+    d = (pd.to_datetime(fechas["fecha_egreso_prevista"], errors="coerce") - pd.to_datetime(fechas["fecha_ingreso"], errors="coerce")).dt.days
+    return d.clip(lower=0).to_numpy(dtype=float)
+
+class CensusEngine:
+    """
+    Censo en memoria indexado por episode_id, alimentado por eventos ADT.
+
+    - Al iniciar se puntúa el snapshot una sola vez y se congela la normalización del score.
+    - Cada lote de eventos re-puntúa solo los episodios que cambiaron.
+    - Los agregados por servicio (KPIs) y por celda servicio × día (heatmap) se actualizan por deltas.
+    - Lee el archivo ADT de su snapshot (snapshot_events_path) desde el byte 0: un motor nuevo (otro
+      modelo, reinicio del worker) re-aplica todos los eventos posteriores al snapshot.
+      Un motor se comparte entre sesiones: poll, apply_events y las vistas van bajo el mismo lock.
+    """
+
+    def __init__(self, snapshot: pd.DataFrame, events_path: str | None = None, model=None):
+        _ENGINES.add(self)
+        self.events_path = events_path or snapshot_events_path(snapshot)
+        self.model = model
+        self.offset = 0
+        self.norm = score_norm(snapshot)
+        self.census: dict[str, dict] = {}
+        self._svc = defaultdict(lambda: np.zeros(3))    # servicio -> [n, suma riesgo, rojos]
+        self._cell = defaultdict(lambda: np.zeros(2))   # (servicio, día) -> [n, suma riesgo]
+        self._lock = threading.RLock()
+        self.stats = {"events": 0, "rescored": 0, "skipped": 0}
+        # censo puntuado sin filas (columnas y tipos) para frame() cuando no queda nadie internado
+        self._empty = score_batch(snapshot.head(0), norm=self.norm, model=model).assign(day_estancia=np.float64(0)).head(0)
+        self._upsert(snapshot)
+
+    # ---- deltas de agregados ----
+    def _account(self, rec: dict, sign: int):
+        r = float(rec["risk_factor"])
+        self._svc[rec["servicio"]] += sign * np.array([1.0, r, float(r >= RED_THRESHOLD)])
+        if not np.isnan(rec["day_estancia"]):
+            day = min(int(rec["day_estancia"]), MAX_DAY_ESTANCIA)
+            self._cell[(rec["servicio"], day)] += sign * np.array([1.0, r])
+            if self._cell[(rec["servicio"], day)][0] <= 0:
+                del self._cell[(rec["servicio"], day)]
+        if self._svc[rec["servicio"]][0] <= 0:
+            del self._svc[rec["servicio"]]
+
+    def _upsert(self, rows: pd.DataFrame):
+        if rows.empty:
+            return
+        rows = rows.drop(columns=[c for c in ("risk_factor", "surv_curve") if c in rows.columns])
+        scored = score_batch(rows, norm=self.norm, model=self.model)
+        scored["day_estancia"] = _day_estancia(scored)
+        self.stats["rescored"] += len(scored)
+        for rec in scored.to_dict("records"):
+            old = self.census.get(rec["episode_id"])
+            if old is not None:
+                self._account(old, -1)
+            self.census[rec["episode_id"]] = rec
+            self._account(rec, +1)
+
+    def _move(self, episode_id: str, changes: dict):
+        rec = self.census.get(episode_id)
+        if rec is None:
+            return
+        self._account(rec, -1)
+        rec.update(changes)
+        self._account(rec, +1)
+
+    def _discharge(self, episode_id: str):
+        rec = self.census.pop(episode_id, None)
+        if rec is not None:
+            self._account(rec, -1)
+
+    # ---- consumo de eventos ----
+    def apply_events(self, events: list[dict]) -> int:
+        """
+        Aplica un lote de eventos en orden. Los episodios que requieren re-puntuar se
+        acumulan y se puntúan juntos en un solo score_batch al final del lote.
+        """
+        pending: dict[str, dict] = {}
+        with self._lock:
+            for ev in events:
+                epi, kind, data = ev.get("episode_id"), ev.get("type"), ev.get("data") or {}
+                if not epi:
+                    continue
+                bad = _invalid_fields(data, ADMIT_FIELDS if kind == ADMIT else ())
+                if bad:
+                    self.stats["skipped"] += 1
+                    debug(f"ADT: evento {kind} de {epi} descartado (campos inválidos: {', '.join(bad)})")
+                    continue
+                if kind == DISCHARGE:
+                    pending.pop(epi, None)
+                    self._discharge(epi)
+                elif kind == ADMIT:
+                    pending[epi] = {**data, "episode_id": epi}
+                elif kind in (TRANSFER, UPDATE):
+                    base = pending.get(epi) or self.census.get(epi)
+                    if base is None:
+                        continue
+                    if epi in pending or SCORING_FIELDS & data.keys() or {"fecha_ingreso", "fecha_egreso_prevista"} & data.keys():
+                        pending[epi] = {**base, **data}
+                    else:
+                        self._move(epi, data)     # traslado: solo cambia el servicio, sin re-puntuar
+            if pending:
+                self._upsert(pd.DataFrame(list(pending.values())))
+            self.stats["events"] += len(events)
+        return len(events)
+
+    def poll(self) -> int:
+        # Lee solo lo nuevo del archivo append-only desde el último offset. Lectura, avance del
+        # offset y aplicación bajo el lock: dos sesiones no aplican ni saltan el mismo tramo.
+        if not os.path.exists(self.events_path):
+            return 0
+        with self._lock:
+            with open(self.events_path, "rb") as f:
+                f.seek(self.offset)
+                chunk = f.read()
+            # solo líneas completas; una línea a medio escribir se lee en el siguiente poll
+            end = chunk.rfind(b"\n") + 1
+            if end == 0:
+                return 0
+            self.offset += end
+            events = [json.loads(line) for line in chunk[:end].decode("utf-8").splitlines() if line.strip()]
+            n = self.apply_events(events)
+        debug(f"ADT: {n} eventos aplicados ({len(self.census)} camas ocupadas)")
+        return n
+
+    # ---- vistas para la página ----
+    # Copias tomadas bajo el lock: otra sesión puede estar aplicando eventos (y borrando llaves)
+    def kpis(self) -> dict:
+        with self._lock:
+            tot = sum(self._svc.values(), np.zeros(3))
+        n = int(tot[0])
+        return {"n": n, "risk_mean": (tot[1] / n) if n else 0.0, "red": int(round(tot[2]))}
+
+    def service_summary(self) -> pd.DataFrame:
+        with self._lock:
+            rows = [{"servicio": s, "n": int(v[0]), "risk_factor": v[1] / v[0], "rojos": int(round(v[2]))}
+                    for s, v in self._svc.items()]
+        return pd.DataFrame(rows, columns=["servicio", "n", "risk_factor", "rojos"]).sort_values("servicio")
+
+    def heatmap_cells(self) -> pd.DataFrame:
+        # mismo formato que services.chart_data.heatmap_cells
+        with self._lock:
+            rows = [{"servicio": s, "day_estancia": d, "risk_factor": v[1] / v[0], "n": int(v[0])}
+                    for (s, d), v in self._cell.items()]
+        return pd.DataFrame(rows, columns=["servicio", "day_estancia", "risk_factor", "n"]).sort_values(["servicio", "day_estancia"])
+
+    def frame(self) -> pd.DataFrame:
+        with self._lock:
+            rows = [dict(r) for r in self.census.values()]
+        # censo vacío: mismas columnas que con pacientes (la página filtra por servicio, riesgo...)
+        return pd.DataFrame(rows) if rows else self._empty.copy()
+
+    def episode_ids(self) -> list[str]:
+        with self._lock:
+            return list(self.census)
+
+def simulate_events(engine: CensusEngine, n: int = 20, seed: int | None = None) -> list[dict]:
+    """
+    Genera eventos ADT de demo (ingresos, traslados, altas y actualizaciones de laboratorio)
+    sobre el censo actual del motor.
+    """
+    from .data_loader import generate_dummy, SERVICIOS
+    rng = np.random.default_rng(seed)
+    ids = engine.episode_ids()
+    kinds = rng.choice([ADMIT, TRANSFER, DISCHARGE, UPDATE], size=n, p=[0.3, 0.2, 0.3, 0.2])
+    n_adm = int((kinds == ADMIT).sum())
+    new = generate_dummy(n_adm, seed=int(rng.integers(1 << 31))).to_dict("records") if n_adm else []
+    events = []
+    for kind in kinds:
+        if kind == ADMIT:
+            rec = new.pop()
+            events.append({"type": ADMIT, "episode_id": rec["episode_id"], "data": rec})
+        elif ids:
+            epi = ids[int(rng.integers(len(ids)))]
+            if kind == TRANSFER:
+                events.append({"type": TRANSFER, "episode_id": epi, "data": {"servicio": str(rng.choice(SERVICIOS))}})
+            elif kind == DISCHARGE:
+                events.append({"type": DISCHARGE, "episode_id": epi})
+                ids.remove(epi)
+            else:
+                events.append({"type": UPDATE, "episode_id": epi,
+                               "data": {"creatinina": round(float(rng.uniform(0.6, 3.5)), 2)}})
+    return events
@@ -0,0 +1,95 @@
+# services/chart_data.py
+from __future__ import annotations
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+# Bins fijos: el payload que llega al navegador depende del número de bins, no del tamaño de la cohorte
+RISK_PCT_EDGES = np.arange(0.0, 101.0, 1.0)   # riesgo % en bins de 1 pp
+MAX_DAY_ESTANCIA = 30                         # días ≥ 30 se agrupan en el último bin
+
+def histogram_bins(values, edges=RISK_PCT_EDGES, trim: bool = True) -> pd.DataFrame:
+    """
+    Histograma de bins fijos en NumPy -> DataFrame [bin_start, bin_end, bin_mid, count].
+    Valores fuera de rango se recortan al primer/último bin; NaN se descartan.
+    """
+    edges = np.asarray(edges, dtype=float)
+    v = np.asarray(values, dtype=float)
+    v = v[~np.isnan(v)]
+    idx = np.clip(np.searchsorted(edges, v, side="right") - 1, 0, len(edges) - 2)
+    counts = np.bincount(idx, minlength=len(edges) - 1)
+    out = pd.DataFrame({
+        "bin_start": edges[:-1], "bin_end": edges[1:],
+        "bin_mid": (edges[:-1] + edges[1:]) / 2, "count": counts
+    })
+    if trim and counts.any():
+        nz = np.flatnonzero(counts)
+        out = out.iloc[nz[0]:nz[-1] + 1].reset_index(drop=True)
+    return out
+
+def heatmap_cells(df: pd.DataFrame, row: str = "servicio", col: str = "day_estancia",
+                  value: str = "risk_factor", max_col: int = MAX_DAY_ESTANCIA) -> pd.DataFrame:
+    """
+    Agregado servicio × día de estancia con bincount (media y conteo por celda).
+    Devuelve solo celdas con pacientes: como máximo n_servicios × (max_col+1) filas.
+    Pacientes sin día de estancia (fechas faltantes) no se ubican en ninguna celda.
+    """
+    if len(df) == 0:
+        return pd.DataFrame(columns=[row, col, value, "n"])
+    codes, labels = pd.factorize(df[row], sort=True)
+    raw = pd.to_numeric(df[col], errors="coerce").to_numpy(dtype=float)
+    days = np.clip(np.nan_to_num(raw), 0, max_col).astype(int)
+    n_cols = max_col + 1
+    flat = codes * n_cols + days
+    ok = (codes >= 0) & ~np.isnan(raw)
+    size = len(labels) * n_cols
+    n = np.bincount(flat[ok], minlength=size)
+    s = np.bincount(flat[ok], weights=df[value].to_numpy(dtype=float)[ok], minlength=size)
+    cells = np.flatnonzero(n)
+    return pd.DataFrame({
+        row: np.asarray(labels)[cells // n_cols],
+        col: cells % n_cols,
+        value: s[cells] / n[cells],
+        "n": n[cells],
+    })
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def cached_histogram(key: str, _values, edges: tuple = tuple(RISK_PCT_EDGES)) -> pd.DataFrame:
+    # `key` identifica dataset + filtro (ver services.data.dataset_key); `_values` no se hashea
+    return histogram_bins(_values, np.asarray(edges))
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def cached_heatmap(key: str, _df: pd.DataFrame, max_col: int = MAX_DAY_ESTANCIA) -> pd.DataFrame:
+    return heatmap_cells(_df, max_col=max_col)
+
+# ======= Curvas de supervivencia de cohortes =======
+def curve_matrix(curves) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Lista de curvas [{day, S}, ...] (surv_curve) -> (días, matriz n × días). Si una curva trae
+    otra grilla de días se interpola a la de la primera.
+    """
+    curves = list(curves)
+    if not curves:
+        return np.empty(0), np.empty((0, 0))
+    days = np.array([p["day"] for p in curves[0]], dtype=float)
+    S = np.empty((len(curves), len(days)))
+    for i, c in enumerate(curves):
+        if len(c) == len(days):
+            S[i] = [p["S"] for p in c]
+        else:
+            S[i] = np.interp(days, [p["day"] for p in c], [p["S"] for p in c])
+    return days, S
+
+def quantile_bands(days, S: np.ndarray, groups=None, q=(0.1, 0.5, 0.9)) -> pd.DataFrame:
+    """
+    Bandas por grupo y día: p10/p50/p90 (por defecto) y n. Sin `groups`, un solo grupo "Todos".
+    """
+    S = np.asarray(S, dtype=float)
+    g = np.full(len(S), "Todos", dtype=object) if groups is None else np.asarray(groups)
+    names = [f"p{int(round(x * 100))}" for x in q]
+    parts = []
+    for label in pd.unique(g):
+        sub = S[g == label]
+        qs = np.quantile(sub, q, axis=0)                  # (len(q), días)
+        parts.append(pd.DataFrame({"grupo": label, "day": days, **dict(zip(names, qs)), "n": len(sub)}))
+    return pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=["grupo", "day", *names, "n"])
@@ -1,5 +1,6 @@
 # services/data.py
 from __future__ import annotations
+import hashlib
 import pandas as pd
 from services.risk_engine import DUMMY_ORDERED_COLS
 
@@ -8,3 +9,17 @@ def expected_columns() -> list[str]:
 
 def validate_columns(df: pd.DataFrame) -> list[str]:
     return [c for c in DUMMY_ORDERED_COLS if c not in df.columns]
+
+def dataset_key(df: pd.DataFrame, cols: list[str] | None = None, extra=None) -> str:
+    """
+    Huella corta de un DataFrame (+ filtros opcionales en `extra`) para usar como llave de caché.
+    Se calcula vectorizado con hash_pandas_object; columnas con listas/dicts (p.ej. surv_curve) se omiten.
+    """
+    if cols is None:
+        cols = [c for c in df.columns
+                if not (len(df) and isinstance(df[c].iloc[0], (list, dict)))]
+    h = hashlib.blake2b(digest_size=12)
+    h.update(repr((list(cols), len(df), extra)).encode("utf-8"))
+    if len(df) and cols:
+        h.update(pd.util.hash_pandas_object(df[cols], index=False).to_numpy().tobytes())
+    return h.hexdigest()
@@ -1,34 +1,45 @@
 # services/data_loader.py
 from __future__ import annotations
-import os, uuid, random
-from datetime import datetime, timedelta
+import io, os, uuid
+from datetime import datetime
+from itertools import permutations
 import numpy as np
 import pandas as pd
+import threading
 import streamlit as st
-from pydantic import BaseModel, Field, ValidationError
-from dateutil.relativedelta import relativedelta
 from .settings import debug
 
 DATA_DIR = "data"
 SAMPLE_FILE = os.path.join(DATA_DIR, "sample_egresos.csv")
 
-class Schema(BaseModel):
-    patient_id: str
-    episode_id: str
-    fecha_ingreso: str
-    fecha_egreso_prevista: str
-    edad: int = Field(ge=0, le=110)
-    sexo: str
-    dx_principal_cie10: str
-    dx_secundarios: str
-    creatinina: float
-    hba1c: float
-    sistolica: int
-    diastolica: int
-    polifarmacia_n: int
-    hosp_6m: int
-    servicio: str
-    municipio: str
+_SCHEMA = None
+
+def _schema():
+    # pydantic se importa solo al validar un CSV subido (no en el arranque)
+    global _SCHEMA
+    if _SCHEMA is None:
+        from pydantic import BaseModel, Field
+
+        class Schema(BaseModel):
+            patient_id: str
+            episode_id: str
+            fecha_ingreso: str
+            fecha_egreso_prevista: str
+            edad: int = Field(ge=0, le=110)
+            sexo: str
+            dx_principal_cie10: str
+            dx_secundarios: str
+            creatinina: float
+            hba1c: float
+            sistolica: int
+            diastolica: int
+            polifarmacia_n: int
+            hosp_6m: int
+            servicio: str
+            municipio: str
+
+        _SCHEMA = Schema
+    return _SCHEMA
 
 SERVICIOS = ["Medicina Interna","Cardiología","Nefrología","Cirugía","UCI","Obs. Urgencias"]
 CIE10 = ["I50", "I21", "N18", "E11", "I10", "E78", "J44", "K21", "F41"]
@@ -37,57 +48,78 @@ MUNICIPIOS = ["Bogotá","Medellín","Cali","Barranquilla","Monterrey","CDMX","Gu
 def _ensure_data_dir():
     os.makedirs(DATA_DIR, exist_ok=True)
 
+def _hex_ids(rng: np.random.Generator, n: int) -> np.ndarray:
+    # ids de 8 caracteres hex (como uuid4()[:8]) sin formatear fila por fila
+    return np.frombuffer(rng.bytes(4 * n).hex().encode("ascii"), dtype="S8").astype(str).astype(object)
+
 def generate_dummy(n: int = 180, seed: int = 42) -> pd.DataFrame:
+    # vectorizado: sirve igual para el demo (180 filas) que para pruebas de carga (1M filas)
     rng = np.random.default_rng(seed)
-    rows = []
-    today = datetime.now().date()
-    for i in range(n):
-        pid = str(uuid.uuid4())[:8]
-        epi = str(uuid.uuid4())[:8]
-        servicio = random.choice(SERVICIOS)
-        sexo = random.choice(["M","F"])
-        edad = int(np.clip(rng.normal(66, 12), 20, 95))
-        ing = today - timedelta(days=int(np.clip(rng.normal(6, 4), 0, 25)))
-        egr_prev = ing + timedelta(days=int(np.clip(rng.normal(7, 3), 1, 21)))
-        dxp = random.choice(CIE10)
-        dxs = ";".join(rng.choice(CIE10, size=rng.integers(1,4), replace=False))
-        creat = round(float(np.clip(rng.normal(1.4 if dxp in ["N18"] else 1.1, 0.5), 0.4, 6.0)),2)
-        hba1c = round(float(np.clip(rng.normal(7.8 if dxp in ["E11"] else 6.2, 1.2), 4.8, 13.5)),1)
-        sis = int(np.clip(rng.normal(132, 18), 90, 210))
-        dia = int(np.clip(rng.normal(82, 12), 55, 130))
-        poly = int(np.clip(rng.poisson(5), 0, 18))
-        hosp6 = int(rng.random() < 0.22) + int(rng.random() < 0.10)  # 0-2
-        muni = random.choice(MUNICIPIOS)
-        rows.append(dict(
-            patient_id=pid, episode_id=epi,
-            fecha_ingreso=str(ing),
-            fecha_egreso_prevista=str(egr_prev),
-            edad=edad, sexo=sexo,
-            dx_principal_cie10=dxp, dx_secundarios=dxs,
-            creatinina=creat, hba1c=hba1c,
-            sistolica=sis, diastolica=dia,
-            polifarmacia_n=poly, hosp_6m=hosp6,
-            servicio=servicio, municipio=muni
-        ))
-    df = pd.DataFrame(rows)
-    return df
+    today = np.datetime64(datetime.now().date(), "D")
+    dxp = rng.choice(CIE10, n)
+    # 1-3 diagnósticos secundarios distintos: se sortea entre todas las combinaciones ordenadas de k códigos
+    combos = [np.array([";".join(p) for p in permutations(CIE10, k)], dtype=object) for k in (1, 2, 3)]
+    k = rng.integers(0, 3, n)
+    pick = (rng.random(n) * np.array([len(c) for c in combos])[k]).astype(int)
+    sec = np.empty(n, dtype=object)
+    for j, c in enumerate(combos):
+        sec[k == j] = c[pick[k == j]]
+    ing = today - np.clip(rng.normal(6, 4, n), 0, 25).astype(int).astype("timedelta64[D]")
+    egr_prev = ing + np.clip(rng.normal(7, 3, n), 1, 21).astype(int).astype("timedelta64[D]")
+    return pd.DataFrame(dict(
+        patient_id=_hex_ids(rng, n),
+        episode_id=_hex_ids(rng, n),
+        fecha_ingreso=np.datetime_as_string(ing),
+        fecha_egreso_prevista=np.datetime_as_string(egr_prev),
+        edad=np.clip(rng.normal(66, 12, n), 20, 95).astype(int),
+        sexo=rng.choice(["M","F"], n),
+        dx_principal_cie10=dxp,
+        dx_secundarios=sec,
+        creatinina=np.clip(rng.normal(np.where(dxp == "N18", 1.4, 1.1), 0.5), 0.4, 6.0).round(2),
+        hba1c=np.clip(rng.normal(np.where(dxp == "E11", 7.8, 6.2), 1.2), 4.8, 13.5).round(1),
+        sistolica=np.clip(rng.normal(132, 18, n), 90, 210).astype(int),
+        diastolica=np.clip(rng.normal(82, 12, n), 55, 130).astype(int),
+        polifarmacia_n=np.clip(rng.poisson(5, n), 0, 18),
+        hosp_6m=(rng.random(n) < 0.22).astype(int) + (rng.random(n) < 0.10).astype(int),  # 0-2
+        servicio=rng.choice(SERVICIOS, n),
+        municipio=rng.choice(MUNICIPIOS, n),
+    ))
 
 def write_sample_if_missing():
+    # Para el build/entrypoint: python -m services.data_loader
     _ensure_data_dir()
     if not os.path.exists(SAMPLE_FILE):
         df = generate_dummy()
-        df.to_csv(SAMPLE_FILE, index=False)
+        # temporal único: otro proceso (o el build) puede estar escribiendo el mismo sample
+        tmp = f"{SAMPLE_FILE}.{uuid.uuid4().hex}.tmp"
+        try:
+            df.to_csv(tmp, index=False)
+            os.replace(tmp, SAMPLE_FILE)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
 
-@st.cache_data(show_spinner=False)
-def load_csv(path_or_buffer=None) -> pd.DataFrame:
-    write_sample_if_missing()
-    if path_or_buffer is None:
-        df = pd.read_csv(SAMPLE_FILE)
-        debug(f"Cargado dataset dummy ({len(df)} filas)")
-    else:
-        df = pd.read_csv(path_or_buffer)
-        debug(f"Cargado dataset del usuario ({len(df)} filas)")
+_SAMPLE_LOCK = threading.Lock()
+_SAMPLE_WRITER_STARTED = False
+
+def _sample_frame() -> pd.DataFrame:
+    # Si el sample no se generó en el build, se sirve en memoria y se escribe en segundo plano
+    if os.path.exists(SAMPLE_FILE):
+        return pd.read_csv(SAMPLE_FILE)
+    # un solo escritor por proceso aunque varias sesiones lleguen a la vez
+    global _SAMPLE_WRITER_STARTED
+    with _SAMPLE_LOCK:
+        if not _SAMPLE_WRITER_STARTED:
+            _SAMPLE_WRITER_STARTED = True
+            threading.Thread(target=write_sample_if_missing, daemon=True).start()
+    df = generate_dummy()
+    # mismo tipado que la lectura desde CSV
+    return pd.read_csv(io.StringIO(df.to_csv(index=False)))
+
+def _validate_sample(df: pd.DataFrame):
     # quick schema check (sample 5)
+    from pydantic import ValidationError
+    Schema = _schema()
     for _, r in df.sample(min(len(df),5), random_state=7).iterrows():
         try:
             Schema(**r.to_dict())
@@ -95,6 +127,16 @@ def load_csv(path_or_buffer=None) -> pd.DataFrame:
             debug(str(e))
             st.warning("⚠️ Columnas o tipos inesperados en el CSV. Usando lo disponible.")
             break
+
+@st.cache_data(show_spinner=False, max_entries=8)   # cada CSV subido es una entrada: acotado
+def load_csv(path_or_buffer=None) -> pd.DataFrame:
+    if path_or_buffer is None:
+        df = _sample_frame()
+        debug(f"Cargado dataset dummy ({len(df)} filas)")
+    else:
+        df = pd.read_csv(path_or_buffer)
+        debug(f"Cargado dataset del usuario ({len(df)} filas)")
+        _validate_sample(df)
     return df
 
 def parse_date(s: str):
@@ -102,3 +144,126 @@ def parse_date(s: str):
 
 def days_between(a, b) -> int:
     return (pd.to_datetime(b) - pd.to_datetime(a)).days
+
+# ======= Features de historia (episodios previos por paciente) =======
+HISTORY_WINDOW_DAYS = 180     # "hosp_6m"
+READMIT_DAYS = 30             # reingreso: ingreso ≤ 30 días tras el egreso previo
+
+def _to_day(s: pd.Series) -> tuple[np.ndarray, np.ndarray]:
+    # (día entero, válido): NaT o fechas ilegibles quedan en 0 y fuera de ventanas y reingresos
+    d = pd.to_datetime(s, errors="coerce")
+    ok = d.notna().to_numpy()
+    return np.where(ok, d.to_numpy().astype("datetime64[D]").astype(np.int64), 0), ok
+
+def build_history_features(episodes: pd.DataFrame, admit_col: str = "fecha_ingreso",
+                           discharge_col: str = "fecha_egreso") -> pd.DataFrame:
+    """
+    Deriva por episodio, a partir del histórico (muchos episodios por patient_id):
+      - hosp_6m: egresos previos del paciente en los 180 días antes del ingreso
+      - dias_desde_ultimo_egreso: NaN si no hay egreso previo
+      - es_reingreso_30d y reingresos_previos (reingresos en episodios anteriores)
+    Todo vectorizado: orden + searchsorted sobre llaves compuestas, merge_asof y cumsum por grupo.
+    Episodios sin fecha de ingreso quedan con hosp_6m=0 y sin reingreso; los que no tienen fecha
+    de egreso no cuentan como egreso previo de nadie.
+    """
+    if discharge_col not in episodes.columns:
+        discharge_col = "fecha_egreso_prevista"
+    # Códigos enteros por paciente: ordenar y unir por int es mucho más barato que por string
+    pcode = pd.factorize(episodes["patient_id"].astype(str))[0].astype(np.int64)
+    (adm, adm_ok), (dis, dis_ok) = _to_day(episodes[admit_col]), _to_day(episodes[discharge_col])
+    order = np.lexsort((adm, pcode))
+    e = pd.DataFrame({
+        "patient_id": episodes["patient_id"].astype(str).to_numpy()[order],
+        "episode_id": episodes["episode_id"].astype(str).to_numpy()[order],
+        "pcode": pcode[order], "adm": adm[order], "dis": dis[order],
+    })
+    adm_ok, dis_ok = adm_ok[order], dis_ok[order]
+    if not (adm_ok.any() and dis_ok.any()):
+        return e.drop(columns=["pcode", "adm", "dis"]).assign(
+            hosp_6m=0, dias_desde_ultimo_egreso=np.nan, es_reingreso_30d=False, reingresos_previos=0)
+
+    # Llave compuesta paciente·día: el conteo por ventana queda dentro de cada paciente
+    a, d, p = e["adm"].to_numpy(), e["dis"].to_numpy(), e["pcode"].to_numpy()
+    lo = min(a[adm_ok].min(), d[dis_ok].min())
+    span = max(a[adm_ok].max(), d[dis_ok].max()) - lo + HISTORY_WINDOW_DAYS + 2
+    key_adm = p * span + (a - lo)
+    key_dis = np.sort(p[dis_ok] * span + (d[dis_ok] - lo))
+    e["hosp_6m"] = np.where(adm_ok, np.searchsorted(key_dis, key_adm, side="left")
+                            - np.searchsorted(key_dis, key_adm - HISTORY_WINDOW_DAYS, side="left"), 0)
+
+    # Último egreso estrictamente anterior al ingreso (as-of join por paciente, solo fechas válidas)
+    left = e.loc[adm_ok, ["pcode", "adm"]].reset_index().sort_values("adm", kind="mergesort")
+    right = e.loc[dis_ok, ["pcode", "dis"]].sort_values("dis", kind="mergesort")
+    asof = pd.merge_asof(left, right, left_on="adm", right_on="dis", by="pcode",
+                         direction="backward", allow_exact_matches=False)
+    gap = np.full(len(e), np.nan)
+    gap[asof["index"].to_numpy()] = (asof["adm"] - asof["dis"]).to_numpy(dtype=float)
+    e["dias_desde_ultimo_egreso"] = gap
+    e["es_reingreso_30d"] = e["dias_desde_ultimo_egreso"].le(READMIT_DAYS)
+    e["reingresos_previos"] = (e.groupby("pcode", sort=False)["es_reingreso_30d"].cumsum()
+                               - e["es_reingreso_30d"]).astype(int)
+    return e.drop(columns=["pcode", "adm", "dis"])
+
+def _partition_of(patient_ids: pd.Series, n_partitions: int) -> np.ndarray:
+    h = pd.util.hash_array(patient_ids.astype(str).to_numpy(dtype=object))
+    return (h % np.uint64(n_partitions)).astype(int)
+
+def iter_history_features(source, n_partitions: int = 32, chunksize: int = 1_000_000,
+                          workdir: str | None = None, **kwargs):
+    """
+    Versión particionada para extractos grandes (p.ej. 20M episodios):
+      1) lee `source` (ruta CSV o iterable de DataFrames) por chunks y reparte filas por hash(patient_id)
+         en n_partitions archivos temporales; todos los episodios de un paciente caen en la misma partición
+      2) procesa cada partición con build_history_features y la entrega (generator)
+    La memoria queda acotada por el tamaño de una partición, no del extracto completo.
+    """
+    import tempfile, shutil
+    chunks = pd.read_csv(source, chunksize=chunksize) if isinstance(source, (str, os.PathLike)) else source
+    tmp = tempfile.mkdtemp(prefix="hist_parts_", dir=workdir)
+    try:
+        paths = [os.path.join(tmp, f"part_{i:03d}.csv") for i in range(n_partitions)]
+        written = set()
+        for chunk in chunks:
+            part = _partition_of(chunk["patient_id"], n_partitions)
+            for p, grp in chunk.groupby(part, sort=False):
+                grp.to_csv(paths[p], mode="a", index=False, header=p not in written)
+                written.add(p)
+        for p in sorted(written):
+            yield build_history_features(pd.read_csv(paths[p], dtype={"patient_id": str, "episode_id": str}), **kwargs)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+def attach_history_features(df: pd.DataFrame, history: pd.DataFrame) -> pd.DataFrame:
+    # Reemplaza hosp_6m (y agrega el resto) por episode_id, listo para score_batch
+    cols = ["episode_id", "hosp_6m", "dias_desde_ultimo_egreso", "reingresos_previos"]
+    out = df.drop(columns=[c for c in cols[1:] if c in df.columns]).copy()
+    out["episode_id"] = out["episode_id"].astype(str)
+    out = out.merge(history[cols], on="episode_id", how="left")
+    out["hosp_6m"] = out["hosp_6m"].fillna(0).astype(int)
+    return out
+
+def _main(argv=None):
+    import argparse
+    ap = argparse.ArgumentParser(description="Datos de egresos: muestra de demo y features de historia")
+    sub = ap.add_subparsers(dest="cmd")
+    sub.add_parser("muestra", help="pre-genera data/sample_egresos.csv (por defecto)")
+    hist = sub.add_parser("historia", help="hosp_6m, reingresos y días desde el último egreso por episodio")
+    hist.add_argument("episodios", help="CSV histórico (patient_id, episode_id, fecha_ingreso, fecha_egreso)")
+    hist.add_argument("--out", required=True, help="CSV de features por episode_id")
+    hist.add_argument("--egresos", help="CSV de egresos a puntuar: se le adjuntan las features (attach_history_features)")
+    hist.add_argument("--partitions", type=int, default=32)
+    hist.add_argument("--chunksize", type=int, default=1_000_000)
+    args = ap.parse_args(argv)
+    if args.cmd == "historia":
+        feats = pd.concat(iter_history_features(args.episodios, args.partitions, args.chunksize), ignore_index=True)
+        if args.egresos:
+            feats = attach_history_features(pd.read_csv(args.egresos), feats)
+        feats.to_csv(args.out, index=False)
+        print(f"{args.out}: {len(feats):,} episodios")
+    else:
+        # pre-genera data/sample_egresos.csv fuera del request path (imagen/entrypoint)
+        write_sample_if_missing()
+        print(SAMPLE_FILE)
+
+if __name__ == "__main__":
+    _main()
@@ -0,0 +1,239 @@
+# services/dataset_store.py
+from __future__ import annotations
+import hashlib
+import os
+import uuid
+from datetime import date, datetime
+import numpy as np
+import pandas as pd
+import streamlit as st
+from .data_loader import DATA_DIR
+from .settings import debug
+
+# Histórico de egresos puntuados en Parquet particionado estilo hive:
+#   data/egresos/mes=2026-10/servicio=Cardiología/part-<marca>-<id>.parquet
+STORE_DIR = os.path.join(DATA_DIR, "egresos")
+PARTITION_COLS = ("mes", "servicio")
+DATE_COL = "fecha_ingreso"
+COMPACT_MIN_FILES = 4        # una partición con este número de archivos (o más) se compacta
+CHUNK_ROWS = 200_000
+
+def _enc(value: str) -> str:
+    # valores legibles en el nombre del directorio; solo se escapan los caracteres que lo romperían
+    return str(value).replace("%", "%25").replace("/", "%2F")
+
+def _dec(value: str) -> str:
+    return value.replace("%2F", "/").replace("%25", "%")
+
+def _month(d) -> str:
+    return pd.Timestamp(d).strftime("%Y-%m")
+
+class DatasetStore:
+    """
+    Capa de datos particionada por mes de ingreso y servicio.
+
+    - append(): cada lote puntuado se escribe como un archivo nuevo por partición (tmp + rename:
+      los lectores nunca ven archivos a medias); los lotes incrementales no reescriben nada.
+    - scan(): poda de particiones por directorio (servicios y rango de meses de los filtros de la
+      página) antes de abrir un solo archivo; el rango exacto de fechas se filtra dentro de las
+      particiones que quedan. Las páginas leen solo la porción que muestran.
+    - compact(): fusiona los archivos pequeños de cada partición en uno ordenado por fecha
+      (solo desde el CLI, un proceso a la vez).
+    """
+
+    def __init__(self, root: str = STORE_DIR):
+        self.root = root
+
+    # ---- escritura ----
+    def append(self, scored: pd.DataFrame) -> list[str]:
+        if scored.empty:
+            return []
+        df = scored.copy()
+        # fecha de ingreso como timestamp (cualquier formato del CSV): el filtro por fechas compara
+        # instantes, no texto
+        df[DATE_COL] = pd.to_datetime(df[DATE_COL], format="mixed")
+        df["mes"] = df[DATE_COL].dt.strftime("%Y-%m")
+        stamp = datetime.now().strftime("%Y%m%dT%H%M%S")
+        written = []
+        for (mes, svc), part in df.groupby(list(PARTITION_COLS), sort=False):
+            leaf = self._leaf(mes, svc)
+            os.makedirs(leaf, exist_ok=True)
+            path = os.path.join(leaf, f"part-{stamp}-{uuid.uuid4().hex[:8]}.parquet")
+            part.drop(columns=list(PARTITION_COLS)).to_parquet(path + ".tmp", index=False)
+            os.replace(path + ".tmp", path)
+            written.append(path)
+        debug(f"DatasetStore: {len(df):,} filas en {len(written)} particiones")
+        return written
+
+    def _leaf(self, mes: str, servicio: str) -> str:
+        return os.path.join(self.root, f"mes={_enc(mes)}", f"servicio={_enc(servicio)}")
+
+    # ---- particiones ----
+    def partitions(self) -> pd.DataFrame:
+        """
+        Una fila por partición hoja: mes, servicio, ruta, archivos, bytes (solo listado de directorios).
+        """
+        rows = []
+        if os.path.isdir(self.root):
+            for m in os.scandir(self.root):
+                if not (m.is_dir() and m.name.startswith("mes=")):
+                    continue
+                for s in os.scandir(m.path):
+                    if not (s.is_dir() and s.name.startswith("servicio=")):
+                        continue
+                    files = [f for f in os.scandir(s.path) if f.name.endswith(".parquet")]
+                    rows.append({"mes": _dec(m.name[4:]), "servicio": _dec(s.name[9:]), "path": s.path,
+                                 "archivos": len(files), "bytes": sum(f.stat().st_size for f in files)})
+        return pd.DataFrame(rows, columns=["mes", "servicio", "path", "archivos", "bytes"])
+
+    def prune(self, servicios=None, since: date | None = None, until: date | None = None) -> pd.DataFrame:
+        # particiones que pueden contener filas del filtro (el resto no se abre)
+        parts = self.partitions()
+        keep = np.ones(len(parts), dtype=bool)
+        if servicios:
+            keep &= parts["servicio"].isin(list(servicios)).to_numpy()
+        if since is not None:
+            keep &= (parts["mes"] >= _month(since)).to_numpy()
+        if until is not None:
+            keep &= (parts["mes"] <= _month(until)).to_numpy()
+        return parts[keep]
+
+    def files(self, servicios=None, since: date | None = None, until: date | None = None) -> list[str]:
+        return sorted(os.path.join(p, f) for p in self.prune(servicios, since, until)["path"]
+                      for f in os.listdir(p) if f.endswith(".parquet"))
+
+    # ---- lectura (motor de consultas sobre la raíz del histórico) ----
+    def table(self, engine=None) -> str:
+        """
+        Registra la raíz del histórico en el motor de consultas (services.query_engine) y devuelve
+        el nombre de tabla. Se re-registra en cada llamada: el esquema puede crecer con un append.
+        """
+        from .query_engine import get_engine
+        name = "egresos_" + hashlib.sha1(os.path.abspath(self.root).encode("utf-8")).hexdigest()[:10]
+        return (engine or get_engine()).register_parquet(self.root, name)
+
+    def where(self, servicios=None, since: date | None = None, until: date | None = None) -> list[tuple]:
+        # filtros del motor: servicio y mes podan particiones (directorios); la fecha filtra filas.
+        # Los servicios van sin codificar: duckdb y pyarrow ya decodifican los valores hive (%2F -> /)
+        # `until` es inclusivo por día: un ingreso con hora (2026-10-05 14:30) cae antes del día siguiente
+        where = []
+        if servicios:
+            where.append(("servicio", "in", [str(s) for s in servicios]))
+        if since is not None:
+            where += [("mes", ">=", _month(since)), (DATE_COL, ">=", pd.Timestamp(since).normalize())]
+        if until is not None:
+            where += [("mes", "<=", _month(until)), (DATE_COL, "<", pd.Timestamp(until).normalize() + pd.Timedelta(days=1))]
+        return where
+
+    def scan(self, servicios=None, since: date | None = None, until: date | None = None,
+             columns: list[str] | None = None, where=()) -> pd.DataFrame:
+        """
+        Filas de los servicios y fechas de ingreso pedidos (extremos inclusivos), resueltas en el
+        motor de consultas: a la página llegan solo las filas del filtro. `where` agrega filtros
+        por fila en el formato del motor (p.ej. umbrales de un constructor de cohortes). Las columnas de partición
+        vuelven como texto ya decodificado por el motor; surv_curve/top_features vuelven como listas (igual que score_batch).
+        """
+        from .query_engine import get_engine
+        if not store_available(self.root):
+            return pd.DataFrame(columns=columns or [])
+        engine = get_engine()
+        df = engine.select(self.table(engine), columns, self.where(servicios, since, until) + list(where))
+        debug(f"DatasetStore: {len(df):,} filas (servicios={servicios or 'todos'}, {since}→{until})")
+        if columns is None:
+            df = df.drop(columns="mes")     # derivada de fecha_ingreso; no es parte de score_batch
+        for c in ("surv_curve", "top_features"):
+            if c in df.columns:
+                df[c] = [x.tolist() if isinstance(x, np.ndarray) else x for x in df[c]]
+        return df.reset_index(drop=True)
+
+    # ---- mantenimiento ----
+    def compact(self, min_files: int = COMPACT_MIN_FILES) -> pd.DataFrame:
+        """
+        Fusiona cada partición con `min_files` archivos o más en un solo archivo ordenado por fecha
+        de ingreso (mejores estadísticas por row group). El archivo nuevo aparece completo antes de
+        borrar los anteriores; en esa ventana un lector concurrente podría ver filas duplicadas.
+        Es mantenimiento de CLI (python -m services.dataset_store compact), fuera de horario y sin
+        otra compactación en paralelo: no hay lock entre procesos. Un append concurrente es seguro,
+        solo se borran los archivos listados al empezar.
+        """
+        out = []
+        for p in self.partitions().itertuples():
+            if p.archivos < min_files:
+                continue
+            old = sorted(os.path.join(p.path, f) for f in os.listdir(p.path) if f.endswith(".parquet"))
+            df = pd.concat([pd.read_parquet(f) for f in old], ignore_index=True)
+            df = df.sort_values(DATE_COL, kind="stable")
+            path = os.path.join(p.path, f"part-{datetime.now():%Y%m%dT%H%M%S}-c{uuid.uuid4().hex[:7]}.parquet")
+            df.to_parquet(path + ".tmp", index=False)
+            os.replace(path + ".tmp", path)
+            for f in old:
+                os.remove(f)
+            out.append({"mes": p.mes, "servicio": p.servicio, "archivos_antes": len(old), "filas": len(df),
+                        "bytes_antes": p.bytes, "bytes_despues": os.path.getsize(path)})
+        return pd.DataFrame(out, columns=["mes", "servicio", "archivos_antes", "filas", "bytes_antes", "bytes_despues"])
+
+def store_available(root: str = STORE_DIR) -> bool:
+    return os.path.isdir(root) and any(e.name.startswith("mes=") for e in os.scandir(root))
+
+def _signature(store: DatasetStore, servicios, since, until) -> tuple:
+    # llave de caché: archivos que sobreviven a la poda + su mtime (un append o compactación la cambia)
+    return tuple((f, os.stat(f).st_mtime_ns) for f in store.files(servicios, since, until))
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def _scan_cached(root: str, servicios: tuple, since, until, signature: tuple, where: tuple = ()) -> pd.DataFrame:
+    return DatasetStore(root).scan(list(servicios) or None, since, until, where=where)
+
+def cached_scan(servicios=(), since: date | None = None, until: date | None = None,
+                root: str = STORE_DIR, where=()) -> pd.DataFrame:
+    # misma porción pedida por varias sesiones/reruns: se lee una vez mientras no cambien sus archivos
+    servicios = tuple(sorted(servicios or ()))
+    where = tuple((c, op, tuple(v) if isinstance(v, (list, set)) else v) for c, op, v in where)
+    return _scan_cached(root, servicios, since, until, _signature(DatasetStore(root), servicios, since, until), where)
+
+# ======= Ingesta por lotes =======
+def ingest_csv(path: str, store: DatasetStore | None = None, chunksize: int = CHUNK_ROWS,
+               norm: tuple[float, float] | None = None) -> int:
+    """
+    Puntúa un CSV de egresos por chunks con la normalización congelada (la del primer chunk si no
+    se pasa) y lo agrega al histórico particionado. Devuelve las filas escritas.
+    """
+    from .model_registry import ALTA_SEGURA, get_model
+    from .risk_api import score_batch, score_norm
+    store = store or DatasetStore()
+    model = get_model(ALTA_SEGURA)
+    n = 0
+    for chunk in pd.read_csv(path, chunksize=chunksize):
+        if norm is None:
+            norm = score_norm(chunk)
+        store.append(score_batch(chunk, norm=norm, model=model))
+        n += len(chunk)
+    return n
+
+def _main(argv=None):
+    import argparse
+    ap = argparse.ArgumentParser(description="Histórico de egresos particionado (mes × servicio)")
+    ap.add_argument("--root", default=STORE_DIR)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    ing = sub.add_parser("ingest", help="puntúa y agrega uno o más CSV de egresos")
+    ing.add_argument("csv", nargs="+")
+    ing.add_argument("--chunksize", type=int, default=CHUNK_ROWS)
+    cmp_ = sub.add_parser("compact", help="fusiona archivos pequeños por partición")
+    cmp_.add_argument("--min-files", type=int, default=COMPACT_MIN_FILES)
+    sub.add_parser("info", help="particiones, archivos y tamaño")
+    args = ap.parse_args(argv)
+    store = DatasetStore(args.root)
+    if args.cmd == "ingest":
+        # una sola normalización para todos los archivos: los riesgos de lotes distintos son comparables
+        from .risk_api import score_norm
+        norm = score_norm(pd.read_csv(args.csv[0], nrows=args.chunksize))
+        for path in args.csv:
+            print(f"{path}: {ingest_csv(path, store, args.chunksize, norm):,} filas")
+    elif args.cmd == "compact":
+        print(store.compact(args.min_files).to_string(index=False))
+    else:
+        parts = store.partitions()
+        print(parts.drop(columns="path").sort_values(["mes", "servicio"]).to_string(index=False))
+        print(f"{len(parts)} particiones · {parts['archivos'].sum()} archivos · {parts['bytes'].sum() / 2**20:.1f} MB")
+
+if __name__ == "__main__":
+    _main()
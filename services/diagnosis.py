@@ -0,0 +1,95 @@
+# services/diagnosis.py
+from __future__ import annotations
+import numpy as np
+import pandas as pd
+
+# Grupos estilo Charlson por prefijo CIE-10 (3 caracteres) -> (grupo, peso)
+CHARLSON_GROUPS = {
+    "iam": (["I21", "I22", "I252"], 1),
+    "insuf_cardiaca": (["I50", "I110", "I130", "I132"], 1),
+    "vascular_periferica": (["I70", "I71", "I73"], 1),
+    "cerebrovascular": ([f"I{n}" for n in range(60, 70)] + ["G45", "G46"], 1),
+    "demencia": (["F00", "F01", "F02", "F03", "G30"], 1),
+    "pulmonar_cronica": ([f"J{n}" for n in range(40, 48)], 1),
+    "reumatologica": (["M05", "M06", "M32", "M33", "M34"], 1),
+    "ulcera_peptica": (["K25", "K26", "K27", "K28"], 1),
+    "hepatica_leve": (["K70", "K73", "K74"], 1),
+    "diabetes": (["E10", "E11", "E12", "E13", "E14"], 1),
+    "diabetes_complicada": ([f"E1{n}{c}" for n in range(0, 5) for c in "23457"], 2),
+    "hemiplejia": (["G81", "G82"], 2),
+    "renal": (["N18", "N19"], 2),
+    "cancer": ([f"C{n:02d}" for n in range(0, 77)] + [f"C{n}" for n in range(81, 98)], 2),
+    "hepatica_grave": (["K72", "K766"], 3),
+    "metastasis": (["C77", "C78", "C79", "C80"], 6),
+    "vih": (["B20", "B21", "B22", "B24"], 6),
+}
+GROUP_NAMES = list(CHARLSON_GROUPS.keys())
+GROUP_WEIGHTS = np.array([w for _, w in CHARLSON_GROUPS.values()], dtype=float)
+# Jerarquía de Charlson: la forma grave anula a la leve del mismo dominio (grave -> leve)
+CHARLSON_HIERARCHY = {
+    "metastasis": "cancer",
+    "hepatica_grave": "hepatica_leve",
+    "diabetes_complicada": "diabetes",
+}
+
+def _normalize(codes: pd.Series) -> pd.Series:
+    return codes.astype(str).str.upper().str.replace(r"[^A-Z0-9;]", "", regex=True)
+
+def encode_multi_hot(df: pd.DataFrame, cols=("dx_principal_cie10", "dx_secundarios"),
+                     vocab: pd.Index | None = None):
+    """
+    Multi-hot CSR (episodios × códigos) a partir de columnas CIE-10 separadas por ';'.
+    Devuelve (X, vocab). Si se pasa `vocab`, códigos fuera del vocabulario se ignoran
+    (útil para puntuar lotes nuevos con el vocabulario de entrenamiento).
+    """
+    from scipy import sparse
+    cols = [c for c in cols if c in df.columns]
+    if not cols:
+        return sparse.csr_matrix((len(df), 0 if vocab is None else len(vocab))), (vocab if vocab is not None else pd.Index([]))
+    joined = _normalize(df[cols[0]].fillna(""))
+    for c in cols[1:]:
+        joined = joined + ";" + _normalize(df[c].fillna(""))
+    codes = joined.reset_index(drop=True).str.split(";").explode()   # índice = posición de la fila
+    rows, vals = codes.index.to_numpy(), codes.to_numpy()
+    ok = vals != ""
+    rows, vals = rows[ok], vals[ok]
+    if vocab is None:
+        col_idx, vocab = pd.factorize(vals, sort=True)
+        vocab = pd.Index(vocab)
+    else:
+        col_idx = vocab.get_indexer(vals)
+        keep = col_idx >= 0
+        rows, col_idx = rows[keep], col_idx[keep]
+    X = sparse.csr_matrix((np.ones(len(rows), dtype=np.float32), (rows, col_idx)), shape=(len(df), len(vocab)))
+    X.data[:] = 1.0   # códigos repetidos en un episodio cuentan una vez
+    return X, vocab
+
+def group_matrix(vocab: pd.Index):
+    # códigos × grupos Charlson (por prefijo de 3 o 4 caracteres)
+    from scipy import sparse
+    prefix_to_group = {p: j for j, (ps, _) in enumerate(CHARLSON_GROUPS.values()) for p in ps}
+    rows, cols = [], []
+    for i, code in enumerate(vocab):
+        for p in (code[:4], code[:3]):
+            j = prefix_to_group.get(p)
+            if j is not None:
+                rows.append(i); cols.append(j)
+                break
+    return sparse.csr_matrix((np.ones(len(rows), dtype=np.float32), (rows, cols)), shape=(len(vocab), len(GROUP_NAMES)))
+
+def comorbidity_index(df: pd.DataFrame, return_groups: bool = False):
+    """
+    Índice de comorbilidad estilo Charlson: (X · G > 0) · pesos, con productos dispersos.
+    Cada grupo cuenta una sola vez por episodio y se aplica CHARLSON_HIERARCHY
+    (p. ej. metástasis + tumor primario suma 6, no 8).
+    """
+    from scipy import sparse
+    X, vocab = encode_multi_hot(df)
+    groups = (X @ group_matrix(vocab)).toarray() > 0
+    for severe, mild in CHARLSON_HIERARCHY.items():
+        groups[:, GROUP_NAMES.index(mild)] &= ~groups[:, GROUP_NAMES.index(severe)]
+    groups = sparse.csr_matrix(groups.astype(np.float32))
+    score = np.asarray(groups @ GROUP_WEIGHTS).ravel()
+    if return_groups:
+        return score, groups
+    return score
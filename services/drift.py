@@ -0,0 +1,253 @@
+# services/drift.py
+from __future__ import annotations
+import json
+import os
+import uuid
+import numpy as np
+import pandas as pd
+import streamlit as st
+from .data_loader import DATA_DIR
+from .risk_engine import FEATURE_CONFIG
+
+# Monitoreo de drift de entrada: perfiles con momentos + histogramas de bins fijos que se
+# actualizan por chunks (y se pueden fusionar), comparados contra un perfil de referencia.
+BINS = 20
+PSI_ALERT, PSI_CRIT = 0.10, 0.25
+MISSING_ALERT = 0.05        # aumento de tasa de faltantes que dispara alerta
+CHUNK_ROWS = 200_000
+EGRESOS_RANGES = {
+    "creatinina": (0.4, 6.0), "hba1c": (4.8, 13.5), "sistolica": (90, 210),
+    "polifarmacia_n": (0, 18), "hosp_6m": (0, 3),
+}
+
+def feature_specs(kind: str) -> dict[str, dict]:
+    """
+    Variables monitoreadas por dataset: "egresos" (Alta Segura y afines) o "fsfb" (FEATURE_CONFIG).
+    Numéricas: BINS bins fijos en [lo, hi] + bajo/sobre rango. Categóricas: niveles conocidos + "otro".
+    """
+    if kind == "egresos":
+        return {c: {"type": "num", "edges": np.linspace(lo, hi, BINS + 1)} for c, (lo, hi) in EGRESOS_RANGES.items()}
+    if kind == "fsfb":
+        specs = {}
+        for c, cfg in FEATURE_CONFIG.items():
+            if cfg["type"] in ("num", "num_inv"):
+                specs[c] = {"type": "num", "edges": np.linspace(*cfg["norm"], BINS + 1)}
+            else:
+                specs[c] = {"type": "cat", "levels": list(cfg["map"])}
+        return specs
+    raise ValueError(f"Tipo de dataset desconocido: {kind}")
+
+def _width(spec: dict) -> int:
+    return BINS + 2 if spec["type"] == "num" else len(spec["levels"]) + 1
+
+class StreamingProfile:
+    """
+    Perfil por variable acumulado chunk a chunk (memoria O(variables · bins), no O(filas)):
+    conteo, faltantes, media/M2 (fusión de Chan), mín/máx e histograma de bins fijos.
+    """
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self.specs = feature_specs(kind)
+        self.rows = 0
+        self.stats = {c: {"n": 0, "missing": 0, "mean": 0.0, "m2": 0.0, "min": np.inf, "max": -np.inf,
+                          "hist": np.zeros(_width(s), dtype=np.int64)} for c, s in self.specs.items()}
+
+    def update(self, chunk: pd.DataFrame) -> "StreamingProfile":
+        n = len(chunk)
+        self.rows += n
+        for c, spec in self.specs.items():
+            acc = self.stats[c]
+            if c not in chunk.columns:
+                acc["missing"] += n
+                continue
+            if spec["type"] == "num":
+                x = pd.to_numeric(chunk[c], errors="coerce").to_numpy(dtype=float)
+                x = x[~np.isnan(x)]
+                acc["missing"] += n - len(x)
+                if not len(x):
+                    continue
+                edges = spec["edges"]
+                # 0 = bajo rango, 1..BINS = bins (hi inclusivo), BINS+1 = sobre rango
+                idx = np.searchsorted(edges, x, side="right")
+                idx[x == edges[-1]] = BINS
+                acc["hist"] += np.bincount(idx, minlength=BINS + 2)
+                self._merge_moments(acc, len(x), float(x.mean()), float(((x - x.mean()) ** 2).sum()),
+                                    float(x.min()), float(x.max()))
+            else:
+                s = chunk[c]
+                present = s.notna().to_numpy()
+                codes = pd.Categorical(s[present].astype(str), categories=spec["levels"]).codes
+                acc["missing"] += n - int(present.sum())
+                acc["n"] += int(present.sum())
+                acc["hist"] += np.bincount(codes + 1, minlength=len(spec["levels"]) + 1)   # 0 = "otro"
+        return self
+
+    @staticmethod
+    def _merge_moments(acc: dict, n_b: int, mean_b: float, m2_b: float, lo: float, hi: float):
+        n_a = acc["n"]
+        n = n_a + n_b
+        delta = mean_b - acc["mean"]
+        acc["mean"] += delta * n_b / n
+        acc["m2"] += m2_b + delta ** 2 * n_a * n_b / n
+        acc["n"] = n
+        acc["min"], acc["max"] = min(acc["min"], lo), max(acc["max"], hi)
+
+    def merge(self, other: "StreamingProfile") -> "StreamingProfile":
+        self.rows += other.rows
+        for c, o in other.stats.items():
+            acc = self.stats[c]
+            acc["missing"] += o["missing"]
+            acc["hist"] += o["hist"]
+            if self.specs[c]["type"] == "num":
+                if o["n"]:
+                    self._merge_moments(acc, o["n"], o["mean"], o["m2"], o["min"], o["max"])
+            else:
+                acc["n"] += o["n"]
+        return self
+
+    # ---- persistencia ----
+    def to_dict(self) -> dict:
+        return {"kind": self.kind, "rows": self.rows, "bins": BINS,
+                "stats": {c: {k: (v.tolist() if k == "hist" else (None if np.isinf(v) else v))
+                              for k, v in s.items()} for c, s in self.stats.items()}}
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "StreamingProfile":
+        p = cls(d["kind"])
+        p.rows = int(d["rows"])
+        for c, s in d["stats"].items():
+            if c not in p.stats or len(s["hist"]) != len(p.stats[c]["hist"]):
+                continue      # variable o bins que ya no se monitorean
+            p.stats[c] = {"n": int(s["n"]), "missing": int(s["missing"]), "mean": float(s["mean"]),
+                          "m2": float(s["m2"]),
+                          "min": np.inf if s["min"] is None else float(s["min"]),
+                          "max": -np.inf if s["max"] is None else float(s["max"]),
+                          "hist": np.asarray(s["hist"], dtype=np.int64)}
+        return p
+
+    def summary(self) -> pd.DataFrame:
+        rows = []
+        for c, s in self.stats.items():
+            total = s["n"] + s["missing"]
+            num = self.specs[c]["type"] == "num"
+            rows.append({"variable": c, "n": s["n"], "faltantes": s["missing"] / total if total else 0.0,
+                         "media": s["mean"] if num and s["n"] else np.nan,
+                         "sd": np.sqrt(s["m2"] / (s["n"] - 1)) if num and s["n"] > 1 else np.nan,
+                         "min": s["min"] if num and s["n"] else np.nan,
+                         "max": s["max"] if num and s["n"] else np.nan})
+        return pd.DataFrame(rows)
+
+def profile_frames(chunks, kind: str) -> StreamingProfile:
+    p = StreamingProfile(kind)
+    for chunk in chunks:
+        p.update(chunk)
+    return p
+
+def profile_csv(source, kind: str, chunksize: int = CHUNK_ROWS) -> StreamingProfile:
+    """
+    Perfil de un CSV (ruta o archivo subido) leído por chunks y solo con las columnas monitoreadas:
+    un archivo de millones de filas nunca se materializa completo. Lee desde el inicio aunque otra
+    etapa ya haya consumido el archivo, y lo deja en su posición.
+    """
+    wanted = set(feature_specs(kind))
+    pos = source.tell() if hasattr(source, "seek") else None
+    if pos is not None:
+        source.seek(0)
+    try:
+        return profile_frames(pd.read_csv(source, usecols=lambda c: c in wanted, chunksize=chunksize), kind)
+    finally:
+        if pos is not None:
+            source.seek(pos)
+
+# ======= Comparación contra la referencia =======
+def drift_report(current: StreamingProfile, reference: StreamingProfile) -> pd.DataFrame:
+    """
+    PSI, KS (sobre los bins fijos: cota inferior del KS exacto), corrimiento de media en DE de la
+    referencia y cambio en faltantes, para todas las variables en una sola pasada matricial.
+    """
+    names = list(reference.specs)
+    width = max(_width(s) for s in reference.specs.values())
+    P = np.zeros((len(names), width))
+    Q = np.zeros((len(names), width))
+    for i, c in enumerate(names):
+        h_ref, h_cur = reference.stats[c]["hist"], current.stats[c]["hist"]
+        P[i, :len(h_ref)] = h_ref / max(h_ref.sum(), 1)
+        Q[i, :len(h_cur)] = h_cur / max(h_cur.sum(), 1)
+    eps = 1e-4
+    Pe, Qe = np.clip(P, eps, None), np.clip(Q, eps, None)
+    pad = (P == 0) & (Q == 0)           # celdas de relleno o vacías en ambos: no aportan
+    psi = np.where(pad, 0.0, (Qe - Pe) * np.log(Qe / Pe)).sum(axis=1)
+    ks = np.abs(np.cumsum(Q, axis=1) - np.cumsum(P, axis=1)).max(axis=1)
+
+    is_num = np.array([reference.specs[c]["type"] == "num" for c in names])
+    ref_s, cur_s = reference.summary().set_index("variable"), current.summary().set_index("variable")
+    shift = ((cur_s["media"] - ref_s["media"]) / ref_s["sd"].replace(0, np.nan)).reindex(names).to_numpy()
+    miss = (cur_s["faltantes"] - ref_s["faltantes"]).reindex(names).to_numpy()
+    n_cur = np.array([current.stats[c]["n"] for c in names])
+
+    estado = np.where(psi >= PSI_CRIT, "crítico", np.where((psi >= PSI_ALERT) | (miss >= MISSING_ALERT), "alerta", "ok"))
+    estado = np.where(n_cur == 0, "ausente", estado)
+    return pd.DataFrame({
+        "variable": names, "psi": psi, "ks": np.where(is_num, ks, np.nan), "desvio_media_sd": shift,
+        "delta_faltantes": miss, "n": n_cur, "estado": estado,
+    }).sort_values("psi", ascending=False, kind="mergesort").reset_index(drop=True)
+
+# ======= Perfiles de referencia =======
+def reference_path(kind: str) -> str:
+    return os.path.join(DATA_DIR, f"drift_ref_{kind}.json")
+
+def save_reference(profile: StreamingProfile, path: str | None = None) -> str:
+    path = path or reference_path(profile.kind)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    # temporal único: dos sesiones pueden construir la misma referencia a la vez
+    tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(profile.to_dict(), f)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return path
+
+def load_reference(kind: str) -> StreamingProfile:
+    """
+    Perfil de referencia guardado (p.ej. el de la cohorte de entrenamiento, ver _main). Si no
+    existe se construye una vez con la población sintética sobre la que se calibró el modelo.
+    """
+    path = reference_path(kind)
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            return StreamingProfile.from_dict(json.load(f))
+    if kind == "fsfb":
+        from .risk_engine import make_dummy_population
+        ref = profile_frames([make_dummy_population(50_000, seed=7)], kind)
+    else:
+        from .data_loader import generate_dummy
+        ref = profile_frames([generate_dummy(50_000, seed=7)], kind)
+    save_reference(ref, path)
+    return ref
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def _upload_report(kind: str, file_key: str, _source) -> pd.DataFrame:
+    return drift_report(profile_csv(_source, kind), load_reference(kind))
+
+def upload_drift_report(uploaded, kind: str = "egresos") -> pd.DataFrame:
+    # un reporte por archivo subido (file_id) y tipo; la referencia se carga una sola vez por llave
+    key = f"{getattr(uploaded, 'file_id', '')}:{getattr(uploaded, 'name', '')}:{getattr(uploaded, 'size', '')}"
+    return _upload_report(kind, key, uploaded)
+
+def _main(argv=None):
+    import argparse
+    ap = argparse.ArgumentParser(description="Perfil de referencia para monitoreo de drift (streaming)")
+    ap.add_argument("kind", choices=["egresos", "fsfb"])
+    ap.add_argument("csv", help="CSV de la cohorte de referencia (se lee por chunks)")
+    ap.add_argument("--chunksize", type=int, default=CHUNK_ROWS)
+    args = ap.parse_args(argv)
+    prof = profile_csv(args.csv, args.kind, args.chunksize)
+    print(save_reference(prof))
+    print(prof.summary().to_string(index=False))
+
+if __name__ == "__main__":
+    _main()
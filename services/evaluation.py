@@ -0,0 +1,184 @@
+# services/evaluation.py
+from __future__ import annotations
+import numpy as np
+import pandas as pd
+
+DAYS_PER_MONTH = 30.44
+
+# ======= Concordancia (Harrell) en O(n log n) =======
+def _dense_rank(x: np.ndarray) -> np.ndarray:
+    return np.unique(x, return_inverse=True)[1].astype(np.int64)
+
+def _count_before(rank: np.ndarray, q_rank: np.ndarray, q_limit: np.ndarray):
+    """
+    Para cada consulta q: cuántos elementos en posiciones < q_limit tienen rank < q_rank y rank == q_rank.
+
+    Árbol de Fenwick sobre los ranks densos: se insertan los elementos en orden de posición y
+    cada consulta se responde (fuera de línea, ordenada por q_limit) cuando ya entraron sus
+    q_limit primeros. n inserciones + m consultas de O(log n) cada una.
+    """
+    size = int(rank.max(initial=-1)) + 1
+    tree = [0] * (size + 1)
+    seen = [0] * size
+    lower = np.zeros(len(q_rank), dtype=np.int64)
+    equal = np.zeros(len(q_rank), dtype=np.int64)
+    ranks, q_ranks, limits = rank.tolist(), q_rank.tolist(), q_limit.tolist()
+    inserted = 0
+    for q in np.argsort(q_limit, kind="mergesort").tolist():
+        while inserted < limits[q]:
+            r = ranks[inserted]
+            seen[r] += 1
+            i = r + 1
+            while i <= size:
+                tree[i] += 1
+                i += i & -i
+            inserted += 1
+        # prefijo de ranks 0..q_rank-1
+        total, i = 0, q_ranks[q]
+        while i > 0:
+            total += tree[i]
+            i -= i & -i
+        lower[q], equal[q] = total, seen[q_ranks[q]]
+    return lower, equal
+
+def concordance_index(time, event, risk) -> float:
+    """
+    C de Harrell: pares comparables (i, j) con evento en i y T_j > T_i; concordante si risk_i > risk_j
+    (empates en riesgo cuentan 0.5). O(n log n) en lugar del barrido O(n²) de pares.
+    """
+    t = np.asarray(time, dtype=float)
+    d = np.asarray(event).astype(bool)
+    r = _dense_rank(np.asarray(risk, dtype=float))
+    # orden por tiempo descendente: al llegar a i, los "anteriores" son los de T mayor
+    order = np.argsort(-t, kind="mergesort")
+    t_o, d_o, r_o = t[order], d[order], r[order]
+    # límite = inicio del bloque de su mismo tiempo (excluye empates de tiempo)
+    limit = np.searchsorted(-t_o, -t_o, side="left")
+    ev = np.flatnonzero(d_o)
+    lower, equal = _count_before(r_o, r_o[ev], limit[ev])
+    comparable = limit[ev].sum()
+    if comparable == 0:
+        return float("nan")
+    return float((lower.sum() + 0.5 * equal.sum()) / comparable)
+
+# ======= Kaplan–Meier / IPCW =======
+def kaplan_meier(time, event):
+    """
+    KM vectorizado: devuelve (tiempos únicos, S(t) justo después de cada tiempo).
+    """
+    t = np.asarray(time, dtype=float)
+    d = np.asarray(event).astype(bool)
+    ut, inv = np.unique(t, return_inverse=True)
+    deaths = np.bincount(inv, weights=d, minlength=len(ut))
+    total = np.bincount(inv, minlength=len(ut))
+    at_risk = total[::-1].cumsum()[::-1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        s = np.cumprod(np.where(at_risk > 0, 1 - deaths / at_risk, 1.0))
+    return ut, s
+
+def _step_eval(ut, s, x, left: bool = False):
+    # S(x) de la escalera KM; left=True evalúa S(x-)
+    idx = np.searchsorted(ut, np.asarray(x, dtype=float), side="left" if left else "right") - 1
+    return np.where(idx >= 0, s[np.clip(idx, 0, None)], 1.0)
+
+def brier_score(time, event, pred_event_prob, horizon: float) -> float:
+    """
+    Brier a `horizon` con pesos IPCW (Graf et al.); pred_event_prob = P(T ≤ horizon).
+    """
+    t = np.asarray(time, dtype=float)
+    d = np.asarray(event).astype(bool)
+    p = np.asarray(pred_event_prob, dtype=float)
+    gt, gs = kaplan_meier(t, ~d)                       # supervivencia de la censura
+    g_ti = np.maximum(_step_eval(gt, gs, t, left=True), 1e-9)
+    g_h = max(float(_step_eval(gt, gs, [horizon])[0]), 1e-9)
+    case = (t <= horizon) & d
+    alive = t > horizon
+    return float(np.mean(np.where(case, (1 - p) ** 2 / g_ti, 0.0) + np.where(alive, p ** 2 / g_h, 0.0)))
+
+def time_dependent_auc(time, event, risk, horizon: float) -> float:
+    """
+    AUC acumulado/dinámico a `horizon`: casos T ≤ h con evento (pesos 1/G(T-)), controles T > h.
+    """
+    t = np.asarray(time, dtype=float)
+    d = np.asarray(event).astype(bool)
+    r = np.asarray(risk, dtype=float)
+    gt, gs = kaplan_meier(t, ~d)
+    case = (t <= horizon) & d
+    ctrl = np.sort(r[t > horizon])
+    if case.sum() == 0 or len(ctrl) == 0:
+        return float("nan")
+    w = 1.0 / np.maximum(_step_eval(gt, gs, t[case], left=True), 1e-9)
+    rc = r[case]
+    less = np.searchsorted(ctrl, rc, side="left")
+    ties = np.searchsorted(ctrl, rc, side="right") - less
+    return float(np.sum(w * (less + 0.5 * ties)) / (w.sum() * len(ctrl)))
+
+def calibration_table(time, event, pred_event_prob, horizon: float, n_bins: int = 10) -> pd.DataFrame:
+    """
+    Calibración por deciles de predicción: media predicha vs. 1 - KM observado a `horizon`.
+    """
+    t = np.asarray(time, dtype=float)
+    d = np.asarray(event).astype(bool)
+    p = np.asarray(pred_event_prob, dtype=float)
+    order = np.argsort(p, kind="mergesort")
+    dec = np.empty(len(p), dtype=int)
+    dec[order] = np.arange(len(p)) * n_bins // max(len(p), 1)
+    rows = []
+    for k in range(n_bins):
+        m = dec == k
+        if not m.any():
+            continue
+        ut, s = kaplan_meier(t[m], d[m])
+        rows.append({"decil": k + 1, "n": int(m.sum()), "eventos": int(d[m].sum()),
+                     "predicho": float(p[m].mean()),
+                     "observado": float(1 - _step_eval(ut, s, [horizon])[0])})
+    return pd.DataFrame(rows)
+
+# ======= Predicción por motor =======
+def predicted_event_prob_api(scored: pd.DataFrame, horizon_days: float) -> np.ndarray:
+    # score_batch: S(t) = exp(-λ t) con clipping [0.02, 1]
+    h = scored["hazard_per_day"].to_numpy(dtype=float)
+    return 1.0 - np.clip(np.exp(-h * horizon_days), 0.02, 1.0)
+
+def predicted_event_prob_weibull(k, lam, horizon_days: float) -> np.ndarray:
+    # risk_engine: S(t) = exp(-(lam·t)^k) con t en meses
+    t = horizon_days / DAYS_PER_MONTH
+    return 1.0 - np.exp(-(np.asarray(lam) * t) ** np.asarray(k))
+
+def evaluation_report(time, event, risk, pred_by_horizon: dict[str, tuple[float, np.ndarray]]) -> dict:
+    """
+    Reporte completo. pred_by_horizon: {"30d": (30, P(T≤30)), "24m": (730, P(T≤730)), ...}
+    """
+    out = {"n": int(len(time)), "eventos": int(np.asarray(event).astype(bool).sum()),
+           "c_index": concordance_index(time, event, risk), "horizontes": {}}
+    for name, (h, p) in pred_by_horizon.items():
+        out["horizontes"][name] = {
+            "horizonte_dias": h,
+            "auc": time_dependent_auc(time, event, risk, h),
+            "brier": brier_score(time, event, p, h),
+            "calibracion": calibration_table(time, event, p, h),
+        }
+    return out
+
+def _main(argv=None):
+    # CLI: python -m services.evaluation archivo.csv --time tiempo_evento_dias --event evento
+    import argparse
+    from .risk_api import score_batch
+    ap = argparse.ArgumentParser(description="Validación de score_batch contra desenlaces observados")
+    ap.add_argument("csv")
+    ap.add_argument("--time", default="tiempo_evento_dias")
+    ap.add_argument("--event", default="evento")
+    args = ap.parse_args(argv)
+    df = pd.read_csv(args.csv)
+    scored = score_batch(df)
+    rep = evaluation_report(
+        df[args.time], df[args.event], scored["risk_factor"],
+        {"30d": (30, predicted_event_prob_api(scored, 30)), "24m": (730, predicted_event_prob_api(scored, 730))},
+    )
+    print(f"n={rep['n']}  eventos={rep['eventos']}  C-index={rep['c_index']:.3f}")
+    for name, h in rep["horizontes"].items():
+        print(f"\n[{name}] AUC(t)={h['auc']:.3f}  Brier={h['brier']:.4f}")
+        print(h["calibracion"].to_string(index=False))
+
+if __name__ == "__main__":
+    _main()
@@ -0,0 +1,92 @@
+# services/exports.py
+from __future__ import annotations
+import importlib.util
+import os
+import threading
+import pandas as pd
+from .data_loader import DATA_DIR
+
+# Exportes generados bajo demanda y cacheados en disco por (dataset, formato). Directorio propio
+# de la app (no el /tmp compartido): contienen datos de pacientes, solo el usuario del proceso los lee
+EXPORT_DIR = os.getenv("CORPUS_EXPORT_DIR") or os.path.join(DATA_DIR, "exports")
+MAX_CACHE_BYTES = 512 * 1024 * 1024
+CHUNK_ROWS = 100_000
+
+FORMATS = {
+    "csv": (".csv", "text/csv"),
+    "csv.gz": (".csv.gz", "application/gzip"),
+}
+if importlib.util.find_spec("pyarrow") is not None:
+    FORMATS["parquet"] = (".parquet", "application/vnd.apache.parquet")
+
+_LOCKS: dict[str, threading.Lock] = {}
+_LOCKS_GUARD = threading.Lock()
+
+def _lock_for(path: str) -> threading.Lock:
+    with _LOCKS_GUARD:
+        return _LOCKS.setdefault(path, threading.Lock())
+
+def export_dir() -> str:
+    # 0o700 también si el directorio ya existía con otros permisos
+    os.makedirs(EXPORT_DIR, mode=0o700, exist_ok=True)
+    os.chmod(EXPORT_DIR, 0o700)
+    return EXPORT_DIR
+
+def private_tmp(path: str) -> str:
+    """
+    Crea vacío (0o600) el temporal de `path` antes de que el escritor lo abra: pandas/zipfile
+    reescriben un archivo existente sin cambiar sus permisos, y os.replace los conserva.
+    """
+    tmp = path + ".tmp"
+    os.close(os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600))
+    os.chmod(tmp, 0o600)
+    return tmp
+
+def _prune(keep: str):
+    # LRU por fecha de acceso: se borran los exportes más antiguos si se pasa del tope.
+    # Cada borrado toma el lock del archivo: no se elimina uno que otro hilo está por servir
+    files = []
+    for e in os.scandir(EXPORT_DIR):
+        if e.is_file() and e.path != keep and not e.name.endswith(".tmp"):
+            info = e.stat()
+            files.append((info.st_atime, info.st_size, e.path))
+    total = sum(f[1] for f in files) + os.path.getsize(keep)
+    for _, size, path in sorted(files):
+        if total <= MAX_CACHE_BYTES:
+            break
+        with _lock_for(path):
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+def export_path(df: pd.DataFrame, fmt: str = "csv", key: str | None = None) -> str:
+    """
+    Ruta del exporte de df en `fmt` (csv, csv.gz, parquet). Se escribe una sola vez por llave:
+    `key` identifica dataset + filtros (por defecto services.data.dataset_key(df)).
+    El CSV se escribe por bloques de CHUNK_ROWS filas directo al archivo.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Formato de exporte no soportado: {fmt}")
+    if key is None:
+        from .data import dataset_key
+        key = dataset_key(df)
+    path = os.path.join(export_dir(), f"{key}{FORMATS[fmt][0]}")
+    with _lock_for(path):
+        if os.path.exists(path):
+            os.utime(path)
+            return path
+        tmp = private_tmp(path)
+        if fmt == "parquet":
+            df.to_parquet(tmp, index=False)
+        else:
+            comp = {"method": "gzip", "compresslevel": 5, "mtime": 0} if fmt == "csv.gz" else None
+            df.to_csv(tmp, index=False, chunksize=CHUNK_ROWS, compression=comp)
+        os.replace(tmp, path)
+    _prune(path)
+    return path
+
+def export_bytes(df: pd.DataFrame, fmt: str = "csv", key: str | None = None) -> bytes:
+    with open(export_path(df, fmt, key), "rb") as f:
+        return f.read()
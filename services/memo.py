@@ -0,0 +1,56 @@
+# services/memo.py
+from __future__ import annotations
+import threading
+from collections import OrderedDict
+from typing import Callable, Hashable
+
+class LRUMemo:
+    """
+    Memo LRU acotado y seguro entre hilos (sesiones de Streamlit del mismo proceso).
+    Los valores se comparten: quien los consume no debe mutarlos.
+    """
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def get_or_compute(self, key: Hashable, fn: Callable):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+        # se calcula fuera del lock; si dos sesiones calculan la misma llave, gana la última
+        return self.put(key, fn())
+
+    def get(self, key: Hashable, default=None):
+        # consulta sin calcular (cuenta hit/miss igual que get_or_compute)
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key: Hashable, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {"size": len(self._data), "maxsize": self.maxsize, "hits": self.hits,
+                "misses": self.misses, "evictions": self.evictions,
+                "hit_rate": self.hits / total if total else 0.0}
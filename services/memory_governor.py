@@ -0,0 +1,357 @@
+# services/memory_governor.py
+from __future__ import annotations
+import os
+import sys
+import threading
+import time
+import types
+import weakref
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Hashable
+import numpy as np
+import pandas as pd
+import streamlit as st
+from .settings import debug
+
+MB = 2**20
+# Presupuestos en MB (variables de entorno); 0 = sin límite
+SESSION_BUDGET_MB = float(os.getenv("CORPUS_SESSION_BUDGET_MB", "256"))
+GLOBAL_BUDGET_MB = float(os.getenv("CORPUS_GLOBAL_BUDGET_MB", "1536"))
+SAMPLE_ITEMS = 256           # colecciones/columnas object más largas se miden sobre una muestra
+
+# ======= Tamaño profundo =======
+_SIZE_MEMO: dict[int, tuple[weakref.ref, tuple, int]] = {}
+_SIZE_LOCK = threading.Lock()
+_CODE_TYPES = (type, types.FunctionType, types.MethodType, types.BuiltinFunctionType, types.ModuleType)
+
+def deep_size(obj: Any, _seen: set | None = None) -> int:
+    """
+    Bytes aproximados que retiene `obj` (recursivo). DataFrame/Series por columna; columnas object
+    y listas largas (p.ej. surv_curve) se estiman con una muestra de SAMPLE_ITEMS elementos.
+    Los objetos compartidos se cuentan una vez por medición.
+    """
+    seen = set() if _seen is None else _seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        return _frame_size(obj, seen)
+    if isinstance(obj, pd.Index):
+        return int(obj.memory_usage(deep=True))
+    if isinstance(obj, np.ndarray):
+        if obj.dtype == object:
+            return obj.nbytes + _items_size(obj.ravel(), seen)
+        return obj.nbytes if obj.base is None else 0      # las vistas no retienen memoria propia
+    if isinstance(obj, (str, bytes, bytearray, int, float, bool, complex, type(None))):
+        return sys.getsizeof(obj)
+    if isinstance(obj, _CODE_TYPES):
+        return 0                                          # funciones/clases/módulos: código, no datos
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += _items_size(list(obj.keys()), seen) + _items_size(list(obj.values()), seen)
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += _items_size(list(obj), seen)
+    elif hasattr(obj, "__dict__"):
+        size += deep_size(vars(obj), seen)
+    return size
+
+def _items_size(items, seen: set) -> int:
+    n = len(items)
+    if n <= SAMPLE_ITEMS:
+        return sum(deep_size(x, seen) for x in items)
+    idx = np.linspace(0, n - 1, SAMPLE_ITEMS).astype(int)
+    sample_seen = set(seen)       # lo compartido dentro de la muestra (claves, enteros pequeños) cuenta una vez
+    return int(sum(deep_size(items[i], sample_seen) for i in idx) * n / SAMPLE_ITEMS)
+
+def _frame_size(obj, seen: set) -> int:
+    # memo por identidad + forma: un rerun no vuelve a recorrer el mismo DataFrame
+    sig = (obj.shape, tuple(obj.columns) if isinstance(obj, pd.DataFrame) else obj.name)
+    with _SIZE_LOCK:
+        hit = _SIZE_MEMO.get(id(obj))
+        if hit is not None and hit[0]() is obj and hit[1] == sig:
+            return hit[2]
+    cols = obj.items() if isinstance(obj, pd.DataFrame) else [(obj.name, obj)]
+    size = int(obj.index.memory_usage(deep=True))
+    for _, s in cols:
+        size += int(s.memory_usage(index=False, deep=False))
+        if s.dtype == object:
+            size += _items_size(s.to_numpy(), seen)
+    try:
+        ref = weakref.ref(obj, lambda _r, k=id(obj): _SIZE_MEMO.pop(k, None))
+    except TypeError:
+        return size
+    with _SIZE_LOCK:
+        _SIZE_MEMO[id(obj)] = (ref, sig, size)
+    return size
+
+# ======= Cachés de Streamlit =======
+def cache_footprint() -> pd.DataFrame:
+    """
+    Bytes por función @st.cache_data del proceso (entradas serializadas; estadística de Streamlit).
+    Las cachés son del proceso: se comparten entre sesiones.
+    """
+    from streamlit.runtime.caching.cache_data_api import get_data_cache_stats_provider
+    rows: dict[str, list] = {}
+    for stats in get_data_cache_stats_provider().get_stats().values():
+        for s in stats:
+            r = rows.setdefault(s.cache_name, [0, 0])
+            r[0] += s.byte_length
+            r[1] += 1
+    out = pd.DataFrame([(k, b, n) for k, (b, n) in rows.items()], columns=["cache", "bytes", "entradas"])
+    return out.sort_values("bytes", ascending=False, ignore_index=True)
+
+def _clear_cache(name: str) -> bool:
+    # "modulo.funcion" -> CachedFunc.clear(); cachés de datos (recalculables por definición)
+    module, _, qual = name.rpartition(".")
+    fn = getattr(sys.modules.get(module), qual, None)
+    if fn is None or not hasattr(fn, "clear"):
+        return False
+    fn.clear()
+    return True
+
+def rss_bytes() -> int:
+    # memoria residente actual del proceso (Linux); fuera de Linux, el pico que reporta resource
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+# ======= Gobernador =======
+@dataclass
+class _Entry:
+    value: Any
+    nbytes: int
+    last: float
+
+@dataclass
+class _Resource:
+    size: Callable[[], int]
+    clear: Callable[[], Any]
+
+class MemoryGovernor:
+    """
+    Contabilidad de memoria por sesión y desalojo LRU con presupuestos de bytes.
+
+    - remember(): objetos RECALCULABLES de una sesión (cohortes dummy, marcos derivados). Viven en
+      el gobernador, no en st.session_state, y son lo único que se desaloja de una sesión: el
+      próximo acceso los recalcula con su fábrica.
+    - track_session(): mide st.session_state (widgets, auth, rutas de exportes); cuenta para el
+      presupuesto pero nunca se toca.
+    - register_resource(): objetos compartidos del proceso fuera de @st.cache_data (stores y motores
+      de @st.cache_resource, memos de módulo) con su medición y su forma de vaciarlos. Solo se
+      registra lo recalculable: la bitácora de acciones (SQLite) no.
+    - Presupuesto por sesión: se desalojan los recalculables menos usados de esa sesión.
+      Presupuesto global (todas las sesiones + @st.cache_data + recursos): primero los recalculables
+      más antiguos de cualquier sesión; si no alcanza, se vacían las cachés y recursos más grandes.
+    """
+
+    def __init__(self, session_budget: int = int(SESSION_BUDGET_MB * MB), global_budget: int = int(GLOBAL_BUDGET_MB * MB)):
+        self.session_budget = session_budget
+        self.global_budget = global_budget
+        self._entries: dict[str, OrderedDict[Hashable, _Entry]] = {}
+        self._state_bytes: dict[str, int] = {}
+        self._resources: dict[str, _Resource] = {}
+        self._lock = threading.RLock()
+        self.evictions = self.cache_clears = 0
+
+    # ---- objetos recalculables ----
+    def remember(self, sid: str, key: Hashable, factory: Callable[[], Any]):
+        with self._lock:
+            entries = self._entries.setdefault(sid, OrderedDict())
+            e = entries.get(key)
+            if e is not None:
+                e.last = time.monotonic()
+                entries.move_to_end(key)
+                return e.value
+        value = factory()            # fuera del lock: otras sesiones no esperan el cálculo
+        with self._lock:
+            self._entries.setdefault(sid, OrderedDict())[key] = _Entry(value, deep_size(value), time.monotonic())
+            self._enforce(sid, keep=(sid, key))
+        return value
+
+    def forget(self, sid: str, key: Hashable) -> None:
+        with self._lock:
+            self._entries.get(sid, {}).pop(key, None)
+
+    # ---- recursos compartidos ----
+    def register_resource(self, name: str, size: Callable[[], int], clear: Callable[[], Any]) -> None:
+        # idempotente por nombre: una página que se re-ejecuta solo reemplaza sus funciones
+        with self._lock:
+            self._resources[name] = _Resource(size, clear)
+
+    def caches(self) -> pd.DataFrame:
+        """
+        cache_footprint() más los recursos registrados (tipo "recurso", sin conteo de entradas),
+        de mayor a menor: es el orden en que se vacían.
+        """
+        with self._lock:
+            res = list(self._resources.items())
+        rows = []
+        for name, r in res:
+            try:
+                rows.append((name, int(r.size()), np.nan, "recurso"))
+            except Exception as e:       # un recurso que no se puede medir no tumba la página
+                debug(f"MemoryGovernor: no se pudo medir {name}: {e}")
+        data = cache_footprint().assign(tipo="cache_data")
+        if rows:
+            data = pd.concat([data, pd.DataFrame(rows, columns=["cache", "bytes", "entradas", "tipo"])],
+                             ignore_index=True)
+            data["entradas"] = data["entradas"].astype("Int64")
+        return data.sort_values("bytes", ascending=False, ignore_index=True)
+
+    def _clear(self, name: str, tipo: str) -> bool:
+        if tipo == "cache_data":
+            return _clear_cache(name)
+        r = self._resources.get(name)
+        if r is None:
+            return False
+        r.clear()
+        return True
+
+    # ---- medición ----
+    def track_session(self, sid: str, state: dict) -> None:
+        nbytes = deep_size(state)
+        with self._lock:
+            self._state_bytes[sid] = nbytes
+            self._prune_dead()
+            self._enforce(sid)
+
+    def session_bytes(self, sid: str) -> tuple[int, int]:
+        # (st.session_state, recalculables) de la sesión
+        with self._lock:
+            return self._state_bytes.get(sid, 0), sum(e.nbytes for e in self._entries.get(sid, {}).values())
+
+    def process_bytes(self, caches: pd.DataFrame | None = None) -> int:
+        caches = self.caches() if caches is None else caches
+        with self._lock:
+            sessions = sum(self._state_bytes.values()) + sum(e.nbytes for es in self._entries.values() for e in es.values())
+        return sessions + int(caches["bytes"].sum())
+
+    def footprint(self, sid: str) -> dict:
+        caches = self.caches()
+        data = caches["tipo"] == "cache_data"
+        state, governed = self.session_bytes(sid)
+        with self._lock:
+            n_sessions = len(set(self._state_bytes) | set(self._entries))
+            n_entries = len(self._entries.get(sid, {}))
+        return {"sesion_state": state, "sesion_recalculables": governed, "sesion_objetos": n_entries,
+                "sesion_presupuesto": self.session_budget, "proceso": self.process_bytes(caches),
+                "proceso_presupuesto": self.global_budget, "cache_data": int(caches["bytes"][data].sum()),
+                "recursos": int(caches["bytes"][~data].sum()),
+                "sesiones": n_sessions, "rss": rss_bytes(), "desalojos": self.evictions,
+                "caches_vaciadas": self.cache_clears, "caches": caches}
+
+    # ---- presupuestos ----
+    def _evict(self, sid: str, key: Hashable) -> None:
+        e = self._entries[sid].pop(key)
+        self.evictions += 1
+        debug(f"MemoryGovernor: desalojado {key!r} de la sesión {sid[:8]} ({e.nbytes / MB:.1f} MB)")
+
+    def _enforce(self, sid: str, keep: tuple | None = None) -> None:
+        # por sesión: LRU de sus recalculables (el objeto recién pedido se conserva en esta llamada)
+        if self.session_budget > 0:
+            entries = self._entries.get(sid, OrderedDict())
+            total = self._state_bytes.get(sid, 0) + sum(e.nbytes for e in entries.values())
+            for key in [k for k in entries if (sid, k) != keep]:
+                if total <= self.session_budget:
+                    break
+                total -= entries[key].nbytes
+                self._evict(sid, key)
+        if self.global_budget <= 0:
+            return
+        # global: recalculables más antiguos de cualquier sesión, luego cachés de datos y recursos
+        caches = self.caches()
+        over = self.process_bytes(caches) - self.global_budget
+        if over <= 0:
+            return
+        oldest = sorted(((e.last, s, k) for s, es in self._entries.items() for k, e in es.items() if (s, k) != keep),
+                        key=lambda t: t[0])
+        for _, s, k in oldest:
+            if over <= 0:
+                return
+            over -= self._entries[s][k].nbytes
+            self._evict(s, k)
+        for row in caches.itertuples():
+            if over <= 0:
+                return
+            if self._clear(row.cache, row.tipo):
+                over -= row.bytes
+                self.cache_clears += 1
+                debug(f"MemoryGovernor: caché {row.cache} vaciada ({row.bytes / MB:.1f} MB)")
+
+    def _prune_dead(self) -> None:
+        # sesiones cerradas: su st.session_state ya lo liberó Streamlit; aquí se sueltan sus objetos
+        try:
+            from streamlit.runtime import Runtime
+            if not Runtime.exists():
+                return
+            rt = Runtime.instance()
+        except Exception:
+            return
+        for sid in list(set(self._state_bytes) | set(self._entries)):
+            if not rt.is_active_session(sid):
+                self._state_bytes.pop(sid, None)
+                self._entries.pop(sid, None)
+
+_GOVERNOR: MemoryGovernor | None = None
+_GOVERNOR_LOCK = threading.Lock()
+
+def get_governor() -> MemoryGovernor:
+    # Gobernador único por proceso (los presupuestos son del worker)
+    global _GOVERNOR
+    with _GOVERNOR_LOCK:
+        if _GOVERNOR is None:
+            _GOVERNOR = MemoryGovernor()
+        return _GOVERNOR
+
+# ======= API para páginas =======
+def session_id() -> str:
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx is not None else "local"
+
+def remember(key: Hashable, factory: Callable[[], Any]):
+    """
+    Objeto recalculable de la sesión actual (reemplazo de `if k not in st.session_state: ...`).
+    Puede desalojarse por presupuesto: `factory` debe producir el mismo resultado al repetirse.
+    """
+    return get_governor().remember(session_id(), key, factory)
+
+def forget(key: Hashable) -> None:
+    get_governor().forget(session_id(), key)
+
+def register_resource(name: str, size: Callable[[], int], clear: Callable[[], Any]) -> None:
+    """
+    Recurso RECALCULABLE compartido por el proceso (store de @st.cache_resource, motor, memo de
+    módulo): `size` devuelve los bytes que retiene y `clear` lo suelta; el siguiente uso lo
+    reconstruye. Cuenta para el presupuesto global y se vacía si hace falta.
+    """
+    get_governor().register_resource(name, size, clear)
+
+def govern_session(show: bool = False) -> None:
+    """
+    Mide st.session_state de la sesión actual, aplica los presupuestos y, con `show`, muestra la
+    huella en la barra lateral (valores al inicio del rerun).
+    """
+    gov = get_governor()
+    sid = session_id()
+    gov.track_session(sid, st.session_state.to_dict())
+    if not show:
+        return
+    fp = gov.footprint(sid)
+    mb = lambda b: f"{b / MB:,.1f} MB"
+    lim = lambda b: mb(b) if b > 0 else "sin límite"
+    with st.sidebar.expander("🧠 Memoria", expanded=False):
+        st.markdown(
+            f"**Sesión:** {mb(fp['sesion_state'] + fp['sesion_recalculables'])} / {lim(fp['sesion_presupuesto'])}  \n"
+            f"· session_state {mb(fp['sesion_state'])} · recalculables {mb(fp['sesion_recalculables'])} "
+            f"({fp['sesion_objetos']})  \n"
+            f"**Proceso:** {mb(fp['proceso'])} / {lim(fp['proceso_presupuesto'])} · {fp['sesiones']} sesiones · "
+            f"cache_data {mb(fp['cache_data'])} · recursos {mb(fp['recursos'])}  \n"
+            f"**RSS:** {mb(fp['rss'])} · desalojos {fp['desalojos']} · cachés vaciadas {fp['caches_vaciadas']}")
+        if len(fp["caches"]):
+            st.dataframe(fp["caches"].assign(MB=lambda d: (d["bytes"] / MB).round(2)).drop(columns="bytes"),
+                         hide_index=True, use_container_width=True)
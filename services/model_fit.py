@@ -0,0 +1,246 @@
+# services/model_fit.py
+from __future__ import annotations
+import hashlib
+import json
+import os
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+MODELS_DIR = "models"
+ARTIFACT_FORMAT = "corpus-model/1"
+
+# Features de score_batch (Alta Segura); tiempo en días
+API_FEATURES = ["creatinina", "hba1c", "sistolica", "polifarmacia_n", "hosp_6m", "comorbilidad"]
+DAYS_PER_UNIT = {"days": 1.0, "months": 30.44}
+
+def api_design(df: pd.DataFrame) -> pd.DataFrame:
+    # Matriz de diseño cruda para los features de score_batch (comorbilidad si hay CIE-10)
+    X = pd.DataFrame({c: pd.to_numeric(df[c], errors="coerce") for c in API_FEATURES[:-1]}, index=df.index)
+    if "comorbilidad" in df.columns:
+        X["comorbilidad"] = pd.to_numeric(df["comorbilidad"], errors="coerce")
+    elif "dx_principal_cie10" in df.columns or "dx_secundarios" in df.columns:
+        from .diagnosis import comorbidity_index
+        X["comorbilidad"] = comorbidity_index(df)
+    return X.fillna(X.median())
+
+def fsfb_design(df: pd.DataFrame) -> pd.DataFrame:
+    # Mismos features normalizados que FEATURE_CONFIG (risk_engine), sin betas
+    from .risk_engine import feature_scores_batch
+    return feature_scores_batch(df).fillna(0.0)
+
+DESIGNS = {"api": api_design, "fsfb": fsfb_design}
+
+# ======= Log-verosimilitud, gradiente y Hessiano (vectorizados por chunk) =======
+def _exp_terms(X, t, d, theta, full=True):
+    # Exponencial PH: h = exp(Xβ); ℓ = d·η − t·e^η
+    eta = X @ theta
+    mu = t * np.exp(np.clip(eta, -50, 50))
+    ll = float(np.sum(d * eta - mu))
+    if not full:
+        return ll, None, None
+    return ll, X.T @ (d - mu), -(X.T * mu) @ X
+
+def _weibull_terms(X, t, d, theta, full=True):
+    # Weibull AFT: log T = Xβ + σW, W ~ valor extremo; θ = [β, log σ]
+    beta, a = theta[:-1], theta[-1]
+    sigma = np.exp(a)
+    z = (np.log(t) - X @ beta) / sigma
+    ez = np.exp(np.clip(z, -50, 50))
+    ll = float(np.sum(d * (-a - np.log(t) + z) - ez))
+    if not full:
+        return ll, None, None
+    r = ez - d
+    g_b = X.T @ (r / sigma)
+    g_a = float(np.sum(-d + z * r))
+    H_bb = -(X.T * (ez / sigma ** 2)) @ X
+    H_ba = -(X.T @ ((z * ez + r) / sigma))
+    H_aa = float(np.sum(-z * r - z ** 2 * ez))
+    k = X.shape[1]
+    H = np.empty((k + 1, k + 1))
+    H[:k, :k], H[:k, k], H[k, :k], H[k, k] = H_bb, H_ba, H_ba, H_aa
+    return ll, np.r_[g_b, g_a], H
+
+def _accumulate(terms, chunks, theta, full=True):
+    ll, g, H = 0.0, 0.0, 0.0
+    for X, t, d in chunks():
+        l_, g_, H_ = terms(X, t, d, theta, full)
+        ll += l_
+        if full:
+            g, H = g + g_, H + H_
+    return ll, g, H
+
+def _newton(terms, chunks, theta0, max_iter: int = 50, tol: float = 1e-9):
+    """
+    Newton amortiguado (Levenberg–Marquardt): paso = (μI − H)⁻¹ g.
+    Cada iteración hace una pasada completa (ℓ, g, H) sobre los chunks y los intentos fallidos
+    solo recalculan ℓ; sirve para datos fuera de memoria si `chunks` relee del disco.
+    """
+    theta = np.asarray(theta0, dtype=float)
+    ll, g, H = _accumulate(terms, chunks, theta)
+    eye = np.eye(len(theta))
+    mu = 1e-6 * float(np.abs(np.diag(H)).max())
+    for it in range(max_iter):
+        while True:
+            step = np.linalg.solve(mu * eye - H, g)
+            cand = theta + step
+            ll_c = _accumulate(terms, chunks, cand, full=False)[0]
+            if np.isfinite(ll_c) and ll_c >= ll:
+                mu = max(mu / 10, 1e-12)
+                break
+            mu = max(mu * 10, 1e-6)
+            if mu > 1e20:
+                return theta, ll, H, it + 1
+        converged = abs(ll_c - ll) < tol * (1 + abs(ll))
+        theta = cand
+        ll, g, H = _accumulate(terms, chunks, theta)
+        if converged:
+            return theta, ll, H, it + 1
+    return theta, ll, H, max_iter
+
+def _array_chunks(X, t, d, chunk_rows: int):
+    # Fábrica de chunks sobre arrays en memoria (mismo contrato que un lector de disco)
+    n = len(t)
+    def gen():
+        for i in range(0, n, chunk_rows):
+            yield X[i:i+chunk_rows], t[i:i+chunk_rows], d[i:i+chunk_rows]
+    return gen
+
+def csv_chunks(path: str, design: str = "api", time: str = "tiempo_evento_dias", event: str = "evento",
+               chunksize: int = 250_000):
+    """
+    Fábrica de chunks sobre un CSV (para fit_survival fuera de memoria): cada pasada relee el archivo
+    con `chunksize` filas por lectura. Devuelve (fábrica, features).
+    """
+    features = list(DESIGNS[design](pd.read_csv(path, nrows=1000)).columns)
+    def gen():
+        for chunk in pd.read_csv(path, chunksize=chunksize):
+            X = DESIGNS[design](chunk).reindex(columns=features)
+            yield X.to_numpy(dtype=float), chunk[time].to_numpy(dtype=float), chunk[event].to_numpy(dtype=float)
+    return gen, features
+
+def _stream_moments(chunks):
+    # Una pasada: medias/desviaciones de features y totales de tiempo/eventos
+    n, s, ss, tt, dd = 0, 0.0, 0.0, 0.0, 0.0
+    for X, t, d in chunks():
+        Xa = np.asarray(X, dtype=float)
+        n += len(Xa); s = s + Xa.sum(axis=0); ss = ss + (Xa ** 2).sum(axis=0)
+        tt += float(np.sum(t)); dd += float(np.sum(d))
+    mean = s / n
+    scale = np.sqrt(np.maximum(ss / n - mean ** 2, 0) * n / max(n - 1, 1))
+    return mean, np.where(scale > 0, scale, 1.0), n, tt, dd
+
+def _standardized(chunks, mean, scale):
+    def gen():
+        for X, t, d in chunks():
+            Z = (np.asarray(X, dtype=float) - mean) / scale
+            yield (np.column_stack([np.ones(len(Z)), Z]),
+                   np.maximum(np.asarray(t, dtype=float), 1e-3), np.asarray(d, dtype=float))
+    return gen
+
+def fit_survival(X: pd.DataFrame | None = None, time=None, event=None, family: str = "weibull",
+                 chunks=None, features: list[str] | None = None,
+                 chunk_rows: int = 250_000, max_iter: int = 50) -> dict:
+    """
+    Ajusta un modelo Weibull AFT ("weibull") o exponencial PH ("exponential").
+
+    - En memoria: X (features crudos), time, event.
+    - Fuera de memoria: `chunks` = callable que devuelve un iterable de (X_chunk, t, d) y `features`;
+      se relee en cada pasada (una para estandarizar + una por iteración de Newton).
+    Los features se estandarizan; medias/escala quedan en el artefacto.
+    """
+    if chunks is None:
+        # en memoria: una sola matriz de diseño [1, Z] estandarizada in-place, reutilizada en cada pasada
+        features = list(X.columns)
+        t = np.maximum(np.asarray(time, dtype=float), 1e-3)
+        d = np.asarray(event, dtype=float)
+        design = np.empty((len(X), X.shape[1] + 1))
+        design[:, 0] = 1.0
+        design[:, 1:] = X.to_numpy(dtype=float)
+        mean, scale = design[:, 1:].mean(axis=0), design[:, 1:].std(axis=0, ddof=1)
+        scale = np.where(scale > 0, scale, 1.0)
+        design[:, 1:] -= mean
+        design[:, 1:] /= scale
+        n, t_sum, d_sum = len(t), float(t.sum()), float(d.sum())
+        std_chunks = _array_chunks(design, t, d, chunk_rows)
+    else:
+        mean, scale, n, t_sum, d_sum = _stream_moments(chunks)
+        std_chunks = _standardized(chunks, mean, scale)
+    rate = max(d_sum, 1.0) / max(t_sum, 1e-9)
+    k = len(mean)
+    if family == "exponential":
+        theta0 = np.r_[np.log(rate), np.zeros(k)]
+        theta, ll, H, iters = _newton(_exp_terms, std_chunks, theta0, max_iter)
+        coef, intercept, extra = theta[1:], theta[0], {}
+    elif family == "weibull":
+        # arranque en caliente: con σ = 1 el Weibull AFT es el exponencial con β_AFT = −β_PH
+        theta_exp = _newton(_exp_terms, std_chunks, np.r_[np.log(rate), np.zeros(k)], max_iter, tol=1e-6)[0]
+        theta, ll, H, iters = _newton(_weibull_terms, std_chunks, np.r_[-theta_exp, 0.0], max_iter)
+        coef, intercept, extra = theta[1:-1], theta[0], {"log_sigma": float(theta[-1])}
+    else:
+        raise ValueError(f"Familia no soportada: {family}")
+    try:
+        se = np.sqrt(np.diag(np.linalg.inv(-H)))
+    except np.linalg.LinAlgError:
+        se = np.full(len(theta), np.nan)
+    return {
+        "family": family,
+        "features": list(features),
+        "mean": mean.tolist(), "scale": scale.tolist(),
+        "intercept": float(intercept), "coef": coef.tolist(), **extra,
+        "std_err": se.tolist(),
+        "fit": {"n": int(n), "events": int(d_sum), "loglik": ll, "iterations": iters},
+    }
+
+# ======= Artefacto versionado =======
+def _version_hash(params: dict) -> str:
+    core = {k: params[k] for k in ("family", "features", "mean", "scale", "intercept", "coef", "log_sigma") if k in params}
+    return hashlib.sha256(json.dumps(core, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+
+def write_model_artifact(params: dict, name: str, design: str = "api", time_unit: str = "days",
+                         out_dir: str = MODELS_DIR) -> str:
+    """
+    Escribe models/<name>-<hash>.json con los coeficientes y metadatos; devuelve la ruta.
+    El hash depende solo de los parámetros: re-ajustar con los mismos datos da el mismo archivo.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    version = _version_hash(params)
+    art = {"format": ARTIFACT_FORMAT, "name": name, "version": version, "design": design,
+           "time_unit": time_unit, "created_at": datetime.now().isoformat(timespec="seconds"), **params}
+    path = os.path.join(out_dir, f"{name}-{version}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(art, f, ensure_ascii=False, indent=2)
+    return path
+
+def load_model_artifact(path: str) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        art = json.load(f)
+    if art.get("format") != ARTIFACT_FORMAT:
+        raise ValueError(f"Formato de artefacto no soportado: {art.get('format')}")
+    return art
+
+def _main(argv=None):
+    # CLI: python -m services.model_fit historico.csv --family weibull --name alta_segura
+    import argparse
+    ap = argparse.ArgumentParser(description="Ajuste de modelo de supervivencia sobre histórico etiquetado")
+    ap.add_argument("csv")
+    ap.add_argument("--family", choices=["weibull", "exponential"], default="weibull")
+    ap.add_argument("--design", choices=list(DESIGNS), default="api")
+    ap.add_argument("--name", default="alta_segura")
+    ap.add_argument("--time", default="tiempo_evento_dias")
+    ap.add_argument("--event", default="evento")
+    ap.add_argument("--time-unit", choices=list(DAYS_PER_UNIT), default="days")
+    ap.add_argument("--chunksize", type=int, default=250_000, help="filas por lectura; 0 = cargar todo en memoria")
+    args = ap.parse_args(argv)
+    if args.chunksize > 0:
+        # fuera de memoria: el CSV se relee por chunks en cada pasada de Newton
+        chunks, features = csv_chunks(args.csv, args.design, args.time, args.event, args.chunksize)
+        params = fit_survival(chunks=chunks, features=features, family=args.family)
+    else:
+        df = pd.read_csv(args.csv)
+        params = fit_survival(DESIGNS[args.design](df), df[args.time], df[args.event], family=args.family)
+    print(write_model_artifact(params, args.name, design=args.design, time_unit=args.time_unit))
+    print(json.dumps(params["fit"]))
+
+if __name__ == "__main__":
+    _main()
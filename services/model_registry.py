@@ -0,0 +1,123 @@
+# services/model_registry.py
+from __future__ import annotations
+import os
+import threading
+from dataclasses import dataclass
+import numpy as np
+import pandas as pd
+import streamlit as st
+from .model_fit import MODELS_DIR, DESIGNS, DAYS_PER_UNIT, load_model_artifact
+from .settings import debug
+
+# Nombre lógico -> artefactos models/<name>-<hash>.json (gana el más reciente)
+ALTA_SEGURA, FSFB = "alta_segura", "fsfb"
+BUILTIN = "builtin"   # versión cuando no hay artefacto: se usan los coeficientes en código
+
+@dataclass(frozen=True)
+class CompiledModel:
+    """
+    Artefacto compilado a la representación de scoring: estandarización y coeficientes
+    plegados en un solo vector (η = X·w + b), más k constante y factor de unidad de tiempo.
+    """
+    name: str
+    version: str
+    path: str
+    family: str
+    design: str
+    features: tuple
+    w: np.ndarray
+    b: float
+    k: float
+    days_per_unit: float
+
+    def linear_predictor(self, df: pd.DataFrame) -> np.ndarray:
+        X = DESIGNS[self.design](df)[list(self.features)].to_numpy(dtype=float)
+        return X @ self.w + self.b
+
+    def weibull(self, df: pd.DataFrame, time_unit: str = "days"):
+        # (k, lam) por fila con S(t) = exp(-(lam·t)^k), t en `time_unit`
+        eta = self.linear_predictor(df)
+        lam = np.exp(eta) if self.family == "exponential" else np.exp(-eta)
+        return np.full(len(eta), self.k), lam * DAYS_PER_UNIT[time_unit] / self.days_per_unit
+
+    def survival(self, df: pd.DataFrame, times, time_unit: str = "days") -> np.ndarray:
+        k, lam = self.weibull(df, time_unit)
+        t = np.asarray(times, dtype=float)[None, :]
+        return np.exp(-(lam[:, None] * t) ** k[:, None])
+
+def compile_artifact(art: dict, path: str = "") -> CompiledModel:
+    scale = np.asarray(art["scale"], dtype=float)
+    w = np.asarray(art["coef"], dtype=float) / scale
+    b = float(art["intercept"] - np.asarray(art["mean"], dtype=float) @ w)
+    k = 1.0 if art["family"] == "exponential" else float(np.exp(-art["log_sigma"]))
+    return CompiledModel(
+        name=art.get("name", ""), version=art.get("version", ""), path=path,
+        family=art["family"], design=art.get("design", "api"), features=tuple(art["features"]),
+        w=w, b=b, k=k, days_per_unit=DAYS_PER_UNIT[art.get("time_unit", "days")],
+    )
+
+def as_compiled(model) -> CompiledModel | None:
+    # Acepta un CompiledModel, un artefacto (dict) o None
+    if model is None or isinstance(model, CompiledModel):
+        return model
+    return compile_artifact(model)
+
+# ======= Registro de proceso con recarga en caliente =======
+_REGISTRY: dict[str, tuple[str, int, CompiledModel]] = {}
+_LOCK = threading.Lock()
+
+def _latest_artifact(name: str, models_dir: str) -> tuple[str, int] | None:
+    if not os.path.isdir(models_dir):
+        return None
+    best = None
+    with os.scandir(models_dir) as it:
+        for e in it:
+            if e.is_file() and e.name.startswith(f"{name}-") and e.name.endswith(".json"):
+                mtime = e.stat().st_mtime_ns
+                if best is None or mtime > best[1]:
+                    best = (e.path, mtime)
+    return best
+
+def get_model(name: str, models_dir: str = MODELS_DIR) -> CompiledModel | None:
+    """
+    Modelo compilado vigente para `name`, o None si no hay artefacto (coeficientes en código).
+    Cada llamada solo hace un scandir; se recompila únicamente si cambió el archivo
+    (nuevo artefacto o mtime distinto), sin reiniciar Streamlit.
+    """
+    found = _latest_artifact(name, models_dir)
+    key = f"{models_dir}:{name}"
+    with _LOCK:
+        cur = _REGISTRY.get(key)
+        if found is None:
+            _REGISTRY.pop(key, None)
+            return None
+        if cur is not None and cur[:2] == found:
+            return cur[2]
+        try:
+            model = compile_artifact(load_model_artifact(found[0]), found[0])
+        except (OSError, ValueError, KeyError) as e:
+            # artefacto a medio escribir o inválido: se mantiene el anterior
+            debug(f"Modelo {name}: no se pudo cargar {found[0]} ({e})")
+            return cur[2] if cur is not None else None
+        _REGISTRY[key] = (*found, model)
+    if cur is None or cur[2].version != model.version:
+        debug(f"Modelo {name}: versión {model.version} activa ({os.path.basename(found[0])})")
+    return model
+
+def model_version(name: str, models_dir: str = MODELS_DIR) -> str:
+    model = get_model(name, models_dir)
+    return model.version if model is not None else BUILTIN
+
+# ======= Scoring cacheado por (dataset, versión de modelo) =======
+@st.cache_data(show_spinner=False, max_entries=16)
+def _score_cached(key: str, version: str, _df: pd.DataFrame) -> pd.DataFrame:
+    from .risk_api import score_batch
+    return score_batch(_df, model=get_model(ALTA_SEGURA))
+
+def cached_score_batch(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    score_batch con el modelo Alta Segura vigente, cacheado por hash del dataset y versión del modelo:
+    al publicar un artefacto nuevo cambia la llave y se re-puntúa una vez, sin vaciar cachés a mano.
+    """
+    from .data import dataset_key
+    return _score_cached(dataset_key(df), model_version(ALTA_SEGURA), df)
@@ -0,0 +1,111 @@
+# services/patient_store.py
+from __future__ import annotations
+import weakref
+from typing import Callable, Hashable
+import numpy as np
+import pandas as pd
+import streamlit as st
+from .memo import LRUMemo
+from .memory_governor import deep_size, register_resource
+from .model_registry import ALTA_SEGURA, model_version
+
+ID_COLS = ("patient_id", "episode_id")
+_LIVE: weakref.WeakSet = weakref.WeakSet()    # stores vivos (para medirlos en el gobernador de memoria)
+
+class PatientStore:
+    """
+    Acceso por llave a un dataset puntuado (inmutable mientras viva el store).
+
+    - Índice hash patient_id/episode_id -> posición (iloc): O(1) por selección en vez de filtrar el df.
+      Si un patient_id tiene varios episodios, apunta al de mayor `rank_col`.
+    - Typeahead en servidor: ids en minúsculas ordenados + searchsorted por prefijo; solo vuelven
+      los `limit` mejores por `rank_col` (al navegador no viaja la lista completa).
+    - LRU de payloads de detalle ya renderizados (gráficos, texto) por (posición, vista).
+    """
+
+    def __init__(self, df: pd.DataFrame, id_cols=ID_COLS, rank_col: str = "risk_factor",
+                 detail_cache: int = 256):
+        _LIVE.add(self)
+        self.df = df.reset_index(drop=True)
+        self.id_cols = [c for c in id_cols if c in self.df.columns]
+        n = len(self.df)
+        self.rank = (self.df[rank_col].to_numpy(dtype=float) if rank_col in self.df.columns
+                     else np.zeros(n))
+        # índice hash: un dict por recorrido en orden de filas (rápido); los ids repetidos
+        # (varios episodios) se reescriben en orden ascendente de rank para que gane el mayor
+        self._index: dict[str, int] = {}
+        for c in self.id_cols:
+            ids = self.df[c].astype(str)
+            self._index.update(zip(ids.tolist(), range(n)))
+            dup = ids.duplicated(keep=False).to_numpy()
+            if dup.any():
+                rows = np.flatnonzero(dup)
+                for i in rows[np.argsort(self.rank[rows], kind="stable")].tolist():
+                    self._index[ids.iat[i]] = i
+        self._prefix = None   # (llaves ordenadas, posiciones) del typeahead: se arman en la 1ª búsqueda
+        self._details = LRUMemo(maxsize=detail_cache)
+
+    def _prefix_index(self):
+        # se publica como una sola tupla: dos sesiones a la vez a lo sumo lo construyen dos veces
+        if self._prefix is None:
+            keys = np.array([str(x).lower() for c in self.id_cols for x in self.df[c].tolist()], dtype=str)
+            pos = np.tile(np.arange(len(self.df)), len(self.id_cols))
+            order = np.argsort(keys, kind="stable")
+            self._prefix = (keys[order], pos[order])
+        return self._prefix
+
+    def __len__(self) -> int:
+        return len(self.df)
+
+    def position(self, key) -> int | None:
+        return self._index.get(str(key))
+
+    def row(self, key) -> pd.Series | None:
+        i = self.position(key)
+        return None if i is None else self.df.iloc[i]
+
+    def label(self, i: int) -> str:
+        return str(self.df.iat[int(i), self.df.columns.get_loc(self.id_cols[0])])
+
+    def search(self, prefix: str = "", limit: int = 20, allowed: np.ndarray | None = None) -> np.ndarray:
+        """
+        Posiciones de los `limit` pacientes de mayor rank cuyo patient_id o episode_id empieza
+        por `prefix` (sin distinguir mayúsculas). `allowed`: máscara booleana por posición (filtros).
+        """
+        p = (prefix or "").strip().lower()
+        if p:
+            keys, pos = self._prefix_index()
+            lo = np.searchsorted(keys, p, side="left")
+            hi = np.searchsorted(keys, p + "\uffff", side="left")
+            cand = np.unique(pos[lo:hi])
+        else:
+            cand = np.arange(len(self.df))
+        if allowed is not None:
+            cand = cand[np.asarray(allowed, dtype=bool)[cand]]
+        if len(cand) > limit:
+            top = np.argpartition(-self.rank[cand], limit - 1)[:limit]
+            cand = cand[top]
+        return cand[np.argsort(-self.rank[cand], kind="stable")]
+
+    def detail(self, i: int, build: Callable[[pd.Series], object], view: Hashable = "") -> object:
+        # payload de detalle cacheado; `view` distingue páginas que renderizan distinto al mismo paciente
+        return self._details.get_or_compute((int(i), view), lambda: build(self.df.iloc[int(i)]))
+
+    def stats(self) -> dict:
+        return self._details.stats()
+
+# ======= Store compartido por (dataset, versión de modelo) =======
+@st.cache_resource(show_spinner=False, max_entries=8)
+def _store_cached(key: str, version: str, _scored: pd.DataFrame) -> PatientStore:
+    return PatientStore(_scored)
+
+# índice + LRU de detalles: recalculables, el gobernador de memoria puede soltarlos
+register_resource("services.patient_store._store_cached", lambda: deep_size(list(_LIVE)), _store_cached.clear)
+
+def cached_patient_store(df: pd.DataFrame, scored: pd.DataFrame) -> PatientStore:
+    """
+    PatientStore de `scored` (= cached_score_batch(df)) compartido por las sesiones del proceso:
+    el índice y el LRU de detalles se construyen una vez por dataset y versión del modelo.
+    """
+    from .data import dataset_key
+    return _store_cached(dataset_key(df), model_version(ALTA_SEGURA), scored)
@@ -0,0 +1,250 @@
+# services/quantiles.py
+from __future__ import annotations
+import os
+import numpy as np
+import pandas as pd
+import streamlit as st
+from .model_registry import ALTA_SEGURA, get_model, model_version
+
+# Cuantiles aproximados con memoria constante: t-digest fusionable (por chunk y entre procesos)
+COMPRESSION = 200
+SCORE_COLS = ("risk_factor", "t_start_days", "t_end_days")
+CHUNK_ROWS = 200_000
+
+class TDigest:
+    """
+    t-digest (variante "merging", escala k1): centroides (media, peso) comprimidos de modo que
+    las colas quedan casi exactas y el centro con error de rango ~1/compression.
+    Memoria O(compression) sin importar cuántos valores se agreguen; dos digests se fusionan
+    sumando sus centroides y comprimiendo (mismo resultado que haber visto todos los datos).
+    """
+
+    def __init__(self, compression: int = COMPRESSION):
+        self.compression = compression
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self._buf: list[tuple[np.ndarray, np.ndarray]] = []
+        self._buffered = 0
+        self.n = 0.0
+        self.min, self.max = np.inf, -np.inf
+
+    def update(self, values, weights=None) -> "TDigest":
+        x = np.asarray(values, dtype=float).ravel()
+        w = np.ones_like(x) if weights is None else np.asarray(weights, dtype=float).ravel()
+        ok = np.isfinite(x) & (w > 0)
+        x, w = x[ok], w[ok]
+        if not len(x):
+            return self
+        self._buf.append((x, w))
+        self._buffered += len(x)
+        self.n += float(w.sum())
+        self.min, self.max = min(self.min, float(x.min())), max(self.max, float(x.max()))
+        if self._buffered >= 20 * self.compression:
+            self._compress()
+        return self
+
+    def _compress(self):
+        if not self._buf:
+            return
+        x = np.concatenate([self.means] + [b[0] for b in self._buf])
+        w = np.concatenate([self.weights] + [b[1] for b in self._buf])
+        self._buf, self._buffered = [], 0
+        order = np.argsort(x, kind="stable")
+        x, w = x[order], w[order]
+        cw = np.cumsum(w)
+        q = (cw - w / 2) / cw[-1]
+        # k1(q) = δ/2π · asin(2q-1): cada cubeta de ancho 1 en k es un centroide (angostas en las colas)
+        k = self.compression / (2 * np.pi) * np.arcsin(np.clip(2 * q - 1, -1, 1))
+        bucket = np.floor(k + self.compression / 4).astype(np.int64)
+        starts = np.r_[0, np.flatnonzero(np.diff(bucket)) + 1]
+        self.weights = np.add.reduceat(w, starts)
+        self.means = np.add.reduceat(x * w, starts) / self.weights
+
+    def merge(self, other: "TDigest") -> "TDigest":
+        other._compress()
+        if other.n:
+            self._buf.append((other.means, other.weights))
+            self._buffered += len(other.means)
+            self.n += other.n
+            self.min, self.max = min(self.min, other.min), max(self.max, other.max)
+            self._compress()
+        return self
+
+    def quantile(self, q):
+        """
+        Cuantil(es) q en [0, 1]; interpola entre centros de centroides (con mín/máx exactos en los extremos).
+        """
+        self._compress()
+        q = np.asarray(q, dtype=float)
+        if not self.n:
+            return np.full(q.shape, np.nan) if q.ndim else np.nan
+        mid = np.cumsum(self.weights) - self.weights / 2
+        out = np.interp(q * self.n, np.r_[0.0, mid, self.n], np.r_[self.min, self.means, self.max])
+        return out if q.ndim else float(out)
+
+    def cdf(self, x):
+        self._compress()
+        if not self.n:
+            return np.full(np.shape(x), np.nan)
+        mid = np.cumsum(self.weights) - self.weights / 2
+        return np.interp(x, np.r_[self.min, self.means, self.max], np.r_[0.0, mid, self.n]) / self.n
+
+    def median(self) -> float:
+        return self.quantile(0.5)
+
+    # ---- serialización (para fusionar resultados de otros procesos) ----
+    def to_dict(self) -> dict:
+        self._compress()
+        return {"compression": self.compression, "n": self.n, "min": self.min, "max": self.max,
+                "means": self.means.tolist(), "weights": self.weights.tolist()}
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "TDigest":
+        t = cls(d["compression"])
+        t.n, t.min, t.max = float(d["n"]), float(d["min"]), float(d["max"])
+        t.means, t.weights = np.asarray(d["means"], dtype=float), np.asarray(d["weights"], dtype=float)
+        return t
+
+class QuantileSketches:
+    """
+    Un TDigest por columna; se alimenta con DataFrames (chunks) y se fusiona con otro igual.
+    """
+
+    def __init__(self, columns=SCORE_COLS, compression: int = COMPRESSION):
+        self.digests = {c: TDigest(compression) for c in columns}
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, columns=SCORE_COLS, compression: int = COMPRESSION) -> "QuantileSketches":
+        return cls(columns, compression).update(df)
+
+    def update(self, df: pd.DataFrame) -> "QuantileSketches":
+        for c, d in self.digests.items():
+            if c in df.columns:
+                d.update(pd.to_numeric(df[c], errors="coerce").to_numpy(dtype=float))
+        return self
+
+    def merge(self, other: "QuantileSketches") -> "QuantileSketches":
+        for c, d in other.digests.items():
+            self.digests.setdefault(c, TDigest(d.compression)).merge(d)
+        return self
+
+    def __getitem__(self, col: str) -> TDigest:
+        return self.digests[col]
+
+    def to_dict(self) -> dict:
+        return {c: d.to_dict() for c, d in self.digests.items()}
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "QuantileSketches":
+        qs = cls(())
+        qs.digests = {c: TDigest.from_dict(v) for c, v in d.items()}
+        return qs
+
+# ======= Usos: deciles, umbrales de cobertura, medianas =======
+def decile_edges(d: TDigest) -> np.ndarray:
+    # 9 puntos de corte internos (p10..p90)
+    return np.asarray(d.quantile(np.arange(1, 10) / 10))
+
+def assign_deciles(values, edges: np.ndarray) -> np.ndarray:
+    # decil 1..10; a diferencia de qcut, no falla con cortes repetidos (riesgos empatados en el clip)
+    return np.searchsorted(edges, np.asarray(values, dtype=float), side="right") + 1
+
+def top_threshold(d: TDigest, coverage: float) -> float:
+    """
+    Umbral de riesgo del Top `coverage` (p.ej. 0.30 -> p70): tratados = riesgo >= umbral.
+    """
+    if coverage <= 0:
+        return np.inf
+    return d.quantile(1.0 - min(coverage, 1.0)) if coverage < 1 else -np.inf
+
+def coverage_order(values, d: TDigest, coverages) -> np.ndarray:
+    """
+    Orden "Top riesgo primero" con la resolución justa para evaluar `coverages`: cada fila cae en
+    el tramo de la menor cobertura que la incluye (umbrales del digest) y se ordena por tramo con
+    radix sort O(n) sobre enteros pequeños, en vez de ordenar todos los riesgos. Las sumas por
+    prefijo en los cortes de cobertura coinciden con las del orden exacto salvo en las filas
+    vecinas a cada umbral (error de rango del digest), que tienen riesgos casi iguales.
+    """
+    cov = np.sort(np.asarray(coverages, dtype=float))
+    thr = np.array([top_threshold(d, c) for c in cov])         # decreciente con la cobertura
+    x = np.asarray(values, dtype=float)
+    tier = len(thr) - np.searchsorted(thr[::-1], x, side="right")
+    return np.argsort(tier.astype(np.int16), kind="stable")
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def _sketches_cached(key: str, version: str, columns: tuple, _scored: pd.DataFrame) -> QuantileSketches:
+    return QuantileSketches.from_frame(_scored, columns)
+
+def cached_score_sketches(df: pd.DataFrame, scored: pd.DataFrame, columns=SCORE_COLS) -> QuantileSketches:
+    # sketches de scored (= cached_score_batch(df)) por dataset y versión del modelo
+    from .data import dataset_key
+    return _sketches_cached(dataset_key(df), model_version(ALTA_SEGURA), tuple(columns), scored)
+
+# ======= Puntuación por chunks (backfills) =======
+def sketch_scores(chunks, norm: tuple[float, float] | None = None, model=None,
+                  columns=SCORE_COLS, compression: int = COMPRESSION) -> QuantileSketches:
+    """
+    Puntúa chunk a chunk y acumula los sketches; solo un chunk vive en memoria a la vez.
+    La normalización debe quedar congelada entre chunks: `norm` (ver risk_api.score_norm) o,
+    si se omite, la del primer chunk.
+    """
+    from .risk_api import score_batch, score_norm
+    qs = QuantileSketches(columns, compression)
+    for chunk in chunks:
+        if norm is None:
+            norm = score_norm(chunk)
+        qs.update(score_batch(chunk, norm=norm, model=model)[list(columns)])
+    return qs
+
+def _sketch_chunk(chunk: pd.DataFrame, norm, columns, compression) -> dict:
+    # trabajador de backfill_sketches (proceso aparte): devuelve el sketch serializado
+    return sketch_scores([chunk], norm, get_model(ALTA_SEGURA), columns, compression).to_dict()
+
+def backfill_sketches(path: str, norm: tuple[float, float] | None = None, workers: int | None = None,
+                      chunksize: int = CHUNK_ROWS, columns=SCORE_COLS,
+                      compression: int = COMPRESSION) -> QuantileSketches:
+    """
+    Sketches de un CSV arbitrariamente grande: los chunks se reparten en `workers` procesos y sus
+    digests se fusionan al volver. A lo sumo 2·workers chunks en vuelo (memoria acotada).
+    """
+    from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+    from .risk_api import score_norm
+    workers = workers or os.cpu_count() or 1
+    chunks = pd.read_csv(path, chunksize=chunksize)
+    total = QuantileSketches(columns, compression)
+    if workers <= 1:
+        return total.merge(sketch_scores(chunks, norm, get_model(ALTA_SEGURA), columns, compression))
+    with ProcessPoolExecutor(workers) as pool:
+        pending = set()
+        for chunk in chunks:
+            if norm is None:
+                norm = score_norm(chunk)
+            pending.add(pool.submit(_sketch_chunk, chunk, norm, tuple(columns), compression))
+            if len(pending) >= 2 * workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for f in done:
+                    total.merge(QuantileSketches.from_dict(f.result()))
+        for f in pending:
+            total.merge(QuantileSketches.from_dict(f.result()))
+    return total
+
+def _main(argv=None):
+    import argparse, json
+    ap = argparse.ArgumentParser(description="Deciles, umbrales y medianas de riesgo de un CSV grande (t-digest)")
+    ap.add_argument("csv")
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument("--chunksize", type=int, default=CHUNK_ROWS)
+    ap.add_argument("--out", default=None, help="guarda los sketches (JSON) para fusionarlos después")
+    args = ap.parse_args(argv)
+    qs = backfill_sketches(args.csv, workers=args.workers, chunksize=args.chunksize)
+    risk = qs["risk_factor"]
+    print(f"n = {risk.n:,.0f}")
+    print("cortes de decil (riesgo):", np.round(decile_edges(risk), 4).tolist())
+    print("umbral Top 10/20/30%:", [round(top_threshold(risk, c), 4) for c in (0.1, 0.2, 0.3)])
+    print(f"ventana mediana: {qs['t_start_days'].median():.0f}-{qs['t_end_days'].median():.0f} días")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(qs.to_dict(), f)
+
+if __name__ == "__main__":
+    _main()
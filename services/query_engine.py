@@ -0,0 +1,210 @@
+# services/query_engine.py
+from __future__ import annotations
+import importlib.util
+import os
+import re
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from .settings import debug
+
+# DuckDB es opcional: sin él, las mismas consultas corren con pyarrow.dataset
+HAS_DUCKDB = importlib.util.find_spec("duckdb") is not None
+OPS = {"==": "=", "!=": "<>", ">": ">", ">=": ">=", "<": "<", "<=": "<=", "in": "IN", "between": "BETWEEN"}
+AGGS = {"count": "COUNT", "sum": "SUM", "mean": "AVG", "min": "MIN", "max": "MAX"}
+_NAME = re.compile(r"^[A-Za-z_][A-Za-z0-9_]{0,62}$")
+
+def filter_mask(df: pd.DataFrame, where=()) -> np.ndarray:
+    """
+    Máscara booleana de `where` sobre un DataFrame que ya está en memoria (mismo formato que el
+    motor). Para filtrar lo que ya se tiene no se registra ni se copia nada.
+    """
+    mask = np.ones(len(df), dtype=bool)
+    for col, op, val in where:
+        s = df[col]
+        if op == "in":
+            m = s.isin(list(val))
+        elif op == "between":
+            m = s.between(*val)
+        else:
+            m = {"==": s.__eq__, "!=": s.__ne__, ">": s.__gt__, ">=": s.__ge__,
+                 "<": s.__lt__, "<=": s.__le__}[op](val)
+        mask &= m.to_numpy(dtype=bool)
+    return mask
+
+class QueryEngine:
+    """
+    Motor de consultas embebido sobre datasets Parquet registrados (archivo o directorio hive,
+    p.ej. el histórico de services.dataset_store). Los datos no se cargan a memoria: filtros,
+    proyección, orden, top-k y agregados bajan al escaneo (DuckDB: poda de particiones y row
+    groups; sin DuckDB, filtros de pyarrow.dataset) y a la página vuelven solo las filas pedidas.
+
+    where: lista de (columna, op, valor) con op en ==, !=, >, >=, <, <=, in, between.
+    Rutas y valores van siempre como parámetros; nombres de tabla y columnas se validan.
+    """
+
+    _READ = "read_parquet(?, hive_partitioning = true, union_by_name = true)"
+
+    def __init__(self, backend: str | None = None, max_tables: int = 16):
+        backend = backend or os.getenv("CORPUS_QUERY_ENGINE") or ("duckdb" if HAS_DUCKDB else "pyarrow")
+        if backend == "duckdb" and not HAS_DUCKDB:
+            backend = "pyarrow"
+        self.backend = backend
+        self.max_tables = max_tables
+        self._tables: OrderedDict[str, dict] = OrderedDict()
+        self._lock = threading.Lock()
+        self._con = None
+        if backend == "duckdb":
+            import duckdb
+            self._con = duckdb.connect()
+
+    # ---- registro ----
+    def register_parquet(self, path: str, name: str) -> str:
+        # Parquet (archivo o directorio con particiones hive): se consulta en sitio
+        if not _NAME.match(name):
+            raise ValueError(f"Nombre de tabla inválido: {name!r}")
+        path = os.path.abspath(path)
+        with self._lock:
+            if self._con is not None:
+                src = os.path.join(path, "**", "*.parquet") if os.path.isdir(path) else path
+                cols = [r[0] for r in self._con.execute(f"DESCRIBE SELECT * FROM {self._READ}", [src]).fetchall()]
+            else:
+                src = path
+                cols = self._dataset(src).schema.names
+            self._tables[name] = {"src": src, "columns": cols}
+            self._tables.move_to_end(name)
+            while len(self._tables) > self.max_tables:
+                self._tables.popitem(last=False)
+        debug(f"QueryEngine[{self.backend}]: {name} -> {path} ({len(cols)} columnas)")
+        return name
+
+    @staticmethod
+    def _dataset(src: str):
+        # directorio: solo *.parquet (los .tmp de una escritura en curso no se leen)
+        import pyarrow.dataset as ds
+        if not os.path.isdir(src):
+            return ds.dataset(src, format="parquet")
+        files = sorted(os.path.join(d, f) for d, _, fs in os.walk(src) for f in fs if f.endswith(".parquet"))
+        return ds.dataset(files, format="parquet", partitioning=ds.partitioning(flavor="hive"), partition_base_dir=src)
+
+    # ---- memoria ----
+    def memory_bytes(self) -> int:
+        # buffers de DuckDB (caché de metadatos/row groups); con pyarrow no se retiene nada entre consultas
+        if self._con is None:
+            return 0
+        with self._lock:
+            return int(self._con.execute("SELECT coalesce(sum(memory_usage_bytes), 0) FROM duckdb_memory()").fetchone()[0])
+
+    def clear(self) -> None:
+        # suelta tablas y buffers; DatasetStore.table() vuelve a registrar en la siguiente consulta
+        with self._lock:
+            self._tables.clear()
+            if self._con is not None:
+                import duckdb
+                self._con.close()
+                self._con = duckdb.connect()
+
+    def columns(self, table: str) -> list[str]:
+        return list(self._tables[table]["columns"])
+
+    def _check(self, table: str, cols) -> None:
+        known = set(self._tables[table]["columns"])
+        bad = [c for c in cols if c not in known]
+        if bad:
+            raise KeyError(f"Columnas desconocidas en {table}: {bad}")
+
+    # ---- SQL ----
+    @staticmethod
+    def _where_sql(where) -> tuple[str, list]:
+        parts, params = [], []
+        for col, op, val in where:
+            if op == "in":
+                vals = list(val)
+                if not vals:
+                    parts.append("FALSE")
+                    continue
+                parts.append(f'"{col}" IN ({", ".join("?" * len(vals))})')
+                params.extend(vals)
+            elif op == "between":
+                parts.append(f'"{col}" BETWEEN ? AND ?')
+                params.extend(val)
+            else:
+                parts.append(f'"{col}" {OPS[op]} ?')
+                params.append(val)
+        return (" WHERE " + " AND ".join(parts)) if parts else "", params
+
+    def _sql(self, table: str, head: str, where, tail: str = "") -> pd.DataFrame:
+        w, params = self._where_sql(where)
+        with self._lock:
+            return self._con.execute(f"{head} FROM {self._READ}{w}{tail}", [self._tables[table]["src"], *params]).df()
+
+    # ---- pyarrow ----
+    def _load(self, table: str, cols: list[str], where) -> pd.DataFrame:
+        # filtros de pyarrow: predicados (incluidas las columnas de partición) y proyección bajan al lector
+        import pyarrow.dataset as ds
+        expr = None
+        for col, op, val in where:
+            f = ds.field(col)
+            if op == "in":
+                cond = f.isin(list(val))
+            elif op == "between":
+                cond = (f >= val[0]) & (f <= val[1])
+            else:
+                cond = {"==": f.__eq__, "!=": f.__ne__, ">": f.__gt__, ">=": f.__ge__,
+                        "<": f.__lt__, "<=": f.__le__}[op](val)
+            expr = cond if expr is None else expr & cond
+        return self._dataset(self._tables[table]["src"]).to_table(columns=cols, filter=expr).to_pandas()
+
+    # ---- API ----
+    def select(self, table: str, columns: list[str] | None = None, where=(), order_by: str | None = None,
+               descending: bool = False, limit: int | None = None) -> pd.DataFrame:
+        cols = list(columns or self.columns(table))
+        self._check(table, cols + [c for c, _, _ in where] + ([order_by] if order_by else []))
+        if self._con is not None:
+            tail = f' ORDER BY "{order_by}" {"DESC" if descending else "ASC"}' if order_by else ""
+            if limit is not None:
+                tail += f" LIMIT {int(limit)}"
+            return self._sql(table, f'SELECT {", ".join(f"{chr(34)}{c}{chr(34)}" for c in cols)}', where, tail)
+        need = list(dict.fromkeys(cols + ([order_by] if order_by else [])))
+        out = self._load(table, need, where)
+        if order_by:
+            if limit is not None:
+                out = out.nlargest(int(limit), order_by) if descending else out.nsmallest(int(limit), order_by)
+            else:
+                out = out.sort_values(order_by, ascending=not descending, kind="mergesort")
+        elif limit is not None:
+            out = out.head(int(limit))
+        return out[cols].reset_index(drop=True)
+
+    def aggregate(self, table: str, by: list[str], aggs: dict[str, tuple[str, str]], where=()) -> pd.DataFrame:
+        """
+        aggs: {salida: (columna, función)} con función en count, sum, mean, min, max.
+        """
+        self._check(table, list(by) + [c for c, _ in aggs.values()] + [c for c, _, _ in where])
+        bad = [o for o in aggs if not _NAME.match(o)] + [f for _, f in aggs.values() if f not in AGGS]
+        if bad:
+            raise ValueError(f"Agregado inválido: {bad}")
+        if self._con is not None:
+            keys = ", ".join(f'"{c}"' for c in by)
+            sel = ", ".join(f'{AGGS[f]}("{c}") AS "{o}"' for o, (c, f) in aggs.items())
+            tail = f" GROUP BY {keys} ORDER BY {keys}" if by else ""
+            return self._sql(table, f"SELECT {keys + ', ' if by else ''}{sel}", where, tail)
+        df = self._load(table, list(dict.fromkeys(list(by) + [c for c, _ in aggs.values()])), where)
+        named = {o: (c, f) for o, (c, f) in aggs.items()}
+        if by:
+            return df.groupby(list(by), as_index=False, observed=True).agg(**named)
+        return pd.DataFrame({o: [getattr(df[c], f)()] for o, (c, f) in named.items()})
+
+_ENGINE: QueryEngine | None = None
+_ENGINE_LOCK = threading.Lock()
+
+def get_engine() -> QueryEngine:
+    # Motor único por proceso (compartido por sesiones)
+    global _ENGINE
+    with _ENGINE_LOCK:
+        if _ENGINE is None:
+            from .memory_governor import register_resource
+            _ENGINE = QueryEngine()
+            register_resource("services.query_engine", _ENGINE.memory_bytes, _ENGINE.clear)
+        return _ENGINE
@@ -3,6 +3,9 @@ from __future__ import annotations
 import numpy as np
 import pandas as pd
 from .settings import debug
+from .diagnosis import comorbidity_index
+
+COMORBIDITY_BETA = 0.3   # peso por punto del índice de comorbilidad (CIE-10)
 
 def _sigmoid(x): return 1/(1+np.exp(-x))
 
@@ -23,8 +26,22 @@ def _window_from_risk(r):
         a = np.random.randint(18, 25); b = a + np.random.randint(14, 28)
     return a, b
 
-def score_batch(df: pd.DataFrame, seed: int = 123) -> pd.DataFrame:
-    rng = np.random.default_rng(seed)
+def event_rate(scored: pd.DataFrame, day: int = 30, default_s: float = 0.85) -> np.ndarray:
+    """
+    Tasa de evento a `day` días (1 - S(day)) vectorizada desde hazard_per_day.
+    Si el df no trae hazard (p.ej. CSV exportado), se lee el punto de la curva.
+    """
+    if "hazard_per_day" in scored.columns:
+        h = scored["hazard_per_day"].to_numpy(dtype=float)
+        return 1.0 - np.clip(np.exp(-h * day), 0.02, 1.0)
+    s = [next((p["S"] for p in c if p["day"] == day), default_s) for c in scored["surv_curve"]]
+    return 1.0 - np.asarray(s, dtype=float)
+
+def _has_dx(df: pd.DataFrame) -> bool:
+    return "dx_principal_cie10" in df.columns or "dx_secundarios" in df.columns
+
+def raw_score(df: pd.DataFrame, comorbidity: np.ndarray | None = None) -> pd.Series:
+    # Predictor lineal heurístico (antes de normalizar)
     x = (
         0.9*(df["creatinina"].astype(float)-1.0) +
         0.6*(df["hba1c"].astype(float)-6.0) +
@@ -32,15 +49,54 @@ def score_batch(df: pd.DataFrame, seed: int = 123) -> pd.DataFrame:
         0.08*(df["polifarmacia_n"].astype(float)) +
         0.5*(df["hosp_6m"].astype(float))
     )
+    if comorbidity is None and _has_dx(df):
+        comorbidity = comorbidity_index(df)
+    if comorbidity is not None:
+        x = x + COMORBIDITY_BETA * comorbidity
+    return x
+
+def score_norm(df: pd.DataFrame) -> tuple[float, float]:
+    # (media, desviación) de referencia para congelar la normalización entre lotes
+    x = raw_score(df)
+    return float(x.mean()), float(x.std())
+
+def score_batch(df: pd.DataFrame, seed: int = 123, norm: tuple[float, float] | None = None,
+                model: dict | None = None) -> pd.DataFrame:
+    """
+    norm: (media, desviación) fija; si se omite se normaliza con el propio lote.
+    Con una norm congelada, re-puntuar solo las filas que cambiaron da el mismo riesgo
+    que re-puntuar todo el censo.
+    model: modelo del registro (services.model_registry.get_model) o artefacto; si se pasa,
+    riesgo, hazard y curva salen de sus coeficientes en vez de la heurística.
+    """
+    rng = np.random.default_rng(seed)
+    cmb = comorbidity_index(df) if _has_dx(df) else None
+    x = raw_score(df, cmb)
+    mu, sd = norm if norm is not None else (x.mean(), x.std())
     # normaliza y convierte a probabilidad tipo riesgo 0–0.95
-    z = (x - x.mean()) / (x.std() + 1e-6)
+    z = (x - mu) / (sd + 1e-6)
     risk = np.clip(_sigmoid(z) * 0.9, 0.03, 0.95)
     out = df.copy()
     out["risk_factor"] = risk
+    if cmb is not None:
+        out["comorbilidad"] = cmb
 
-    # hazard proporcional al riesgo (más suave)
-    hazard = 0.015 + 0.045 * risk
-    out["surv_curve"] = [ _make_survival_curve(h) for h in hazard ]
+    if model is not None:
+        from .model_registry import as_compiled
+        days = np.arange(0, 61, 5)
+        S = np.clip(as_compiled(model).survival(out, days, time_unit="days"), 0.02, 1.0)
+        s30 = S[:, days == 30][:, 0]
+        risk = np.clip(1.0 - s30, 0.03, 0.95)
+        out["risk_factor"] = risk
+        # hazard constante equivalente a 30 días (lo usan event_rate y la evaluación)
+        hazard = -np.log(s30) / 30.0
+        out["hazard_per_day"] = hazard
+        out["surv_curve"] = [[{"day": int(d), "S": float(v)} for d, v in zip(days, row)] for row in S]
+    else:
+        # hazard proporcional al riesgo (más suave)
+        hazard = 0.015 + 0.045 * risk
+        out["hazard_per_day"] = hazard
+        out["surv_curve"] = [ _make_survival_curve(h) for h in hazard ]
 
     # ventana temporal
     starts, ends = [], []
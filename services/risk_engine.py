@@ -44,12 +44,17 @@ def _value_to_score(name, val):
     if cfg["type"] == "num_inv":
         lo, hi = cfg["norm"]
         return cfg["beta"] * _norm_num(val, lo, hi, inverse=True)
-    if cfg["type"] == "cat":
-        return cfg["beta"] * cfg["map"].get(val, 0.0)
-    if cfg["type"] == "cat_ord":
-        return cfg["beta"] * cfg["map"].get(val, 0.0)
+    if cfg["type"] in ("cat", "cat_ord"):
+        return cfg["beta"] * cfg["map"].get(_cat_key(val), 0.0)
     return 0.0
 
+def _cat_key(val) -> str:
+    # categorías numéricas (2, 2.0, "2") -> "2"; el resto como texto sin espacios
+    if isinstance(val, (int, float, np.integer, np.floating)) and not isinstance(val, bool) \
+            and np.isfinite(val) and float(val).is_integer():
+        return str(int(val))
+    return str(val).strip()
+
 def _linear_predictor(row: Dict) -> float:
     s = 0.0
     for k in FEATURE_CONFIG.keys():
@@ -57,6 +62,11 @@ def _linear_predictor(row: Dict) -> float:
     # Centramos en 0 aprox
     return s - 0.12
 
+def profile_key(row: Dict) -> Tuple[float, ...]:
+    # Perfil normalizado (aporte de cada feature): dos filas con la misma llave dan el mismo riesgo,
+    # curva y explicación, con o sin artefacto. Útil como llave de memo.
+    return tuple(round(_value_to_score(k, row.get(k)) / FEATURE_CONFIG[k]["beta"], 10) for k in FEATURE_CONFIG)
+
 def _weibull_params(lp: float) -> Tuple[float, float]:
     """
     Mapea lp -> parámetros de Weibull: k (shape), lambda (scale)
@@ -88,21 +98,29 @@ def _peak_hazard_window(k: float, lam: float, horizon: int) -> Tuple[int, int]:
     end = min(horizon, start + W - 1)
     return (start, end)
 
-def compute_risk_and_survival(row: Dict, horizon_months: int = 24) -> Tuple[float, pd.DataFrame, Dict]:
-    lp = _linear_predictor(row)
-    k, lam = _weibull_params(lp)
+def compute_risk_and_survival(row: Dict, horizon_months: int = 24, model=None) -> Tuple[float, pd.DataFrame, Dict]:
+    # model: modelo del registro; si se omite se usan los betas de FEATURE_CONFIG
+    if model is not None:
+        # lp = η del propio modelo (el mismo que produce k, lam), no el de FEATURE_CONFIG
+        from .model_registry import as_compiled
+        frame = pd.DataFrame([row])
+        lp = float(as_compiled(model).linear_predictor(frame)[0])
+        k, lam = (float(v[0]) for v in weibull_params_artifact(model, frame))
+    else:
+        lp = _linear_predictor(row)
+        k, lam = _weibull_params(lp)
     surv = survival_weibull(max(horizon_months, 60), k, lam)
     risk_pct = float((1 - surv.loc[surv["month"]==horizon_months,"survival"].values[0]) * 100.0)
     peak = _peak_hazard_window(k, lam, horizon_months)
     meta = {"lp": lp, "k": k, "lam": lam, "peak_window": peak}
     return risk_pct, surv, meta
 
-def explain_contributions(row: Dict) -> List[Tuple[str, float, str]]:
+def explain_contributions(row: Dict, model=None) -> List[Tuple[str, float, str]]:
     """
     Devuelve lista [(feature, contrib_pp, texto)], ordenada por |contrib|.
     Aproximación: diferencia de riesgo al tope vs. al mínimo para cada variable.
     """
-    base_risk, _, meta = compute_risk_and_survival(row, 24)
+    base_risk, _, meta = compute_risk_and_survival(row, 24, model)
     outs = []
     for k, cfg in FEATURE_CONFIG.items():
         r2 = dict(row)
@@ -117,12 +135,121 @@ def explain_contributions(row: Dict) -> List[Tuple[str, float, str]]:
             # elegir el valor con menor contribución del mapa
             min_val = min(cfg["map"], key=lambda x: cfg["map"][x])
             r2[k] = min_val
-        risk2, _, _ = compute_risk_and_survival(r2, 24)
+        risk2, _, _ = compute_risk_and_survival(r2, 24, model)
         delta = base_risk - risk2
         outs.append((k, delta, cfg.get("text","")))
     outs.sort(key=lambda x: abs(x[1]), reverse=True)
     return outs
 
+# ======= Modo por lotes (vectorizado) =======
+def feature_scores_batch(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Aporte sin ponderar de cada feature (normalizado 0–1 o valor del mapa categórico), una columna por feature.
+    Columnas ausentes o categorías desconocidas aportan 0 (igual que .get en el modo individual); un
+    numérico faltante (NaN) queda en el tope del rango, como lo deja _norm_num en el modo individual.
+    """
+    out = {}
+    for k, cfg in FEATURE_CONFIG.items():
+        if k not in df.columns:
+            out[k] = np.zeros(len(df))
+        elif cfg["type"] in ("num", "num_inv"):
+            lo, hi = cfg["norm"]
+            v = pd.to_numeric(df[k], errors="coerce").to_numpy(dtype=float)
+            x = (np.clip(np.where(np.isnan(v), hi, v), lo, hi) - lo) / (hi - lo + 1e-9)
+            out[k] = 1 - x if cfg["type"] == "num_inv" else x
+        else:
+            # las plantillas CSV traen "1","2"... como texto o número (2.0 si la columna es float):
+            # misma llave que _cat_key en el modo individual
+            vals = df[k].astype(str).str.strip()
+            num = pd.to_numeric(df[k], errors="coerce")
+            whole = (num.notna() & (num == num.round())).to_numpy()
+            if whole.any():
+                vals = vals.copy()
+                vals[whole] = num[whole].astype(np.int64).astype(str)
+            out[k] = vals.map(cfg["map"]).fillna(0.0).to_numpy(dtype=float)
+    return pd.DataFrame(out, index=df.index)
+
+def linear_predictor_batch(df: pd.DataFrame) -> np.ndarray:
+    # Versión vectorizada de _linear_predictor sobre todas las filas de df
+    betas = np.array([cfg["beta"] for cfg in FEATURE_CONFIG.values()])
+    return feature_scores_batch(df).to_numpy(dtype=float) @ betas - 0.12
+
+def weibull_params_batch(lp: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    # mismo mapeo que _weibull_params, sobre arrays
+    return 1.45 + 0.15 * np.tanh(lp), 0.015 * np.exp(lp)
+
+def weibull_params_artifact(model, df: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+    # (k, lam) en meses desde un modelo del registro (o artefacto): S(t) = exp(-(lam·t)^k)
+    from .model_registry import as_compiled
+    return as_compiled(model).weibull(df, time_unit="months")
+
+def weibull_params_frame(df: pd.DataFrame, model=None) -> Tuple[np.ndarray, np.ndarray]:
+    # (k, lam) por fila: del modelo del registro si se da, si no con los betas de FEATURE_CONFIG
+    if model is not None:
+        return weibull_params_artifact(model, df)
+    return weibull_params_batch(linear_predictor_batch(df))
+
+def _peak_hazard_window_batch(k: np.ndarray, lam: np.ndarray, horizon: int, chunk: int = 100_000):
+    W = 6
+    n = len(k)
+    if horizon < W:
+        return np.ones(n, dtype=int), np.full(n, horizon, dtype=int)
+    t = np.arange(1, horizon + 1, dtype=float)
+    idx = np.empty(n, dtype=int)
+    for i in range(0, n, chunk):
+        kk, ll = k[i:i+chunk, None], lam[i:i+chunk, None]
+        h = kk * (ll ** kk) * (t[None, :] ** (kk - 1))
+        # media móvil de W meses vía sumas acumuladas (índice = fin de ventana, como en rolling)
+        c = np.pad(np.cumsum(h, axis=1), ((0, 0), (1, 0)))
+        roll = c[:, W:] - c[:, :-W]
+        idx[i:i+chunk] = np.argmax(roll, axis=1) + W - 1
+    start = np.maximum(1, idx - W + 2)
+    end = np.minimum(horizon, start + W - 1)
+    return start, end
+
+def compute_risk_multi_horizon(df: pd.DataFrame, horizons=(6, 12, 24, 36, 60),
+                               peak_horizon: int | None = None, model=None) -> pd.DataFrame:
+    """
+    Evalúa S(t) en todos los horizontes para todas las filas en una sola pasada sobre (k, lam).
+    Devuelve columnas risk_pct_{h}m, risk_tier_{h}m (por horizonte) y peak_start_m/peak_end_m.
+    La ventana crítica se busca hasta `peak_horizon` (por defecto el mayor horizonte pedido, como
+    compute_risk_and_survival con ese horizonte).
+    model: modelo del registro (o artefacto); si se omite se usan los betas de FEATURE_CONFIG.
+    """
+    k, lam = weibull_params_frame(df, model)
+    hs = np.asarray(sorted(set(int(h) for h in horizons)), dtype=float)
+    risk = 100.0 * (1 - np.exp(-(lam[:, None] * hs[None, :]) ** k[:, None]))   # (n, H)
+    out = pd.DataFrame(index=df.index)
+    tiers = np.array(["bajo", "medio", "alto"])
+    for j, h in enumerate(hs.astype(int)):
+        out[f"risk_pct_{h}m"] = np.round(risk[:, j], 1)
+        out[f"risk_tier_{h}m"] = tiers[(risk[:, j] >= 10).astype(int) + (risk[:, j] >= 20).astype(int)]
+    start, end = _peak_hazard_window_batch(k, lam, int(hs.max()) if peak_horizon is None else peak_horizon)
+    out["peak_start_m"] = start
+    out["peak_end_m"] = end
+    return out
+
+def explain_contributions_batch(df: pd.DataFrame, model=None) -> pd.DataFrame:
+    """
+    Versión vectorizada de explain_contributions: una columna por feature (orden de FEATURE_CONFIG)
+    con la diferencia de riesgo a 24 meses, en pp, al llevar esa variable a su nivel más sano.
+    """
+    def risk24(frame: pd.DataFrame) -> np.ndarray:
+        k, lam = weibull_params_frame(frame, model)
+        return 100.0 * (1 - np.exp(-(lam * 24) ** k))
+
+    base = risk24(df)
+    out = pd.DataFrame(index=df.index)
+    for name, cfg in FEATURE_CONFIG.items():
+        if cfg["type"] == "num":
+            val = cfg["norm"][0]
+        elif cfg["type"] == "num_inv":
+            val = cfg["norm"][1]
+        else:
+            val = min(cfg["map"], key=lambda x: cfg["map"][x])
+        out[name] = base - risk24(df.assign(**{name: val}))
+    return out
+
 def risk_tier(risk_pct: float) -> str:
     if risk_pct >= 20:
         return "alto"
@@ -164,21 +291,66 @@ def make_dummy_population(n: int, seed: int = 42, include_dept: bool=False) -> p
         data["employee_id"] = [f"E-{10000+i:05d}" for i in range(n)]
     return data
 
-def recommended_actions(row: Dict, tier: str, meta: Dict) -> List[str]:
-    actions = []
-    # Ajustes basados en impulsores clave
-    if row.get("hba1c", 5.8) >= 7.0 or row.get("diabetes")=="Sí":
-        actions.append("⚕️ Intensificar control glucémico y educación terapéutica; evaluar GLP-1/SGLT2 si corresponde.")
-    if row.get("sbp", 120) >= 140 or row.get("htn")=="Sí":
-        actions.append("🫀 Optimizar control de PA (<130/80 si tolerado); adherencia a iECA/ARA-II.")
-    if row.get("ldl", 90) >= 130 or row.get("statin")=="No":
-        actions.append("🧬 Iniciar/optimizar estatina de alta intensidad; objetivo LDL <70 mg/dL si alto riesgo.")
-    if row.get("egfr", 90) < 60 or (isinstance(row.get("uacr",0),(int,float)) and row.get("uacr",0)>=30):
-        actions.append("🧪 Nefroprotección: iECA/ARA-II; evaluar SGLT2; nefrología si ERC ≥ 3b o UACR ≥ 300.")
-    if row.get("bmi",25) >= 30:
-        actions.append("🏃 Programa de pérdida de peso y actividad física supervisada.")
-    if row.get("smoker") == "Sí":
-        actions.append("🚭 Intervención intensiva de cesación de tabaco.")
+# ======= Reglas de recomendación (tabla declarativa) =======
+# Cada regla es una máscara booleana sobre un DataFrame completo; el modo individual
+# evalúa la misma tabla sobre un DataFrame de una fila. Los defaults reproducen row.get(col, default).
+def _num_col(df: pd.DataFrame, col: str, default: float) -> pd.Series:
+    if col not in df.columns:
+        return pd.Series(default, index=df.index, dtype=float)
+    return pd.to_numeric(df[col], errors="coerce").fillna(default)
+
+def _cat_col(df: pd.DataFrame, col: str) -> pd.Series:
+    if col not in df.columns:
+        return pd.Series("", index=df.index)
+    return df[col].astype(str)
+
+ACTION_RULES = [
+    {"id": "glucemia", "program": "Control glucémico",
+     "text": "⚕️ Intensificar control glucémico y educación terapéutica; evaluar GLP-1/SGLT2 si corresponde.",
+     "when": lambda d: (_num_col(d, "hba1c", 5.8) >= 7.0) | (_cat_col(d, "diabetes") == "Sí")},
+    {"id": "presion", "program": "Control de presión arterial",
+     "text": "🫀 Optimizar control de PA (<130/80 si tolerado); adherencia a iECA/ARA-II.",
+     "when": lambda d: (_num_col(d, "sbp", 120) >= 140) | (_cat_col(d, "htn") == "Sí")},
+    {"id": "lipidos", "program": "Manejo de lípidos",
+     "text": "🧬 Iniciar/optimizar estatina de alta intensidad; objetivo LDL <70 mg/dL si alto riesgo.",
+     "when": lambda d: (_num_col(d, "ldl", 90) >= 130) | (_cat_col(d, "statin") == "No")},
+    {"id": "nefroproteccion", "program": "Nefroprotección",
+     "text": "🧪 Nefroprotección: iECA/ARA-II; evaluar SGLT2; nefrología si ERC ≥ 3b o UACR ≥ 300.",
+     "when": lambda d: (_num_col(d, "egfr", 90) < 60) | (_num_col(d, "uacr", 0) >= 30)},
+    {"id": "peso", "program": "Manejo de peso",
+     "text": "🏃 Programa de pérdida de peso y actividad física supervisada.",
+     "when": lambda d: _num_col(d, "bmi", 25) >= 30},
+    {"id": "tabaco", "program": "Cesación de tabaco",
+     "text": "🚭 Intervención intensiva de cesación de tabaco.",
+     "when": lambda d: _cat_col(d, "smoker") == "Sí"},
+]
+
+def evaluate_action_rules(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Matriz dispersa N×reglas (SparseDtype bool) con las banderas de ACTION_RULES por fila.
+    """
+    flags = {r["id"]: r["when"](df).to_numpy(dtype=bool) for r in ACTION_RULES}
+    return pd.DataFrame(flags, index=df.index).astype(pd.SparseDtype(bool, False))
+
+def program_rosters(df: pd.DataFrame, id_col: str = "employee_id") -> Tuple[Dict[str, pd.Series], pd.Series]:
+    """
+    Listas de inscripción por programa ({programa: ids}) y conteos por programa.
+    """
+    flags = evaluate_action_rules(df)
+    ids = df[id_col] if id_col in df.columns else pd.Series(df.index, index=df.index)
+    rosters = {}
+    for r in ACTION_RULES:
+        mask = flags[r["id"]].sparse.to_dense().to_numpy()
+        rosters[r["program"]] = ids[mask].reset_index(drop=True)
+    counts = pd.Series({p: len(v) for p, v in rosters.items()}, name="elegibles")
+    return rosters, counts
+
+def recommended_actions(row: Dict, tier: str, meta: Dict, flags: Dict[str, bool] | None = None) -> List[str]:
+    # Ajustes basados en impulsores clave (misma tabla que el modo poblacional)
+    # flags: banderas de la fila ya evaluadas en lote (evaluate_action_rules sobre todo el df)
+    if flags is None:
+        flags = evaluate_action_rules(pd.DataFrame([row])).iloc[0]
+    actions = [r["text"] for r in ACTION_RULES if flags[r["id"]]]
     # Priorización por nivel
     if tier=="alto":
         actions.insert(0, "🔴 Seguimiento intensivo (1–3 meses) y plan personalizado multidisciplinario.")
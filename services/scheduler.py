@@ -0,0 +1,103 @@
+# services/scheduler.py
+from __future__ import annotations
+import heapq
+from datetime import date, datetime, timedelta
+import numpy as np
+import pandas as pd
+
+HORIZON_DAYS = 182          # ~6 meses de calendario de clínica
+SLOT_MINUTES = 20
+FIRST_SLOT = "07:00"
+
+def clinic_calendar(start: date, days: int = HORIZON_DAYS, day_capacity: int = 60,
+                    workdays_only: bool = True, closed: set[date] | None = None) -> np.ndarray:
+    """
+    Cupos totales por día (offset 0..days-1 desde `start`); fines de semana y días en `closed` = 0.
+    """
+    cal = np.full(days, int(day_capacity), dtype=int)
+    dates = [start + timedelta(days=i) for i in range(days)]
+    for i, d in enumerate(dates):
+        if (workdays_only and d.weekday() >= 5) or (closed and d in closed):
+            cal[i] = 0
+    return cal
+
+def schedule_followups(patients: pd.DataFrame, start: date, calendar: np.ndarray,
+                       service_capacity: dict[str, int] | int = 12,
+                       slot_minutes: int = SLOT_MINUTES, first_slot: str = FIRST_SLOT) -> pd.DataFrame:
+    """
+    Asigna a cada paciente un cupo dentro de su ventana [t_start_days, t_end_days] (offsets desde `start`).
+
+    - Barrido por día: los pacientes entran en cubetas por inicio de ventana y, al abrirse, pasan
+      al heap de su servicio con prioridad (-risk_factor, fin de ventana).
+    - Cada día un heap global sobre las cabezas de los servicios reparte los cupos del día
+      (`calendar[d]`) respetando los cupos por servicio (`service_capacity`).
+    - Las ventanas vencidas se descartan de forma perezosa al llegar a la cabeza del heap.
+    Complejidad O(n log n + días · servicios · log servicios).
+
+    Devuelve el df con control_offset, control_fecha, control_hora, estado y motivo.
+    """
+    n = len(patients)
+    days = len(calendar)
+    svc_codes, svc_names = pd.factorize(patients["servicio"].astype(str))
+    if isinstance(service_capacity, dict):
+        svc_cap = np.array([int(service_capacity.get(s, 0)) for s in svc_names], dtype=int)
+    else:
+        svc_cap = np.full(len(svc_names), int(service_capacity), dtype=int)
+    risk = patients["risk_factor"].to_numpy(dtype=float)
+    a = np.maximum(patients["t_start_days"].to_numpy(dtype=int), 0)
+    b = patients["t_end_days"].to_numpy(dtype=int)
+
+    assigned = np.full(n, -1, dtype=int)
+    slot = np.full(n, -1, dtype=int)
+    # cubetas por día de apertura de ventana (las que abren después del calendario no entran)
+    valid = (a <= b) & (a < days)
+    order = np.flatnonzero(valid)
+    order = order[np.argsort(a[order], kind="stable")]
+    bounds = np.searchsorted(a[order], np.arange(days + 1), side="left")
+
+    heaps: list[list] = [[] for _ in svc_names]
+    for d in range(days):
+        for i in order[bounds[d]:bounds[d + 1]]:
+            heapq.heappush(heaps[svc_codes[i]], (-risk[i], b[i], int(i)))
+        left = int(calendar[d])
+        if left <= 0:
+            continue
+        used = np.zeros(len(svc_names), dtype=int)
+        heads = []
+        for s, h in enumerate(heaps):
+            while h and h[0][1] < d:
+                heapq.heappop(h)              # ventana vencida: queda sin cupo
+            if h and svc_cap[s] > 0:
+                heads.append((h[0][0], h[0][1], s))
+        heapq.heapify(heads)
+        while left > 0 and heads:
+            _, _, s = heapq.heappop(heads)
+            h = heaps[s]
+            _, _, i = heapq.heappop(h)
+            assigned[i], slot[i] = d, used[s]
+            used[s] += 1
+            left -= 1
+            while h and h[0][1] < d:
+                heapq.heappop(h)
+            if h and used[s] < svc_cap[s]:
+                heapq.heappush(heads, (h[0][0], h[0][1], s))
+
+    out = patients.copy()
+    ok = assigned >= 0
+    base = pd.Timestamp(start)
+    out["control_offset"] = np.where(ok, assigned, -1)
+    out["control_fecha"] = pd.to_datetime(np.where(ok, assigned, 0), unit="D", origin=base).where(ok).date
+    t0 = datetime.strptime(first_slot, "%H:%M")
+    minutes = np.where(ok, slot, 0) * slot_minutes
+    out["control_hora"] = np.where(ok, [(t0 + timedelta(minutes=int(m))).strftime("%H:%M") for m in minutes], "")
+    out["estado"] = np.where(ok, "agendado", "sin cupo")
+    motivo = np.where(~valid, "ventana fuera del calendario", "sin cupo en la ventana")
+    out["motivo"] = np.where(ok, "", motivo)
+    return out
+
+def schedule_load(agenda: pd.DataFrame) -> pd.DataFrame:
+    # Ocupación por semana y servicio de los pacientes agendados
+    ok = agenda[agenda["estado"] == "agendado"]
+    week = pd.to_datetime(ok["control_fecha"]).dt.to_period("W").dt.start_time
+    return (ok.assign(semana=week).groupby(["semana", "servicio"], as_index=False)
+              .size().rename(columns={"size": "citas"}))
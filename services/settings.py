@@ -26,6 +26,9 @@ def get_debug() -> bool:
 
 def debug_toggle():
     st.sidebar.checkbox("🔧 Modo Debug", key="DEBUG_MODE", value=get_debug())
+    # todas las páginas pasan por aquí: presupuestos de memoria de la sesión (y su huella en debug)
+    from .memory_governor import govern_session
+    govern_session(show=get_debug())
 
 def debug(msg: str):
     if get_debug():
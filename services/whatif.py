@@ -1,5 +1,7 @@
 # services/whatif.py
 from __future__ import annotations
+import numpy as np
+import pandas as pd
 
 def expected_avoided_events(n_cohort:int, baseline_rate:float, coverage:float, efficacy:float) -> float:
     # n_cohort: tamaño cohorte total
@@ -11,3 +13,138 @@ def roi(avoided_events:float, cost_per_event:float, program_cost_per_patient:flo
     costs = program_cost_per_patient * n_treated
     ratio = (benefits - costs) / costs if costs > 0 else float("inf")
     return benefits, costs, ratio
+
+def per_patient_values(groups, values_by_group: dict, default: float) -> np.ndarray:
+    # Mapea un valor por grupo (p.ej. eficacia o costo por servicio) a un array por paciente
+    return pd.Series(groups).map(values_by_group).fillna(default).to_numpy(dtype=float)
+
+def optimize_targeting(event_rate, cost, efficacy, budget: float, cost_per_event: float,
+                       frontier_points: int | None = 200):
+    """
+    Selección greedy tipo knapsack: ordena por eventos evitados por USD (rate·eficacia / costo)
+    y toma el prefijo cuyo costo acumulado cabe en el presupuesto.
+
+    Devuelve (seleccion, frontera):
+      - seleccion: array bool en el orden original de los pacientes
+      - frontera: DataFrame [n_tratados, cobertura, costo, eventos_evitados, beneficio, roi]
+        para TODOS los prefijos (submuestreado a `frontier_points` filas si se indica).
+    """
+    rate = np.asarray(event_rate, dtype=float)
+    cost = np.broadcast_to(np.asarray(cost, dtype=float), rate.shape)
+    eff = np.broadcast_to(np.asarray(efficacy, dtype=float), rate.shape)
+    gain = rate * eff
+    order = np.argsort(-gain / np.maximum(cost, 1e-9), kind="stable")
+    cum_cost = np.concatenate([[0.0], np.cumsum(cost[order])])
+    cum_avoided = np.concatenate([[0.0], np.cumsum(gain[order])])
+    # presupuesto negativo: nadie (n_sel=-1 haría order[:-1], todos menos uno)
+    n_sel = max(0, int(np.searchsorted(cum_cost, budget, side="right")) - 1)
+    selected = np.zeros(len(rate), dtype=bool)
+    selected[order[:n_sel]] = True
+
+    idx = np.arange(len(rate) + 1)
+    if frontier_points and len(idx) > frontier_points:
+        idx = np.unique(np.r_[np.linspace(0, len(rate), frontier_points).astype(int), n_sel])
+    benefits = cum_avoided[idx] * cost_per_event
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = np.where(cum_cost[idx] > 0, (benefits - cum_cost[idx]) / cum_cost[idx], np.nan)
+    frontier = pd.DataFrame({
+        "n_tratados": idx,
+        "cobertura": idx / max(len(rate), 1),
+        "costo": cum_cost[idx],
+        "eventos_evitados": cum_avoided[idx],
+        "beneficio": benefits,
+        "roi": ratio,
+        "seleccion": idx == n_sel,
+    })
+    return selected, frontier
+
+def _n_treated(n: int, coverages) -> np.ndarray:
+    return np.ceil(n * np.asarray(coverages, dtype=float)).astype(int).clip(0, n)
+
+def scenario_grid(event_rate_sorted, coverages, efficacies, costs_per_event, program_cost_per_patient: float) -> pd.DataFrame:
+    """
+    Evalúa todo el grid cobertura × eficacia × costo por evento en un solo broadcast.
+    `event_rate_sorted` debe venir ordenado por prioridad (Top riesgo primero).
+    """
+    rate = np.asarray(event_rate_sorted, dtype=float)
+    cov = np.asarray(coverages, dtype=float)
+    eff = np.asarray(efficacies, dtype=float)
+    ce = np.asarray(costs_per_event, dtype=float)
+    n_c = _n_treated(len(rate), cov)
+    cum = np.concatenate([[0.0], np.cumsum(rate)])
+    avoided = cum[n_c][:, None, None] * eff[None, :, None] * np.ones_like(ce)[None, None, :]   # (C,E,K)
+    benefits = avoided * ce[None, None, :]
+    costs = (n_c * program_cost_per_patient).astype(float)[:, None, None] * np.ones_like(benefits)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = np.where(costs > 0, (benefits - costs) / costs, np.nan)
+    C, E, K = np.meshgrid(cov, eff, ce, indexing="ij")
+    return pd.DataFrame({
+        "cobertura": C.ravel(), "eficacia": E.ravel(), "costo_evento": K.ravel(),
+        "n_tratados": np.broadcast_to(n_c[:, None, None], avoided.shape).ravel(),
+        "eventos_evitados": avoided.ravel(), "beneficio": benefits.ravel(),
+        "costo": costs.ravel(), "roi": ratio.ravel(),
+    })
+
+def _beta_from_moments(mean: float, sd: float):
+    m = float(np.clip(mean, 1e-6, 1 - 1e-6))
+    var = min(max(sd, 1e-9) ** 2, m * (1 - m) * 0.999)
+    k = m * (1 - m) / var - 1
+    return m * k, (1 - m) * k
+
+def monte_carlo_roi(event_rate_sorted, coverages, program_cost_per_patient: float,
+                    efficacy_mean: float, efficacy_sd: float,
+                    cost_event_mean: float, cost_event_sd: float,
+                    n_draws: int = 2000, seed: int = 7, max_elems: int = 1 << 22):
+    """
+    Monte Carlo de ROI por cobertura:
+      - eventos por paciente ~ Bernoulli(event_rate_30d) (tratados = prefijo Top riesgo)
+      - eficacia ~ Beta(media, sd); costo por evento ~ Gamma(media, sd)
+      - eventos evitados ~ Binomial(eventos, eficacia)
+    Se evalúa por bloques (draws × pacientes ≤ max_elems) para acotar memoria; todas las
+    coberturas salen de la misma simulación vía sumas por segmento.
+
+    Devuelve (resumen por cobertura con IC 90%, matriz roi [n_draws × coberturas]).
+    """
+    rng = np.random.default_rng(seed)
+    rate = np.asarray(event_rate_sorted, dtype=np.float32)
+    cov = np.asarray(coverages, dtype=float)
+    n_c = _n_treated(len(rate), cov)
+    n_max = int(n_c.max(initial=0))
+    # límites de segmento: [0, n_c(ordenados)] -> conteos por segmento y luego cumsum
+    cuts = np.unique(n_c)
+    events = np.zeros((n_draws, len(cuts)), dtype=np.int64)
+    if n_max > 0:
+        pb = min(n_max, max_elems)
+        db = max(1, max_elems // pb)
+        seg_id = np.searchsorted(cuts, np.arange(n_max), side="right")   # segmento de cada paciente
+        for d0 in range(0, n_draws, db):
+            d1 = min(n_draws, d0 + db)
+            for p0 in range(0, n_max, pb):
+                p1 = min(n_max, p0 + pb)
+                hits = rng.random((d1 - d0, p1 - p0), dtype=np.float32) < rate[p0:p1]
+                # suma por segmento (columnas contiguas con el mismo seg_id)
+                seg = seg_id[p0:p1]
+                starts = np.flatnonzero(np.r_[True, seg[1:] != seg[:-1]])
+                events[d0:d1, seg[starts]] += np.add.reduceat(hits, starts, axis=1)
+        events = np.cumsum(events, axis=1)
+    events_c = events[:, np.searchsorted(cuts, n_c)]                    # (draws, C)
+
+    a, b = _beta_from_moments(efficacy_mean, efficacy_sd)
+    eff = rng.beta(a, b, size=n_draws)
+    shape = (cost_event_mean / max(cost_event_sd, 1e-9)) ** 2
+    cost_ev = rng.gamma(shape, cost_event_mean / shape, size=n_draws)
+    avoided = rng.binomial(events_c, eff[:, None])
+    costs = n_c * program_cost_per_patient
+    benefits = avoided * cost_ev[:, None]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = np.where(costs > 0, (benefits - costs) / costs, np.nan)
+
+    q = lambda x, p: np.percentile(x, p, axis=0)
+    summary = pd.DataFrame({
+        "cobertura": cov, "n_tratados": n_c,
+        "eventos_media": events_c.mean(axis=0),
+        "evitados_p05": q(avoided, 5), "evitados_p50": q(avoided, 50), "evitados_p95": q(avoided, 95),
+        "roi_p05": q(ratio, 5), "roi_p50": q(ratio, 50), "roi_p95": q(ratio, 95),
+        "prob_roi_positivo": (ratio > 0).mean(axis=0),
+    })
+    return summary, ratio
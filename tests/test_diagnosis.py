@@ -0,0 +1,23 @@
+# tests/test_diagnosis.py
+from __future__ import annotations
+import pandas as pd
+import pytest
+from services.diagnosis import GROUP_NAMES, comorbidity_index
+
+@pytest.mark.parametrize("dx, esperado", [
+    ("C50;C78", 6),     # metástasis anula tumor primario (no 2 + 6)
+    ("K70;K72", 3),     # hepatopatía grave anula la leve (no 1 + 3)
+    ("E11;E112", 2),    # diabetes complicada anula la no complicada (no 1 + 2)
+    ("E119", 1),        # diabetes sin complicaciones
+    ("C50;K70;E11", 4), # sin forma grave, los leves se suman
+])
+def test_comorbidity_index_jerarquia(dx, esperado):
+    df = pd.DataFrame({"dx_principal_cie10": ["I50"], "dx_secundarios": [dx]})
+    assert comorbidity_index(df)[0] == 1 + esperado   # I50 = insuficiencia cardíaca (1)
+
+def test_comorbidity_index_grupos_sin_leve():
+    df = pd.DataFrame({"dx_principal_cie10": ["C78", "C50"], "dx_secundarios": ["C50", ""]})
+    score, groups = comorbidity_index(df, return_groups=True)
+    cancer = GROUP_NAMES.index("cancer")
+    assert score.tolist() == [6, 2]
+    assert groups[:, cancer].toarray().ravel().tolist() == [0, 1]
@@ -0,0 +1,20 @@
+# tests/test_whatif.py
+from __future__ import annotations
+import numpy as np
+import pytest
+from services.whatif import optimize_targeting
+
+RATE = np.array([0.30, 0.10, 0.20, 0.05])
+
+@pytest.mark.parametrize("budget", [-100.0, 0.0])
+def test_optimize_targeting_sin_presupuesto(budget):
+    selected, frontier = optimize_targeting(RATE, 50.0, 0.25, budget, 2500.0)
+    assert not selected.any()
+    opt = frontier[frontier["seleccion"]]
+    assert len(opt) == 1 and opt["n_tratados"].iloc[0] == 0
+
+def test_optimize_targeting_prefijo_que_cabe():
+    selected, frontier = optimize_targeting(RATE, 50.0, 0.25, 120.0, 2500.0)
+    # dos pacientes caben (100 USD): los de mayor tasa
+    assert selected.tolist() == [True, False, True, False]
+    assert frontier[frontier["seleccion"]]["n_tratados"].iloc[0] == 2